@@ -1,24 +1,69 @@
-from typing import Optional
+import base64
+import binascii
+import csv
+import io
+import json
+import time
+from datetime import date, datetime, timezone
+from functools import partial
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Iterator, Literal, Optional, TypeVar
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
-from app.database import get_db
-from app.models.rebate import RebateProgram, RetrofitType
+from app.api.response_cache import CachedResponse, etag_matches, make_etag, response_cache
+from app.api.search_matrix import search_matrix
+from app.database import SessionLocal, get_async_db, get_db
 from app.schemas.rebate import (
     RebateSchema,
     RebateListResponse,
+    RebatePageResponse,
+    FacetCounts,
+    FacetResponse,
+    FulltextResult,
+    FulltextResponse,
     RetrofitTypeSchema,
     ProvinceInfo,
     ProvinceListResponse,
+    BatchAnalyzeRequest,
+    TextAnalysisResult,
+)
+from app.metrics import record_serialization
+from app.models.rebate import ALL_CATEGORIES, RetrofitType
+from app.services.catalog import Catalog, Facets, ProgramCounts, RetrofitTypeRecord, add_catalog_warmer, get_catalog
+from app.services.fulltext import search_fulltext, search_fulltext_async, tokenize
+from app.services.rebate_service import (
+    REBATE_FIELDS,
+    PageKey,
+    Rebate,
+    analyze_texts,
+    get_all_rebates,
+    get_all_rebates_async,
+    get_facets,
+    get_facets_async,
+    get_export_version,
+    get_rebate_page,
+    get_program_counts,
+    get_program_counts_async,
+    get_retrofit_types,
+    get_retrofit_types_async,
+    iter_rebate_export,
+    search_rebates,
+    search_rebates_async,
+    PROVINCE_NAMES,
 )
-from app.services.rebate_service import get_all_rebates, search_rebates, PROVINCE_NAMES
 
 router = APIRouter(prefix="/api/rebates", tags=["rebates"])
 
+T = TypeVar("T")
+
 
-def _rebate_to_schema(r: RebateProgram) -> RebateSchema:
+def _rebate_to_schema(r: Rebate) -> RebateSchema:
     return RebateSchema(
         id=r.id,
         name=r.name,
@@ -40,60 +85,388 @@ def _rebate_to_schema(r: RebateProgram) -> RebateSchema:
     )
 
 
-@router.get("", response_model=RebateListResponse)
-def list_rebates(
+def _rebate_schemas(rebates: Iterable[Rebate]) -> list[RebateSchema]:
+    started = time.perf_counter()
+    schemas = [_rebate_to_schema(r) for r in rebates]
+    record_serialization(time.perf_counter() - started)
+    return schemas
+
+
+def _rebate_list(rebates: list[Rebate]) -> RebateListResponse:
+    return RebateListResponse(
+        rebates=_rebate_schemas(rebates),
+        count=len(rebates),
+    )
+
+
+def _encode(payload: Any) -> bytes:
+    if isinstance(payload, BaseModel):
+        return payload.model_dump_json().encode()
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def _cached(
+    request: Request,
+    key: Hashable,
+    fetch: Callable[[], Awaitable[T]],
+    read: Callable[[Session], T],
+    render: Callable[[T], Any],
+    scope: Optional[tuple[Optional[str], bool]] = None,
+) -> Any:
+    """Serve the rendered results from the response cache, answering 304 when the client's copy is current.
+
+    ``fetch`` reads the results through the async database path and
+    ``render`` builds the response model from them. With a catalog loaded,
+    ``read`` reads them instead: the sync service functions answer from the
+    catalog without database I/O, so reading, rendering and encoding a miss
+    all run in the threadpool. Each can take seconds at 100k programs, and
+    decoding a mapped snapshot's records alone is half a second for a 20k
+    listing; on the event loop that would stall every other request.
+    Without a loaded catalog there is no version to key on, so the payload is
+    returned as-is for FastAPI to serialize.
+
+    ``scope`` is the request's (province, active_only); the key is completed
+    with the catalog scope it selects, so unknown provinces, which all list
+    the federal programs, share one entry instead of one each.
+    """
+    catalog = get_catalog()
+    if catalog is None:
+        return render(await fetch())
+
+    if scope is not None:
+        key = (key, catalog.scope_key(*scope))
+    entry = response_cache.get(key, catalog.version)
+    if entry is None:
+        body = await run_in_threadpool(_read_encoded, read, render)
+        entry = response_cache.put(key, catalog.version, body)
+    return _respond(request, entry)
+
+
+def _read_encoded(read: Callable[[Session], T], render: Callable[[T], Any]) -> bytes:
+    # The session only connects if the catalog was dropped after the caller found one.
+    with SessionLocal() as db:
+        return _encode(render(read(db)))
+
+
+def _respond(request: Request, entry: CachedResponse) -> Response:
+    headers = {"ETag": entry.etag}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def _encode_cursor(key: PageKey) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key), separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> PageKey:
+    try:
+        province, name, rebate_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not (isinstance(province, str) and isinstance(name, str) and isinstance(rebate_id, int)):
+            raise ValueError
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return (province, name, rebate_id)
+
+
+def _parse_fields(fields: Optional[str]) -> tuple[str, ...]:
+    if not fields:
+        return REBATE_FIELDS
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in REBATE_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields requested")
+    return requested
+
+
+@router.get("", response_model=RebateListResponse | RebatePageResponse)
+async def list_rebates(
+    request: Request,
     province: Optional[str] = Query(None, description="Province code (ON, BC, QC, etc.)"),
     active_only: bool = Query(True, description="Only return active programs"),
-    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; enables cursor pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,name,province,max_amount"),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    rebates = get_all_rebates(db, province=province, active_only=active_only)
-    return RebateListResponse(
-        rebates=[_rebate_to_schema(r) for r in rebates],
-        count=len(rebates),
+    if limit is None and cursor is None and fields is None:
+        async def rebates() -> list[Rebate]:
+            return await get_all_rebates_async(db, province=province, active_only=active_only)
+
+        read = partial(get_all_rebates, province=province, active_only=active_only)
+        return await _cached(request, ("rebates",), rebates, read, _rebate_list, scope=(province, active_only))
+
+    # Paged / projected listing, ordered by (province, name, id)
+    after = _decode_cursor(cursor) if cursor else None
+    projection = _parse_fields(fields)
+    page_size = limit or 50
+
+    read = partial(
+        get_rebate_page, province=province, active_only=active_only, limit=page_size, after=after, fields=projection
     )
 
+    def page_rows() -> tuple[list[dict[str, Any]], Optional[PageKey]]:
+        with SessionLocal() as db:
+            return read(db)
+
+    async def page() -> tuple[list[dict[str, Any]], Optional[PageKey]]:
+        # Snapshot pages never open a connection; keyset SQL stays on the sync path. Either way off the event loop.
+        return await run_in_threadpool(page_rows)
+
+    def render(found: tuple[list[dict[str, Any]], Optional[PageKey]]) -> RebatePageResponse:
+        rows, next_key = found
+        return RebatePageResponse(
+            rebates=rows,
+            count=len(rows),
+            next_cursor=_encode_cursor(next_key) if next_key else None,
+        )
+
+    key = ("rebates-page", page_size, after, projection)
+    return await _cached(request, key, page, read, render, scope=(province, active_only))
+
 
 @router.get("/search", response_model=RebateListResponse)
-def search(
+async def search(
+    request: Request,
     province: str = Query(..., description="Province code (required)"),
     retrofit_type: Optional[str] = Query(None, description="Retrofit type name"),
     active_only: bool = Query(True),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    rebates = search_rebates(db, province=province, retrofit_type=retrofit_type, active_only=active_only)
-    return RebateListResponse(
-        rebates=[_rebate_to_schema(r) for r in rebates],
-        count=len(rebates),
-    )
+    catalog = get_catalog()
+    if catalog is not None:
+        if not search_matrix.is_current(catalog, date.today()):
+            # After a catalog reload or a deadline passing; rebuilt off the event loop
+            await run_in_threadpool(search_matrix.build, catalog, _render_search)
+        entry = search_matrix.get(catalog, province, retrofit_type, active_only)
+        if entry is not None:
+            return _respond(request, entry.response)
+
+    # Provinces and retrofit types outside the catalog, or no catalog loaded
+    async def results() -> list[Rebate]:
+        return await search_rebates_async(db, province=province, retrofit_type=retrofit_type, active_only=active_only)
+
+    # Ranking looks at upcoming deadlines, so results can change at midnight
+    read = partial(search_rebates, province=province, retrofit_type=retrofit_type, active_only=active_only)
+    key = ("search", retrofit_type or None, date.today())
+    return await _cached(request, key, results, read, _rebate_list, scope=(province, active_only))
+
+
+def _render_search(rebates: list[Rebate]) -> bytes:
+    return _encode(_rebate_list(rebates))
+
+
+def warm_search_matrix(catalog: Catalog) -> None:
+    """Precompute every search response at startup rather than on the first search."""
+    search_matrix.build(catalog, _render_search)
+
+
+add_catalog_warmer(warm_search_matrix)
+
+
+@router.get("/fulltext", response_model=FulltextResponse)
+async def fulltext(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=500, description="Words to search for in program text"),
+    province: Optional[str] = Query(None, description="Province code; federal programs are always included"),
+    active_only: bool = Query(True),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Programs ranked by BM25 over name, provider, description and eligibility."""
+    async def results() -> list[tuple[float, Rebate]]:
+        return await search_fulltext_async(db, q, province=province, active_only=active_only, limit=limit)
+
+    def render(found: list[tuple[float, Rebate]]) -> FulltextResponse:
+        return FulltextResponse(
+            results=[
+                FulltextResult(score=score, rebate=schema)
+                for (score, _), schema in zip(found, _rebate_schemas(r for _, r in found))
+            ],
+            count=len(found),
+        )
+
+    # Queries differing only in case, accents, punctuation or repeated words share an entry
+    read = partial(search_fulltext, query=q, province=province, active_only=active_only, limit=limit)
+    key = ("fulltext", tuple(dict.fromkeys(tokenize(q))), limit)
+    return await _cached(request, key, results, read, render, scope=(province, active_only))
+
+
+@router.get("/facets", response_model=FacetResponse)
+async def facets(
+    request: Request,
+    province: Optional[str] = Query(None, description="Province code; federal programs are always included"),
+    retrofit_type: Optional[list[str]] = Query(None, description="Retrofit type name; repeat to match any of several"),
+    active_only: bool = Query(True),
+    limit: int = Query(50, ge=0, le=500, description="Programs to return; counts always cover every match"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Matching programs with counts per retrofit type, category, province and income-tested flag."""
+    retrofit_types = sorted(set(retrofit_type)) if retrofit_type else None
+
+    async def result() -> Facets:
+        return await get_facets_async(
+            db, province=province, retrofit_types=retrofit_types, active_only=active_only, limit=limit
+        )
+
+    def render(found: Facets) -> FacetResponse:
+        return FacetResponse(
+            rebates=_rebate_schemas(found.programs),
+            count=len(found.programs),
+            total=found.total,
+            facets=FacetCounts(
+                retrofit_types=found.retrofit_types,
+                categories=found.categories,
+                provinces=found.provinces,
+                income_tested=found.income_tested,
+            ),
+        )
+
+    read = partial(get_facets, province=province, retrofit_types=retrofit_types, active_only=active_only, limit=limit)
+    key = ("facets", tuple(retrofit_types or ()), limit)
+    return await _cached(request, key, result, read, render, scope=(province, active_only))
 
 
 @router.get("/retrofit-types")
-def list_retrofit_types(db: Session = Depends(get_db)):
+async def list_retrofit_types(request: Request, db: AsyncSession = Depends(get_async_db)):
     """List all available retrofit types grouped by category."""
-    types = db.query(RetrofitType).order_by(RetrofitType.category, RetrofitType.display_name).all()
-    return {
-        "types": [
-            {"name": t.name, "display_name": t.display_name, "category": t.category}
-            for t in types
-        ]
-    }
+    async def types() -> list[RetrofitType | RetrofitTypeRecord]:
+        return await get_retrofit_types_async(db)
 
+    def render(found: list[RetrofitType | RetrofitTypeRecord]) -> dict[str, Any]:
+        return {"types": [{"name": t.name, "display_name": t.display_name, "category": t.category} for t in found]}
+
+    return await _cached(request, ("retrofit-types",), types, get_retrofit_types, render)
+
+
+def _province_list(counts: ProgramCounts) -> ProvinceListResponse:
+    by_province: dict[str, dict[tuple[str, bool], int]] = {}
+    for (code, category, is_active), count in counts.items():
+        by_province.setdefault(code, {})[(category, is_active)] = count
 
-@router.get("/provinces", response_model=ProvinceListResponse)
-def list_provinces(db: Session = Depends(get_db)):
-    rows = (
-        db.query(RebateProgram.province, func.count(RebateProgram.id))
-        .filter(RebateProgram.is_active == True)  # noqa: E712
-        .group_by(RebateProgram.province)
-        .order_by(RebateProgram.province)
-        .all()
-    )
     provinces = [
         ProvinceInfo(
             code=code,
             name=PROVINCE_NAMES.get(code, code),
-            program_count=count,
+            program_count=breakdown[(ALL_CATEGORIES, True)],
+            inactive_count=breakdown.get((ALL_CATEGORIES, False), 0),
+            category_counts={
+                category: count
+                for (category, is_active), count in sorted(breakdown.items())
+                if is_active and category != ALL_CATEGORIES
+            },
         )
-        for code, count in rows
+        for code, breakdown in sorted(by_province.items())
+        # Listed provinces are those with at least one active program
+        if breakdown.get((ALL_CATEGORIES, True))
     ]
     return ProvinceListResponse(provinces=provinces)
+
+
+@router.get("/provinces", response_model=ProvinceListResponse)
+async def list_provinces(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def counts() -> ProgramCounts:
+        return await get_program_counts_async(db)
+
+    return await _cached(request, ("provinces",), counts, get_program_counts, _province_list)
+
+
+@router.post("/analyze:batch", response_class=StreamingResponse)
+def analyze_batch(payload: BatchAnalyzeRequest):
+    """Classify many free-text inquiries; streams one JSON result per line (NDJSON)."""
+    items = [(item.text, item.session_province) for item in payload.items]
+
+    def lines():
+        # The stream outlives the request's dependencies, so it owns its session.
+        db = SessionLocal()
+        try:
+            for index, result in enumerate(analyze_texts(db, items, limit=payload.limit)):
+                row = TextAnalysisResult(
+                    index=index,
+                    province=result.province,
+                    retrofit_types=result.retrofit_types,
+                    rebate_ids=result.rebate_ids,
+                )
+                yield row.model_dump_json() + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _ndjson_lines(rows: Iterator[dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=_json_default) + "\n"
+
+
+def _csv_lines(rows: Iterator[dict[str, Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REBATE_FIELDS)
+    for row in rows:
+        row["retrofit_types"] = ";".join(rt["name"] for rt in row["retrofit_types"])
+        writer.writerow([row[f] for f in REBATE_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _not_modified_since(if_modified_since: Optional[str], last_modified: datetime) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+
+@router.get("/export", response_class=StreamingResponse)
+def export_rebates(
+    request: Request,
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="ndjson (default) or csv"),
+    province: Optional[str] = Query(None, description="Province code (ON, BC, QC, etc.)"),
+    active_only: bool = Query(False, description="Only export active programs"),
+    db: Session = Depends(get_db),
+):
+    """Stream the full catalog, one program per line, with flat memory use."""
+    headers = {}
+    version = get_export_version(db)
+    if version.last_modified is not None:
+        # Stored timestamps are UTC; HTTP dates have one-second resolution, so
+        # the ETag carries the exact timestamp and the program count.
+        last_modified = version.last_modified
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        variant = f"{version.programs}|{last_modified.isoformat()}|{format}|{province}|{active_only}"
+        headers["ETag"] = make_etag("export", variant.encode())
+        last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-Modified-Since is ignored when If-None-Match is present (RFC 9110)
+            not_modified = etag_matches(if_none_match, headers["ETag"])
+        else:
+            not_modified = _not_modified_since(request.headers.get("if-modified-since"), last_modified)
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+
+    def lines() -> Iterator[str]:
+        # The stream outlives the request's dependencies, so it owns its session.
+        export_db = SessionLocal()
+        try:
+            rows = iter_rebate_export(export_db, province=province, active_only=active_only)
+            yield from (_csv_lines(rows) if format == "csv" else _ndjson_lines(rows))
+        finally:
+            export_db.close()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(lines(), media_type=media_type, headers=headers)
@@ -0,0 +1,95 @@
+"""Cache of encoded JSON response bodies keyed by normalized query parameters.
+
+Entries are tied to the catalog snapshot version: the first lookup after the
+catalog is reloaded empties the cache, and ETags embed the version so clients
+holding a body from an older catalog revalidate to a fresh 200. The cache is
+bounded by entry count and by total body bytes, evicting the oldest entries
+first; a full listing can be megabytes.
+"""
+
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+from app.config import settings
+
+
+@dataclass(frozen=True, slots=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 256 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: dict[Hashable, CachedResponse] = {}
+        self._bytes = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: str) -> Optional[CachedResponse]:
+        """Return the entry for ``key`` rendered under ``version``, if any."""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            return self._entries.get(key)
+
+    def put(self, key: Hashable, version: str, body: bytes) -> CachedResponse:
+        """Store a rendered body and return it with its ETag."""
+        entry = CachedResponse(body=body, etag=make_etag(version, body))
+        with self._lock:
+            if version == self._version and len(body) <= self.max_bytes:
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self._bytes -= len(previous.body)
+                # Query strings are client-controlled; evict the oldest entries
+                # rather than letting arbitrary parameter values grow the cache.
+                while self._entries and (
+                    len(self._entries) >= self.max_entries or self._bytes + len(body) > self.max_bytes
+                ):
+                    self._bytes -= len(self._entries.pop(next(iter(self._entries))).body)
+                self._entries[key] = entry
+                self._bytes += len(body)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = None
+
+    @property
+    def size_bytes(self) -> int:
+        """Total bytes of the cached bodies."""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def make_etag(version: str, body: bytes) -> str:
+    digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an ``If-None-Match`` header against ``etag`` (weak comparison, RFC 9110)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+response_cache = ResponseCache(max_entries=settings.response_cache_entries, max_bytes=settings.response_cache_bytes)
@@ -0,0 +1,121 @@
+"""Precomputed ``/api/rebates/search`` responses for every query the endpoint can answer.
+
+A search is a province, an optional retrofit type and ``active_only``, so
+the query space is small and closed: every province code times every
+retrofit type (or none) times both ``active_only`` values. The matrix holds
+the ranked result ids and the encoded response body for each of them, so a
+search is a dict lookup and a byte write.
+
+The matrix belongs to one catalog version and to the days its ranking stays
+the same. Ranking only depends on the date through deadlines passing, so it
+holds until the day after the next upcoming deadline rather than until
+midnight. The matrix is built at startup and rebuilt on the first search
+after the catalog is reloaded or a deadline passes.
+"""
+
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Optional
+
+from app.api.response_cache import CachedResponse, make_etag
+from app.metrics import SEARCH_MATRIX_BUILD_SECONDS, SEARCH_MATRIX_BYTES, SEARCH_MATRIX_ENTRIES
+from app.services.catalog import Catalog
+from app.services.rebate_service import PROVINCE_NAMES, SEARCH_LIMIT, Rebate
+
+MatrixKey = tuple[str, Optional[str], bool]
+
+
+@dataclass(frozen=True, slots=True)
+class MatrixEntry:
+    ids: array  # program ids, in result order
+    response: CachedResponse
+
+
+class SearchMatrix:
+    def __init__(self) -> None:
+        self._entries: dict[MatrixKey, MatrixEntry] = {}
+        self._version: Optional[str] = None
+        # First and last day the entries' ranking holds for
+        self._days = (date.max, date.min)
+        self._lock = threading.Lock()
+        self.build_seconds = 0.0
+        self.memory_bytes = 0
+
+    def is_current(self, catalog: Catalog, today: date) -> bool:
+        return catalog.version == self._version and self._days[0] <= today <= self._days[1]
+
+    def get(self, catalog: Catalog, province: str, retrofit_type: Optional[str], active_only: bool) -> Optional[MatrixEntry]:
+        """The entry for a search, or None when the matrix is stale or does not cover the query."""
+        if not self.is_current(catalog, date.today()):
+            return None
+        return self._entries.get((province, retrofit_type or None, active_only))
+
+    def build(self, catalog: Catalog, render: Callable[[list[Rebate]], bytes], today: Optional[date] = None) -> None:
+        """Rank and render every search against ``catalog``, unless another caller just did."""
+        today = today or date.today()
+        with self._lock:
+            if self.is_current(catalog, today):
+                return
+            started = time.perf_counter()
+            provinces = sorted(set(PROVINCE_NAMES) | set(catalog.provinces))
+            types = [None, *(t.name for t in catalog.retrofit_types)]
+            entries: dict[MatrixKey, MatrixEntry] = {}
+            for province in provinces:
+                for retrofit_type in types:
+                    for active_only in (True, False):
+                        found = catalog.find_matching(
+                            province,
+                            [retrofit_type] if retrofit_type else None,
+                            active_only=active_only,
+                            limit=SEARCH_LIMIT,
+                            today=today,
+                        )
+                        body = render(found)
+                        entries[(province, retrofit_type, active_only)] = MatrixEntry(
+                            ids=array("q", (r.id for r in found)),
+                            response=CachedResponse(body=body, etag=make_etag(catalog.version, body)),
+                        )
+            self._entries = entries
+            self._version = catalog.version
+            self._days = (today, _ranking_holds_until(catalog, today))
+            self.build_seconds = time.perf_counter() - started
+            self.memory_bytes = _size_of(entries)
+        SEARCH_MATRIX_BUILD_SECONDS.set(self.build_seconds)
+        SEARCH_MATRIX_BYTES.set(self.memory_bytes)
+        SEARCH_MATRIX_ENTRIES.set(len(entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self._version = None
+            self._days = (date.max, date.min)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _ranking_holds_until(catalog: Catalog, today: date) -> date:
+    """Last day ``rank_key`` orders programs as it does ``today``.
+
+    A program counts as expired once its end date is in the past, so the
+    ranking first changes the day after the nearest end date still ahead.
+    """
+    today_ordinal = today.toordinal()
+    upcoming = [end for end in catalog.index.end_dates if end >= today_ordinal]
+    return date.fromordinal(min(upcoming)) if upcoming else date.max
+
+
+def _size_of(entries: dict[MatrixKey, MatrixEntry]) -> int:
+    """Bytes held by the matrix: the dict, its keys, and each entry's ids, body and ETag."""
+    size = sys.getsizeof(entries)
+    for key, entry in entries.items():
+        response = entry.response
+        size += sum(map(sys.getsizeof, (key, entry, entry.ids, response, response.body, response.etag)))
+    return size
+
+
+search_matrix = SearchMatrix()
@@ -1,3 +1,6 @@
+from typing import Literal, Optional
+
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -5,7 +8,52 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env")
 
     database_url: str = "sqlite:///./retrofit_advisor.db"
+    # Defaults to database_url with its asyncio driver (aiosqlite / asyncpg)
+    async_database_url: Optional[str] = None
+    # Connect to a replica: SQLite connections get PRAGMA query_only, PostgreSQL
+    # sessions default_transaction_read_only, and startup skips DDL and seeding.
+    database_read_only: bool = False
+
+    # Connection pool (ignored for in-memory SQLite, which uses a single connection)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = -1  # seconds; -1 keeps connections indefinitely
+    db_pool_pre_ping: bool = False
+    # Per-statement limit on PostgreSQL; unset means no limit
+    db_statement_timeout_ms: Optional[int] = None
+
+    # SQLite PRAGMAs applied to every new connection; unset leaves SQLite's default
+    sqlite_synchronous: Optional[Literal["OFF", "NORMAL", "FULL", "EXTRA"]] = None
+    sqlite_cache_size: Optional[int] = None  # pages if positive, KiB if negative
+    sqlite_mmap_size: Optional[int] = None  # bytes
+    sqlite_temp_store: Optional[Literal["DEFAULT", "FILE", "MEMORY"]] = None
+    sqlite_busy_timeout_ms: Optional[int] = None
+
+    # Catalog snapshot file written by ``python -m app.services.catalog_file``.
+    # When set, workers memory-map it instead of seeding and reading the
+    # database at startup, and the catalog tables are treated as read-only.
+    catalog_snapshot_path: Optional[str] = None
+    # Skip DDL and seeding while the database's schema and seed stamps match,
+    # and load the catalog (or snapshot) and its indexes in the background,
+    # answering from the database until it is ready. For fast cold starts.
+    lazy_startup: bool = False
+
+    # Served at /; point it at the output of ``python -m app.static_assets`` for
+    # fingerprinted, precompressed assets with long-lived cache headers.
+    static_dir: str = "app/static"
+
+    # Encoded API responses kept per worker, bounded by count and total body size
+    response_cache_entries: int = 1024
+    response_cache_bytes: int = 256 * 2**20
+
+    # Worker processes shared by large /api/rebates/analyze:batch requests;
+    # unset means one per CPU, 1 keeps extraction in the request's thread.
+    analyze_processes: Optional[int] = Field(None, ge=1)
+
     debug: bool = False
+    # Request latency / DB / serialization histograms served at /api/metrics
+    metrics_enabled: bool = True
 
 
 settings = Settings()
@@ -0,0 +1,234 @@
+"""Bulk, idempotent loading of the rebate catalog.
+
+``upsert_catalog`` reconciles the retrofit types, programs and their links in
+the database with a catalog given as plain dicts (the shape of
+``RETROFIT_TYPES`` / ``REBATE_PROGRAMS``). Rows are matched on natural keys,
+retrofit type ``name`` and program ``(name, province)``, and written with a
+handful of executemany statements in a single transaction, so running it
+twice with the same input changes nothing.
+
+Writes also refresh the ``province_program_counts`` aggregate and the
+full-text index in the same transaction, so readers never see either out of
+step with the programs.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from sqlalchemy import Connection, bindparam, delete, distinct, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from app.models.rebate import ALL_CATEGORIES, ProvinceProgramCount, RebateProgram, RetrofitType, RebateRetrofitType
+from app.services.fulltext import refresh_fulltext_index
+
+_TYPE_FIELDS = ("display_name", "category")
+_PROGRAM_FIELDS = (
+    "provider",
+    "description",
+    "max_amount",
+    "amount_description",
+    "eligibility_summary",
+    "how_to_apply",
+    "website_url",
+    "is_active",
+    "end_date",
+    "is_income_tested",
+)
+# Scalar column defaults for program fields a catalog entry may leave out. Core
+# inserts of an explicit None bypass them, so omitted fields are filled here.
+_PROGRAM_DEFAULTS: dict[str, Any] = {
+    f: column.default.arg
+    for f in _PROGRAM_FIELDS
+    if (column := RebateProgram.__table__.c[f]).default is not None and column.default.is_scalar
+}
+
+
+@dataclass
+class UpsertCounts:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+@dataclass
+class UpsertReport:
+    retrofit_types: UpsertCounts = field(default_factory=UpsertCounts)
+    programs: UpsertCounts = field(default_factory=UpsertCounts)
+    links_added: int = 0
+    links_removed: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(
+            self.retrofit_types.inserted
+            or self.retrofit_types.updated
+            or self.programs.inserted
+            or self.programs.updated
+        )
+
+
+def _index_unique(rows: Iterable[dict[str, Any]], key_fields: tuple[str, ...], what: str) -> dict[tuple, dict]:
+    indexed: dict[tuple, dict] = {}
+    for row in rows:
+        key = tuple(row[f] for f in key_fields)
+        if key in indexed:
+            raise ValueError(f"Duplicate {what} in catalog: {key}")
+        indexed[key] = row
+    return indexed
+
+
+def _upsert_types(db: Session, types: list[dict[str, Any]], counts: UpsertCounts) -> dict[str, int]:
+    wanted = _index_unique(types, ("name",), "retrofit type")
+    existing = {
+        row.name: row
+        for row in db.execute(select(RetrofitType.id, RetrofitType.name, *(getattr(RetrofitType, f) for f in _TYPE_FIELDS)))
+    }
+
+    inserts, updates = [], []
+    for (name,), data in wanted.items():
+        values = {f: data[f] for f in _TYPE_FIELDS}
+        current = existing.get(name)
+        if current is None:
+            inserts.append({"name": name, **values})
+        elif any(getattr(current, f) != v for f, v in values.items()):
+            updates.append({"id": current.id, **values})
+        else:
+            counts.unchanged += 1
+
+    if inserts:
+        db.execute(insert(RetrofitType), inserts)
+    if updates:
+        db.execute(update(RetrofitType), updates)
+    counts.inserted, counts.updated = len(inserts), len(updates)
+
+    return dict(db.execute(select(RetrofitType.name, RetrofitType.id)).all())
+
+
+def refresh_program_counts(conn: Connection) -> None:
+    """Recompute ``province_program_counts`` from the program and link tables.
+
+    Runs on ``conn``'s transaction; the caller commits. Call it after writing
+    programs by any route other than ``upsert_catalog``.
+    """
+    programs = RebateProgram.__table__
+    links = RebateRetrofitType.__table__
+    types = RetrofitType.__table__
+    counts = ProvinceProgramCount.__table__
+    columns = ["province", "category", "is_active", "program_count"]
+
+    totals = select(
+        programs.c.province, literal(ALL_CATEGORIES), programs.c.is_active, func.count(programs.c.id)
+    ).group_by(programs.c.province, programs.c.is_active)
+    by_category = (
+        select(programs.c.province, types.c.category, programs.c.is_active, func.count(distinct(programs.c.id)))
+        .join(links, links.c.rebate_id == programs.c.id)
+        .join(types, types.c.id == links.c.retrofit_type_id)
+        .group_by(programs.c.province, types.c.category, programs.c.is_active)
+    )
+
+    conn.execute(delete(counts))
+    conn.execute(insert(counts).from_select(columns, totals))
+    conn.execute(insert(counts).from_select(columns, by_category))
+
+
+def upsert_catalog(
+    db: Session,
+    retrofit_types: list[dict[str, Any]],
+    programs: list[dict[str, Any]],
+) -> UpsertReport:
+    """Insert or update the given catalog and commit. Rows not in the input are left alone."""
+    report = UpsertReport()
+    now = datetime.now(timezone.utc)
+
+    try:
+        type_ids = _upsert_types(db, retrofit_types, report.retrofit_types)
+
+        wanted = _index_unique(programs, ("name", "province"), "rebate program")
+        wanted_links: dict[tuple[str, str], set[int]] = {}
+        for key, data in wanted.items():
+            unknown = [t for t in data["retrofit_types"] if t not in type_ids]
+            if unknown:
+                raise ValueError(f"Rebate program {key} references unknown retrofit types: {unknown}")
+            wanted_links[key] = {type_ids[t] for t in data["retrofit_types"]}
+
+        # Program and link rows go through Core on the session's connection:
+        # plain tuples and executemany are much cheaper than ORM rows at 100k+.
+        conn = db.connection()
+        programs_table = RebateProgram.__table__
+        existing: dict[tuple[str, str], tuple[int, tuple]] = {
+            (row[1], row[2]): (row[0], tuple(row[3:]))
+            for row in conn.execute(
+                select(
+                    programs_table.c.id,
+                    programs_table.c.name,
+                    programs_table.c.province,
+                    *(programs_table.c[f] for f in _PROGRAM_FIELDS),
+                )
+            )
+        }
+        links_table = RebateRetrofitType.__table__
+        existing_links: dict[int, set[int]] = {}
+        for rebate_id, type_id in conn.execute(select(links_table.c.rebate_id, links_table.c.retrofit_type_id)):
+            existing_links.setdefault(rebate_id, set()).add(type_id)
+
+        inserts, updates = [], []
+        for key, data in wanted.items():
+            values = tuple(data.get(f, _PROGRAM_DEFAULTS.get(f)) for f in _PROGRAM_FIELDS)
+            current = existing.get(key)
+            if current is None:
+                row = dict(zip(_PROGRAM_FIELDS, values))
+                inserts.append({"name": key[0], "province": key[1], **row, "created_at": now, "updated_at": now})
+            elif current[1] != values or existing_links.get(current[0], set()) != wanted_links[key]:
+                updates.append({"id": current[0], **dict(zip(_PROGRAM_FIELDS, values)), "updated_at": now})
+            else:
+                report.programs.unchanged += 1
+
+        if inserts:
+            conn.execute(insert(programs_table), inserts)
+        if updates:
+            db.execute(update(RebateProgram), updates)
+        report.programs.inserted, report.programs.updated = len(inserts), len(updates)
+
+        program_ids = {key: rebate_id for key, (rebate_id, _) in existing.items()}
+        if inserts:
+            program_ids = {
+                (name, province): rebate_id
+                for rebate_id, name, province in conn.execute(
+                    select(programs_table.c.id, programs_table.c.name, programs_table.c.province)
+                )
+            }
+
+        link_adds, link_removes = [], []
+        for key, type_set in wanted_links.items():
+            rebate_id = program_ids[key]
+            current_types = existing_links.get(rebate_id, set())
+            link_adds.extend({"rebate_id": rebate_id, "retrofit_type_id": t} for t in type_set - current_types)
+            link_removes.extend({"r": rebate_id, "t": t} for t in current_types - type_set)
+
+        if link_adds:
+            conn.execute(insert(links_table), link_adds)
+        if link_removes:
+            # Executemany DELETE is only available at the Core level.
+            conn.execute(
+                delete(links_table).where(
+                    links_table.c.rebate_id == bindparam("r"),
+                    links_table.c.retrofit_type_id == bindparam("t"),
+                ),
+                link_removes,
+            )
+        report.links_added, report.links_removed = len(link_adds), len(link_removes)
+
+        # Also fill the aggregate when its table is new and still empty.
+        counts_empty = conn.execute(select(ProvinceProgramCount.province).limit(1)).first() is None
+        if report.changed or link_adds or link_removes or counts_empty:
+            refresh_program_counts(conn)
+        if report.programs.inserted or report.programs.updated:
+            refresh_fulltext_index(conn)
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return report
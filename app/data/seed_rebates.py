@@ -2,7 +2,7 @@ from datetime import date
 
 from sqlalchemy.orm import Session
 
-from app.models.rebate import RebateProgram, RetrofitType, RebateRetrofitType
+from app.data.catalog_loader import UpsertReport, upsert_catalog
 
 
 RETROFIT_TYPES = [
@@ -683,32 +683,6 @@ REBATE_PROGRAMS = [
 ]
 
 
-def seed_database(db: Session) -> None:
-    """Populate database with retrofit types and rebate program data."""
-    if db.query(RebateProgram).count() > 0:
-        return  # Already seeded
-
-    # Insert retrofit types
-    type_map: dict[str, int] = {}
-    for rt_data in RETROFIT_TYPES:
-        rt = RetrofitType(**rt_data)
-        db.add(rt)
-        db.flush()
-        type_map[rt_data["name"]] = rt.id
-
-    # Insert rebate programs with retrofit type associations
-    for program_data in REBATE_PROGRAMS:
-        data = {k: v for k, v in program_data.items() if k != "retrofit_types"}
-        retrofit_names = program_data["retrofit_types"]
-        program = RebateProgram(**data)
-        db.add(program)
-        db.flush()
-
-        for rt_name in retrofit_names:
-            assoc = RebateRetrofitType(
-                rebate_id=program.id,
-                retrofit_type_id=type_map[rt_name],
-            )
-            db.add(assoc)
-
-    db.commit()
+def seed_database(db: Session) -> UpsertReport:
+    """Bring the database in line with the retrofit types and rebate programs above."""
+    return upsert_catalog(db, RETROFIT_TYPES, REBATE_PROGRAMS)
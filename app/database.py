@@ -1,20 +1,90 @@
-from sqlalchemy import create_engine, event
+import hashlib
+import importlib.util
+from typing import Any, Optional
+
+from sqlalchemy import Connection, create_engine, delete, event, insert, select
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateIndex, CreateTable
 
 from app.config import settings
+from app.metrics import instrument_engine
+
+
+def _engine_options(url: URL) -> dict[str, Any]:
+    """Pool and connect arguments from settings for ``url``'s backend and driver."""
+    options: dict[str, Any] = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    backend = url.get_backend_name()
+    if not (backend == "sqlite" and url.database in (None, "", ":memory:")):
+        # In-memory SQLite gets a single shared connection, which takes no sizing.
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+        )
+        if url.get_driver_name() == "aiosqlite":
+            # aiosqlite defaults to NullPool here; pool file connections like the sync engine does.
+            options["poolclass"] = AsyncAdaptedQueuePool
+
+    if backend == "sqlite":
+        if url.get_driver_name() == "pysqlite":
+            options["connect_args"] = {"check_same_thread": False}
+    elif backend == "postgresql":
+        server_settings = {}
+        if settings.db_statement_timeout_ms is not None:
+            server_settings["statement_timeout"] = str(settings.db_statement_timeout_ms)
+        if settings.database_read_only:
+            server_settings["default_transaction_read_only"] = "on"
+        if server_settings:
+            if url.get_driver_name() == "asyncpg":
+                options["connect_args"] = {"server_settings": server_settings}
+            else:
+                options["connect_args"] = {"options": " ".join(f"-c {k}={v}" for k, v in server_settings.items())}
+    return options
+
+
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    pragmas = []
+    if not settings.database_read_only:
+        # WAL for better concurrent read performance. Switching journal modes
+        # writes the database header, which a read-only deployment cannot do.
+        pragmas.append(("journal_mode", "WAL"))
+    if settings.sqlite_busy_timeout_ms is not None:
+        pragmas.append(("busy_timeout", settings.sqlite_busy_timeout_ms))
+    if settings.sqlite_synchronous is not None:
+        pragmas.append(("synchronous", settings.sqlite_synchronous))
+    if settings.sqlite_cache_size is not None:
+        pragmas.append(("cache_size", settings.sqlite_cache_size))
+    if settings.sqlite_mmap_size is not None:
+        pragmas.append(("mmap_size", settings.sqlite_mmap_size))
+    if settings.sqlite_temp_store is not None:
+        pragmas.append(("temp_store", settings.sqlite_temp_store))
+    if settings.database_read_only:
+        pragmas.append(("query_only", "ON"))
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
-)
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas:
+        # Values are ints or Literal-validated keywords, so formatting them in is safe.
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
 
-# Enable WAL mode for SQLite for better concurrent read performance
-if "sqlite" in settings.database_url:
-    @event.listens_for(engine, "connect")
-    def set_sqlite_pragma(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA journal_mode=WAL")
-        cursor.close()
+
+def _create_engine(url: str):
+    engine = create_engine(url, **_engine_options(make_url(url)))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragma)
+    if settings.metrics_enabled:
+        instrument_engine(engine)
+    return engine
+
+
+engine = _create_engine(settings.database_url)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -28,6 +98,134 @@ def get_db():
         db.close()
 
 
+# ── Async engine ─────────────────────────────────────────────
+
+# asyncio drivers for each sync backend; install aiosqlite or asyncpg to match.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+def async_database_url() -> str:
+    """``settings.async_database_url``, or ``database_url`` switched to its asyncio driver."""
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = make_url(settings.database_url)
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No asyncio driver configured for {url.get_backend_name()!r}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def get_async_engine() -> AsyncEngine:
+    """Create the async engine on first use, so the driver is only imported when needed."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        url = async_database_url()
+        _async_engine = create_async_engine(url, **_engine_options(make_url(url)))
+        if _async_engine.dialect.name == "sqlite":
+            event.listen(_async_engine.sync_engine, "connect", set_sqlite_pragma)
+        if settings.metrics_enabled:
+            instrument_engine(_async_engine.sync_engine)
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+async def get_async_db():
+    get_async_engine()
+    async with _async_sessionmaker() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    """Close the async engine's pool; the next request creates a fresh one."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+
+
 def init_db():
     import app.models  # noqa: F401 — ensure all models are registered
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so add indexes introduced since they were created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    from app.services.fulltext import create_fulltext_index
+
+    with engine.begin() as conn:
+        create_fulltext_index(conn)
+
+
+# ── Startup stamps ───────────────────────────────────────────
+
+
+def schema_stamp() -> str:
+    """Digest of the DDL ``init_db`` runs; any model or index change produces a new one."""
+    import app.models  # noqa: F401 — ensure all models are registered
+    from app.services.fulltext import FTS_COLUMNS, FTS_TABLE
+
+    digest = hashlib.blake2b(digest_size=16)
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=engine.dialect)).encode())
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            digest.update(str(CreateIndex(index).compile(dialect=engine.dialect)).encode())
+    digest.update(repr((FTS_TABLE, FTS_COLUMNS)).encode())
+    return digest.hexdigest()
+
+
+def seed_stamp() -> str:
+    """Digest of the seed catalog's source, read without importing the ~700-line module."""
+    spec = importlib.util.find_spec("app.data.seed_rebates")
+    with open(spec.origin, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def read_stamps() -> dict[str, str]:
+    from app.models.stamp import DatabaseStamp
+
+    try:
+        with engine.connect() as conn:
+            return dict(conn.execute(select(DatabaseStamp.name, DatabaseStamp.value)).all())
+    except DBAPIError:
+        # No stamps table: a new database, or one created before stamps existed
+        return {}
+
+
+def _write_stamp(conn: Connection, name: str, value: str) -> None:
+    from app.models.stamp import DatabaseStamp
+
+    conn.execute(delete(DatabaseStamp).where(DatabaseStamp.name == name))
+    conn.execute(insert(DatabaseStamp).values(name=name, value=value))
+
+
+def prepare_database() -> None:
+    """``init_db`` and ``seed_database``, each skipped while the database's stamp for it matches.
+
+    Where both match, this is one query and no DDL, and the seed data is
+    never imported. Stamps are only written after their step succeeds.
+    """
+    stamps = read_stamps()
+    schema = schema_stamp()
+    if stamps.get("schema") != schema:
+        init_db()
+        with engine.begin() as conn:
+            _write_stamp(conn, "schema", schema)
+
+    seed = seed_stamp()
+    if stamps.get("seed") != seed:
+        from app.data.seed_rebates import seed_database
+
+        db = SessionLocal()
+        try:
+            seed_database(db)
+        finally:
+            db.close()
+        with engine.begin() as conn:
+            _write_stamp(conn, "seed", seed)
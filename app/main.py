@@ -1,22 +1,71 @@
+import asyncio
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import init_db, SessionLocal
-from app.data.seed_rebates import seed_database
+from app.config import settings
+from app.database import init_db, dispose_async_engine, prepare_database, SessionLocal
+from app.metrics import MetricsMiddleware, STARTUP_CATALOG_SECONDS, STARTUP_DATABASE_SECONDS, render_metrics
+from app.services.catalog import Catalog, build_catalog, set_catalog, warm_catalog
+from app.services.catalog_file import open_catalog_file
+from app.services.rebate_service import shutdown_process_pool
+from app.static_assets import PrecompressedStaticFiles
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+def _prepare_database() -> None:
+    if settings.lazy_startup:
+        prepare_database()
+        return
+    from app.data.seed_rebates import seed_database
+
     init_db()
     db = SessionLocal()
     try:
         seed_database(db)
     finally:
         db.close()
+
+
+def _load_catalog() -> Catalog:
+    """Open or build the catalog and its indexes, then serve it."""
+    started = time.perf_counter()
+    if settings.catalog_snapshot_path:
+        # The build step seeded the database; map its snapshot, shared with the other workers.
+        catalog = open_catalog_file(settings.catalog_snapshot_path)
+    else:
+        db = SessionLocal()
+        try:
+            catalog = build_catalog(db)
+        finally:
+            db.close()
+    # Full-text index and search matrix, before requests see the catalog
+    set_catalog(warm_catalog(catalog))
+    STARTUP_CATALOG_SECONDS.set(time.perf_counter() - started)
+    return catalog
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # A snapshot was built from a seeded database, and a read-only replica is
+    # provisioned by its primary; neither touches the schema or the seed data.
+    if not (settings.catalog_snapshot_path or settings.database_read_only):
+        _prepare_database()
+    STARTUP_DATABASE_SECONDS.set(time.perf_counter() - started)
+
+    loading = None
+    if settings.lazy_startup:
+        # Requests query the database until the catalog is ready
+        loading = asyncio.get_running_loop().run_in_executor(None, _load_catalog)
+    else:
+        _load_catalog()
     yield
+    if loading is not None:
+        await loading
+    shutdown_process_pool()
+    await dispose_async_engine()
 
 
 app = FastAPI(
@@ -34,6 +83,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.metrics_enabled:
+    # Added last so it is outermost and times the whole middleware stack
+    app.add_middleware(MetricsMiddleware)
+
 from app.api.rebates import router as rebates_router  # noqa: E402
 
 app.include_router(rebates_router)
@@ -44,4 +97,9 @@ def health_check():
     return {"status": "ok"}
 
 
-app.mount("/", StaticFiles(directory="app/static", html=True), name="static")
+@app.get("/api/metrics", include_in_schema=False)
+def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+app.mount("/", PrecompressedStaticFiles(directory=settings.static_dir, html=True), name="static")
@@ -0,0 +1,236 @@
+"""In-process request metrics, rendered in the Prometheus text exposition format.
+
+``MetricsMiddleware`` times every HTTP request per route template and, through
+engine events installed by ``instrument_engine``, counts the SQL statements
+and database time spent on its behalf. Per-request totals live in a context
+variable, which follows the request into the threadpool and into
+SQLAlchemy's async greenlets, so no request objects are passed around.
+
+Recording a sample is a bisect and two additions under a lock; nothing is
+formatted until ``/api/metrics`` is scraped.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Prometheus histogram with one series per label tuple."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [(values, list(counts), total) for values, (counts, total) in sorted(self._series.items())]
+        for values, counts, total in snapshot:
+            pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)]
+            labels = "{" + ",".join(pairs) + "}" if pairs else ""
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_labels = ",".join([*pairs, f'le="{bound}"'])
+                yield f"{self.name}_bucket{{{bucket_labels}}} {cumulative}"
+            yield f"{self.name}_sum{labels} {total!r}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Gauge:
+    """Prometheus gauge holding a single value, set by whatever owns the measured thing."""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.value!r}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ("method", "route", "status"),
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed while handling a request.",
+    ("route",),
+    QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent executing SQL statements while handling a request.",
+    ("route",),
+)
+REQUEST_SERIALIZATION_SECONDS = Histogram(
+    "http_request_serialization_seconds",
+    "Time spent converting rebate programs to response schemas, for requests that did.",
+    ("route",),
+)
+
+HISTOGRAMS = (REQUEST_SECONDS, REQUEST_DB_QUERIES, REQUEST_DB_SECONDS, REQUEST_SERIALIZATION_SECONDS)
+
+SEARCH_MATRIX_BUILD_SECONDS = Gauge(
+    "search_matrix_build_seconds",
+    "Time the last build of the precomputed search responses took.",
+)
+SEARCH_MATRIX_BYTES = Gauge(
+    "search_matrix_bytes",
+    "Memory held by the precomputed search responses: result ids, bodies, ETags and keys.",
+)
+SEARCH_MATRIX_ENTRIES = Gauge(
+    "search_matrix_entries",
+    "Searches with a precomputed response, one per province, retrofit type and active_only value.",
+)
+STARTUP_DATABASE_SECONDS = Gauge(
+    "startup_database_seconds",
+    "Time startup spent creating tables and seeding, or checking their stamps on a lazy startup.",
+)
+STARTUP_CATALOG_SECONDS = Gauge(
+    "startup_catalog_seconds",
+    "Time from starting to load the catalog to serving it with its indexes built; in the background on a lazy startup.",
+)
+
+# Gauges describe current state, so reset_metrics leaves them alone.
+GAUGES = (
+    SEARCH_MATRIX_BUILD_SECONDS,
+    SEARCH_MATRIX_BYTES,
+    SEARCH_MATRIX_ENTRIES,
+    STARTUP_DATABASE_SECONDS,
+    STARTUP_CATALOG_SECONDS,
+)
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for metric in (*HISTOGRAMS, *GAUGES):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    for histogram in HISTOGRAMS:
+        histogram.clear()
+
+
+# ── Per-request accounting ──────────────────────────────────
+
+
+class RequestStats:
+    __slots__ = ("db_queries", "db_seconds", "serialization_seconds")
+
+    def __init__(self) -> None:
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+
+# Route label for requests no API route handled: static files and 404s
+UNROUTED = "<unrouted>"
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def record_serialization(seconds: float) -> None:
+    """Charge schema conversion time to the current request, if it is being measured."""
+    stats = _current.get()
+    if stats is not None:
+        stats.serialization_seconds += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get("query_start")
+    if stats is not None and starts:
+        started = starts.pop()
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attribute SQL statements run on ``engine`` to the request executing them."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            # The router stores the matched route in the scope it passes down, which is this dict.
+            route = scope.get("route")
+            label = getattr(route, "path", None) or UNROUTED
+            REQUEST_SECONDS.observe(elapsed, scope["method"], label, status)
+            if label != UNROUTED:
+                REQUEST_DB_QUERIES.observe(stats.db_queries, label)
+                REQUEST_DB_SECONDS.observe(stats.db_seconds, label)
+                if stats.serialization_seconds:
+                    REQUEST_SERIALIZATION_SECONDS.observe(stats.serialization_seconds, label)
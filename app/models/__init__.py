@@ -1,7 +1,10 @@
-from app.models.rebate import RebateProgram, RetrofitType, RebateRetrofitType
+from app.models.rebate import RebateProgram, RetrofitType, RebateRetrofitType, ProvinceProgramCount
+from app.models.stamp import DatabaseStamp
 
 __all__ = [
     "RebateProgram",
     "RetrofitType",
     "RebateRetrofitType",
+    "ProvinceProgramCount",
+    "DatabaseStamp",
 ]
@@ -1,10 +1,13 @@
 from datetime import datetime, date, timezone
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, Text, Date, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, Text, Date, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.database import Base
 
+# ``ProvinceProgramCount.category`` of the row counting programs of every category
+ALL_CATEGORIES = ""
+
 
 def _utcnow():
     return datetime.now(timezone.utc)
@@ -12,6 +15,10 @@ def _utcnow():
 
 class RebateProgram(Base):
     __tablename__ = "rebate_programs"
+    __table_args__ = (
+        # Active listings filtered by province and ordered by (province, name)
+        Index("ix_rebate_programs_active_province_name", "is_active", "province", "name"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(200), nullable=False)
@@ -53,7 +60,27 @@ class RetrofitType(Base):
 
 class RebateRetrofitType(Base):
     __tablename__ = "rebate_retrofit_types"
+    __table_args__ = (
+        # Reverse of the primary key: programs offering a given retrofit type
+        Index("ix_rebate_retrofit_types_type_rebate", "retrofit_type_id", "rebate_id"),
+    )
 
     rebate_id = Column(Integer, ForeignKey("rebate_programs.id"), primary_key=True)
     retrofit_type_id = Column(Integer, ForeignKey("retrofit_types.id"), primary_key=True)
     specific_amount = Column(String(200), nullable=True)
+
+
+class ProvinceProgramCount(Base):
+    """Program counts per (province, retrofit category, is_active).
+
+    Materialized by ``app.data.catalog_loader.refresh_program_counts`` whenever
+    the catalog is written. A program counts once in each category it offers
+    and once in the ``ALL_CATEGORIES`` row.
+    """
+
+    __tablename__ = "province_program_counts"
+
+    province = Column(String(50), primary_key=True)
+    category = Column(String(50), primary_key=True)
+    is_active = Column(Boolean, primary_key=True)
+    program_count = Column(Integer, nullable=False)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, DateTime, String
+
+from app.database import Base
+from app.models.rebate import _utcnow
+
+
+class DatabaseStamp(Base):
+    """What the database was last brought in line with, by name.
+
+    ``schema`` is a digest of the tables and indexes ``init_db`` creates,
+    ``seed`` of the seed catalog ``seed_database`` loads. A lazy startup
+    skips either step while its stamp matches (see ``prepare_database``).
+    """
+
+    __tablename__ = "database_stamps"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=_utcnow, onupdate=_utcnow)
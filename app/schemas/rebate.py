@@ -1,7 +1,7 @@
 from datetime import date
-from typing import Optional
+from typing import Any, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class RetrofitTypeSchema(BaseModel):
@@ -36,11 +36,61 @@ class RebateListResponse(BaseModel):
     count: int
 
 
+class RebatePageResponse(BaseModel):
+    rebates: list[dict[str, Any]]
+    count: int
+    next_cursor: Optional[str] = None
+
+
+class FulltextResult(BaseModel):
+    score: float
+    rebate: RebateSchema
+
+
+class FulltextResponse(BaseModel):
+    results: list[FulltextResult]
+    count: int
+
+
+class FacetCounts(BaseModel):
+    retrofit_types: dict[str, int]
+    categories: dict[str, int]
+    provinces: dict[str, int]
+    income_tested: dict[bool, int]
+
+
+class FacetResponse(BaseModel):
+    rebates: list[RebateSchema]
+    count: int
+    total: int
+    facets: FacetCounts
+
+
 class ProvinceInfo(BaseModel):
     code: str
     name: str
     program_count: int
+    inactive_count: int = 0
+    # Active programs per retrofit category; a program offering several categories counts in each
+    category_counts: dict[str, int] = {}
 
 
 class ProvinceListResponse(BaseModel):
     provinces: list[ProvinceInfo]
+
+
+class TextAnalysisItem(BaseModel):
+    text: str = Field(..., max_length=10_000)
+    session_province: Optional[str] = None
+
+
+class BatchAnalyzeRequest(BaseModel):
+    items: list[TextAnalysisItem] = Field(..., max_length=100_000)
+    limit: int = Field(8, ge=1, le=50)
+
+
+class TextAnalysisResult(BaseModel):
+    index: int
+    province: Optional[str] = None
+    retrofit_types: list[str]
+    rebate_ids: list[int]
@@ -0,0 +1,521 @@
+"""Immutable in-memory snapshot of the rebate catalog.
+
+The catalog is seeded once and then only read, so the API answers from a
+snapshot built at startup instead of querying the database per request. The
+database stays the source of truth: call ``reload_catalog`` after writing to it
+and the new snapshot replaces the old one atomically.
+
+A snapshot can also be written to a file once and memory-mapped by every
+worker (``app.services.catalog_file``); the indexes below are positions into
+a sequence of records so that they work the same over either.
+"""
+
+import hashlib
+import math
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import compress, islice
+from typing import Callable, Iterable, Optional, Sequence
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.rebate import ALL_CATEGORIES, RebateProgram, RetrofitType
+
+FEDERAL = "FED"
+
+# (province, category, is_active) -> programs; the shape of ``province_program_counts``
+ProgramCounts = dict[tuple[str, str, bool], int]
+
+# Bits of ``CatalogIndex.flags``
+ACTIVE = 1
+INCOME_TESTED = 2
+# ``CatalogIndex.type_masks`` entries are 64-bit
+MAX_RETROFIT_TYPES = 64
+
+
+@dataclass(frozen=True, slots=True)
+class RetrofitTypeRecord:
+    id: int
+    name: str
+    display_name: str
+    category: str
+
+
+@dataclass(frozen=True, slots=True)
+class ProgramRecord:
+    """Read-only copy of a ``RebateProgram`` row with its retrofit types."""
+
+    id: int
+    name: str
+    province: str
+    provider: str
+    description: str
+    max_amount: Optional[float]
+    amount_description: str
+    eligibility_summary: str
+    how_to_apply: str
+    website_url: Optional[str]
+    is_active: bool
+    end_date: Optional[date]
+    is_income_tested: bool
+    created_at: datetime
+    updated_at: datetime
+    retrofit_types: tuple[RetrofitTypeRecord, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class Facets:
+    """Programs matching a filter, with counts over the whole match."""
+
+    programs: tuple[ProgramRecord | RebateProgram, ...]  # first ``limit`` matches, id order
+    total: int
+    retrofit_types: dict[str, int]
+    categories: dict[str, int]
+    provinces: dict[str, int]
+    income_tested: dict[bool, int]
+
+
+def _bitmap(positions: Iterable[int], size: int) -> int:
+    """An int whose bit ``i`` is set for each ``i`` in ``positions``."""
+    # Build through bytes: OR-ing 1 << i one at a time is quadratic in the catalog size
+    mask = bytearray((size + 7) // 8)
+    for i in positions:
+        mask[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(mask, "little")
+
+
+def _bitmaps(programs: Sequence[ProgramRecord], keys) -> dict:
+    """Map each key to an int whose bit ``i`` is set when ``keys(programs[i])`` yields it."""
+    positions: dict = {}
+    for i, p in enumerate(programs):
+        for key in keys(p):
+            positions.setdefault(key, []).append(i)
+    return {key: _bitmap(bits, len(programs)) for key, bits in positions.items()}
+
+
+def rank_key(p: ProgramRecord | RebateProgram, province: Optional[str], today: date) -> tuple:
+    """Sort key ranking programs for a query, best first, before matched retrofit types are counted.
+
+    Province-specific programs come before federal ones, then active ones,
+    then larger ``max_amount`` (unknown last), then programs whose deadline
+    is still ahead, soonest first, and finally lower ids. ``_rank_order`` in
+    the rebate service is the same ordering in SQL, ``Catalog._rank_key`` the
+    same over index columns.
+    """
+    expired = p.end_date is None or p.end_date < today
+    return (
+        bool(province) and p.province != province,
+        not p.is_active,
+        p.max_amount is None,
+        -(p.max_amount or 0),
+        expired,
+        p.end_date is None,
+        p.end_date or date.min,
+        p.id,
+    )
+
+
+def _listing_key(p: ProgramRecord) -> tuple[str, str]:
+    return (p.province, p.name)
+
+
+def _page_key(p: ProgramRecord) -> tuple[str, str, int]:
+    # Listings are sorted stably from id order, so this is their exact order.
+    return (p.province, p.name, p.id)
+
+
+def _fingerprint(programs: Sequence[ProgramRecord], retrofit_types: Sequence[RetrofitTypeRecord]) -> str:
+    """Content version of a snapshot, identical across processes loading the same data."""
+    h = hashlib.blake2b(digest_size=12)
+    for t in retrofit_types:
+        h.update(repr((t.id, t.name, t.display_name, t.category)).encode())
+    for p in programs:
+        h.update(repr((p.id, p.updated_at, tuple(rt.id for rt in p.retrofit_types))).encode())
+    return h.hexdigest()
+
+
+ScopeKey = tuple[Optional[str], bool]
+
+
+@dataclass(frozen=True)
+class CatalogIndex:
+    """Lookup structures over a catalog's programs, addressed by position in id order.
+
+    Nothing here refers to program objects, so the same index works over
+    records held in memory or decoded on demand from a catalog file, where
+    the integer sequences are views of the mapped file rather than copies.
+    """
+
+    version: str
+    retrofit_types: tuple[RetrofitTypeRecord, ...]  # by (category, display_name)
+    provinces: tuple[str, ...]
+    # Program ``i``'s retrofit types are positions in ``retrofit_types``:
+    # ``link_types[link_starts[i]:link_starts[i + 1]]``, in their stored order.
+    link_starts: Sequence[int]
+    link_types: Sequence[int]
+    # One entry per program, for filtering and ranking without touching records:
+    # bit ``t`` of ``type_masks[i]`` is set when it has ``retrofit_types[t]``;
+    # ``province_codes[i]`` indexes ``provinces``; ``max_amounts`` is NaN and
+    # ``end_dates`` (proleptic ordinals) 0 where the value is unknown.
+    type_masks: Sequence[int]
+    province_codes: Sequence[int]
+    flags: Sequence[int]
+    max_amounts: Sequence[float]
+    end_dates: Sequence[int]
+    # Program positions per (province, active_only): id order and listing order
+    scopes: dict[ScopeKey, Sequence[int]]
+    listings: dict[ScopeKey, Sequence[int]]
+    program_counts: ProgramCounts
+    # Bitmap indexes over positions, for faceted counts
+    type_bits: dict[str, int]
+    category_bits: dict[str, int]
+    province_bits: dict[str, int]
+    active_bits: int
+    income_tested_bits: int
+
+
+def index_programs(programs: Sequence[ProgramRecord], retrofit_types: Iterable[RetrofitTypeRecord]) -> CatalogIndex:
+    """Build the index of ``programs``, which must be in id order."""
+    types = tuple(sorted(retrofit_types, key=lambda t: (t.category, t.display_name)))
+    if len(types) > MAX_RETROFIT_TYPES:
+        raise ValueError(f"{len(types)} retrofit types; type masks hold at most {MAX_RETROFIT_TYPES}")
+    type_positions = {t.id: i for i, t in enumerate(types)}
+    provinces = tuple(sorted({p.province for p in programs} | {FEDERAL}))
+    province_positions = {code: i for i, code in enumerate(provinces)}
+
+    link_starts, link_types = array("I", [0]), array("I")
+    type_masks, province_codes, flags = array("Q"), array("H"), array("B")
+    max_amounts, end_dates = array("d"), array("i")
+    for p in programs:
+        positions = [type_positions[rt.id] for rt in p.retrofit_types]
+        link_types.extend(positions)
+        link_starts.append(len(link_types))
+        type_masks.append(sum(1 << t for t in set(positions)))
+        province_codes.append(province_positions[p.province])
+        flags.append((ACTIVE if p.is_active else 0) | (INCOME_TESTED if p.is_income_tested else 0))
+        max_amounts.append(math.nan if p.max_amount is None else p.max_amount)
+        end_dates.append(p.end_date.toordinal() if p.end_date else 0)
+
+    counts: ProgramCounts = {}
+    for p in programs:
+        for category in (ALL_CATEGORIES, *{rt.category for rt in p.retrofit_types}):
+            key = (p.province, category, p.is_active)
+            counts[key] = counts.get(key, 0) + 1
+
+    scopes: dict[ScopeKey, Sequence[int]] = {}
+    listings: dict[ScopeKey, Sequence[int]] = {}
+    for active_only in (True, False):
+        pool = [i for i, p in enumerate(programs) if p.is_active or not active_only]
+        for code in (None, *provinces):
+            scope = pool if code is None else [i for i in pool if programs[i].province in (code, FEDERAL)]
+            scopes[(code, active_only)] = array("I", scope)
+            # Stable sort from id order
+            listings[(code, active_only)] = array("I", sorted(scope, key=lambda i: _listing_key(programs[i])))
+
+    flag_bits = _bitmaps(programs, lambda p: (("active", p.is_active), ("income_tested", p.is_income_tested)))
+    return CatalogIndex(
+        version=_fingerprint(programs, types),
+        retrofit_types=types,
+        provinces=provinces,
+        link_starts=link_starts,
+        link_types=link_types,
+        type_masks=type_masks,
+        province_codes=province_codes,
+        flags=flags,
+        max_amounts=max_amounts,
+        end_dates=end_dates,
+        scopes=scopes,
+        listings=listings,
+        program_counts=counts,
+        type_bits=_bitmaps(programs, lambda p: {rt.name for rt in p.retrofit_types}),
+        category_bits=_bitmaps(programs, lambda p: {rt.category for rt in p.retrofit_types}),
+        province_bits=_bitmaps(programs, lambda p: (p.province,)),
+        active_bits=flag_bits.get(("active", True), 0),
+        income_tested_bits=flag_bits.get(("income_tested", True), 0),
+    )
+
+
+class Catalog:
+    """Programs and retrofit types with lookup indexes precomputed.
+
+    ``version`` changes whenever a program row is updated or its retrofit
+    types change, so it can key caches derived from the snapshot.
+
+    ``programs`` is any sequence of records in id order: a tuple for a
+    snapshot built from the database, or a view decoding records from a
+    memory-mapped catalog file (see ``app.services.catalog_file``). Indexes
+    hold positions into it, never records.
+
+    Scopes are keyed by ``(province, active_only)`` and always include federal
+    programs, mirroring the ``province IN (x, 'FED')`` filter of the SQL path.
+    The ``None`` province scope holds every program.
+    """
+
+    def __init__(self, programs: Sequence[ProgramRecord], index: CatalogIndex):
+        self.programs: Sequence[ProgramRecord] = programs
+        self.index: CatalogIndex = index
+        self.version: str = index.version
+        self.retrofit_types: tuple[RetrofitTypeRecord, ...] = index.retrofit_types
+        self.provinces: tuple[str, ...] = index.provinces
+        self.program_counts: ProgramCounts = index.program_counts
+        self._type_masks: dict[str, int] = {t.name: 1 << i for i, t in enumerate(index.retrofit_types)}
+        self._province_counts: dict[bool, list[tuple[str, int]]] = {
+            active_only: _province_totals(index.program_counts, active_only) for active_only in (True, False)
+        }
+        # Scopes sorted by ``rank_key``, built on demand; the key depends on the date.
+        self._ranked: dict[ScopeKey, tuple[date, array]] = {}
+
+    @classmethod
+    def build(cls, programs: Iterable[ProgramRecord], retrofit_types: Iterable[RetrofitTypeRecord]) -> "Catalog":
+        """Index records held in memory."""
+        ordered = tuple(sorted(programs, key=lambda p: p.id))
+        return cls(ordered, index_programs(ordered, retrofit_types))
+
+    def scope_key(self, province: Optional[str], active_only: bool) -> ScopeKey:
+        """The scope a province/active filter selects; every unknown province shares the federal one."""
+        # An unknown province still matches federal programs, like the SQL filter does.
+        if province and province not in self.provinces:
+            province = FEDERAL
+        return (province or None, active_only)
+
+    def scope(self, province: Optional[str] = None, active_only: bool = True) -> Sequence[int]:
+        """Positions in ``programs`` of the programs a province/active filter selects, in id order."""
+        return self.index.scopes[self.scope_key(province, active_only)]
+
+    def _records(self, positions: Iterable[int]) -> list[ProgramRecord]:
+        programs = self.programs
+        return [programs[i] for i in positions]
+
+    def list_rebates(self, province: Optional[str] = None, active_only: bool = True) -> list[ProgramRecord]:
+        return self._records(self.index.listings[self.scope_key(province, active_only)])
+
+    def list_page(
+        self,
+        province: Optional[str] = None,
+        active_only: bool = True,
+        limit: int = 50,
+        after: Optional[tuple[str, str, int]] = None,
+    ) -> list[ProgramRecord]:
+        """Up to ``limit`` programs ordered by (province, name, id), strictly after ``after``."""
+        listing = self.index.listings[self.scope_key(province, active_only)]
+        programs = self.programs
+        start = 0 if after is None else bisect_right(listing, tuple(after), key=lambda i: _page_key(programs[i]))
+        return self._records(listing[start:start + limit])
+
+    def _rank_key(self, province: Optional[str], today: date) -> Callable[[int], tuple]:
+        """``rank_key`` computed from the index columns, keyed by position."""
+        index = self.index
+        codes, flags, amounts, ends = index.province_codes, index.flags, index.max_amounts, index.end_dates
+        code = index.provinces.index(province) if province in index.provinces else -1
+        today_ordinal = today.toordinal()
+
+        def key(i: int) -> tuple:
+            amount, end = amounts[i], ends[i]
+            known = amount == amount  # not NaN
+            return (
+                bool(province) and codes[i] != code,
+                not flags[i] & ACTIVE,
+                not known,
+                -amount if known else 0,
+                end == 0 or end < today_ordinal,
+                end == 0,
+                end,
+                i,  # positions are in id order
+            )
+
+        return key
+
+    def _ranked_scope(self, province: Optional[str], active_only: bool, today: date) -> array:
+        key = self.scope_key(province, active_only)
+        cached = self._ranked.get(key)
+        if cached is None or cached[0] != today:
+            ranked = array("I", sorted(self.index.scopes[key], key=self._rank_key(province or None, today)))
+            self._ranked[key] = cached = (today, ranked)
+        return cached[1]
+
+    def find_matching(
+        self,
+        province: Optional[str] = None,
+        retrofit_types: Optional[list[str]] = None,
+        active_only: bool = True,
+        limit: int = 8,
+        today: Optional[date] = None,
+    ) -> list[ProgramRecord]:
+        """Top ``limit`` programs, most matched retrofit types first, then by ``rank_key``."""
+        ranked = self._ranked_scope(province, active_only, today or date.today())
+        if not retrofit_types:
+            return self._records(ranked[:limit])
+
+        wanted = 0
+        for name in retrofit_types:
+            wanted |= self._type_masks.get(name, 0)
+        if not wanted:
+            return []
+
+        # Matched-type counts are computed over the ranked scope in C, with no
+        # Python code per program, a chunk at a time: the first ``limit``
+        # programs counting n are the best ones with n matches, so the scan
+        # stops as soon as the bucket of programs with every type fills.
+        # Chunks double so that stopping early is cheap and a full scan is not.
+        masks = self.index.type_masks
+        best = wanted.bit_count()
+        buckets: dict[int, list[int]] = {}
+        start, size = 0, 256
+        while start < len(ranked) and len(buckets.get(best, ())) < limit:
+            chunk = ranked[start:start + size]
+            counts = bytes(map(int.bit_count, map(wanted.__and__, map(masks.__getitem__, chunk))))
+            for matched in set(counts) - {0}:
+                bucket = buckets.setdefault(matched, [])
+                if len(bucket) < limit:
+                    bucket.extend(islice(compress(chunk, map(matched.__eq__, counts)), limit - len(bucket)))
+            start, size = start + size, size * 2
+
+        matches: list[int] = []
+        for matched in sorted(buckets, reverse=True):
+            matches.extend(buckets[matched][:limit - len(matches)])
+        return self._records(matches)
+
+    def facets(
+        self,
+        province: Optional[str] = None,
+        retrofit_types: Optional[list[str]] = None,
+        active_only: bool = True,
+        limit: int = 50,
+    ) -> Facets:
+        """Filter like ``find_matching`` and count the whole match per facet with bitmap ANDs."""
+        index = self.index
+        match = (1 << len(self.programs)) - 1
+        if province:
+            match = index.province_bits.get(province, 0) | index.province_bits.get(FEDERAL, 0)
+        if active_only:
+            match &= index.active_bits
+        if retrofit_types:
+            wanted = 0
+            for name in retrofit_types:
+                wanted |= index.type_bits.get(name, 0)
+            match &= wanted
+
+        programs: list[ProgramRecord] = []
+        rest = match
+        while rest and len(programs) < limit:
+            low = rest & -rest
+            programs.append(self.programs[low.bit_length() - 1])
+            rest ^= low
+
+        def counts(bitmaps: dict[str, int]) -> dict[str, int]:
+            found = {key: (match & bits).bit_count() for key, bits in sorted(bitmaps.items())}
+            return {key: n for key, n in found.items() if n}
+
+        total = match.bit_count()
+        income_tested = (match & index.income_tested_bits).bit_count()
+        return Facets(
+            programs=tuple(programs),
+            total=total,
+            retrofit_types=counts(index.type_bits),
+            categories=counts(index.category_bits),
+            provinces=counts(index.province_bits),
+            income_tested={True: income_tested, False: total - income_tested},
+        )
+
+    def province_counts(self, active_only: bool = True) -> list[tuple[str, int]]:
+        return list(self._province_counts[active_only])
+
+
+def _province_totals(counts: ProgramCounts, active_only: bool) -> list[tuple[str, int]]:
+    """Programs per province, ordered by code, from an ``ALL_CATEGORIES`` breakdown."""
+    totals: dict[str, int] = {}
+    for (province, category, is_active), count in counts.items():
+        if category == ALL_CATEGORIES and (is_active or not active_only):
+            totals[province] = totals.get(province, 0) + count
+    return sorted(totals.items())
+
+
+def build_catalog(db: Session) -> Catalog:
+    """Read the full catalog from the database into a new snapshot."""
+    types = {
+        t.id: RetrofitTypeRecord(id=t.id, name=t.name, display_name=t.display_name, category=t.category)
+        for t in db.query(RetrofitType).all()
+    }
+    programs = [
+        ProgramRecord(
+            id=r.id,
+            name=r.name,
+            province=r.province,
+            provider=r.provider,
+            description=r.description,
+            max_amount=r.max_amount,
+            amount_description=r.amount_description,
+            eligibility_summary=r.eligibility_summary,
+            how_to_apply=r.how_to_apply,
+            website_url=r.website_url,
+            is_active=r.is_active,
+            end_date=r.end_date,
+            is_income_tested=r.is_income_tested,
+            created_at=r.created_at,
+            updated_at=r.updated_at,
+            retrofit_types=tuple(types[rt.id] for rt in r.retrofit_types),
+        )
+        for r in db.query(RebateProgram).options(selectinload(RebateProgram.retrofit_types)).all()
+    ]
+    return Catalog.build(programs, types.values())
+
+
+# ── Process-wide snapshot ────────────────────────────────────
+
+_current: Optional[Catalog] = None
+# Build what other modules derive from a catalog, e.g. the full-text index
+_warmers: list[Callable[[Catalog], None]] = []
+
+
+def add_catalog_warmer(warm: Callable[[Catalog], None]) -> None:
+    """Have ``warm_catalog`` call ``warm`` on every catalog before it is served."""
+    _warmers.append(warm)
+
+
+def warm_catalog(catalog: Catalog) -> Catalog:
+    """Build the indexes derived from ``catalog`` now rather than on the first request needing them."""
+    for warm in _warmers:
+        warm(catalog)
+    return catalog
+
+
+def get_catalog() -> Optional[Catalog]:
+    """Return the loaded snapshot, or ``None`` when callers must query the database."""
+    return _current
+
+
+def load_catalog(db: Session) -> Catalog:
+    """Build a snapshot from ``db`` and make it the one served to requests."""
+    global _current
+    _current = build_catalog(db)
+    return _current
+
+
+def set_catalog(catalog: Catalog) -> Catalog:
+    """Serve ``catalog``, e.g. one opened from a snapshot file, to requests."""
+    global _current
+    _current = catalog
+    return _current
+
+
+def reload_catalog() -> Catalog:
+    """Rebuild and warm the snapshot from a fresh session. Call after writing to the catalog tables.
+
+    The old snapshot keeps serving until the new one and its indexes are ready.
+    """
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        catalog = build_catalog(db)
+    finally:
+        db.close()
+    return set_catalog(warm_catalog(catalog))
+
+
+def clear_catalog() -> None:
+    """Drop the snapshot so service functions fall back to querying the database."""
+    global _current
+    _current = None
@@ -0,0 +1,395 @@
+"""Compact binary catalog snapshot, memory-mapped read-only by every worker.
+
+``write_catalog_file`` serializes a ``Catalog`` built from the database:
+fixed-width program rows, a deduplicated UTF-8 string heap, the index's
+per-program columns and retrofit-type link table, every scope and listing as
+position arrays, and the facet bitmaps. ``open_catalog_file`` maps the file
+with ``mmap`` and returns a ``Catalog`` whose index arrays are views of the
+mapping and whose programs are decoded from it on access, so the bulk of the
+catalog lives once in the OS page cache however many uvicorn workers serve it.
+
+Layout (little-endian)::
+
+    MAGIC | u32 header length | header JSON | padding to 8 | sections...
+
+The header holds the snapshot version, the small tables (retrofit types,
+provinces, program counts) and the offset of every section. The full-text
+index's BM25 postings are stored too, so workers do not each rebuild them. Files are
+replaced atomically; a worker that has mapped the old one keeps serving it
+until it reopens.
+
+Build it after seeding and point ``CATALOG_SNAPSHOT_PATH`` at it::
+
+    python -m app.services.catalog_file retrofit_catalog.bin
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Mapping, Optional, Sequence, overload
+
+from app.services.catalog import (
+    ACTIVE,
+    INCOME_TESTED,
+    Catalog,
+    CatalogIndex,
+    ProgramRecord,
+    RetrofitTypeRecord,
+    build_catalog,
+)
+from app.services.fulltext import InvertedIndex, get_memory_index, set_memory_index
+
+MAGIC = b"RBCATLG\x01"
+FORMAT = 2
+
+_LENGTH = struct.Struct("<I")
+_STRING_FIELDS = (
+    "name",
+    "provider",
+    "description",
+    "amount_description",
+    "eligibility_summary",
+    "how_to_apply",
+    "website_url",
+)
+# id, created_at, updated_at (µs since the epoch), then (offset, length) per
+# string field. Province, flags, max_amount and end_date are index columns.
+_ROW = struct.Struct("<qqq" + "II" * len(_STRING_FIELDS))
+_NONE = 0xFFFFFFFF  # string length of a NULL
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class CatalogFileError(Exception):
+    """The file is not a catalog snapshot this version can read."""
+
+
+def _micros(value: datetime) -> int:
+    # The columns are naive UTC; convert aware values rather than reject them
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _encode_rows(programs: Sequence[ProgramRecord]) -> tuple[bytearray, bytearray]:
+    rows = bytearray(_ROW.size * len(programs))
+    heap = bytearray()
+    offsets: dict[str, int] = {}
+
+    def ref(value: Optional[str]) -> tuple[int, int]:
+        if value is None:
+            return 0, _NONE
+        encoded = value.encode()
+        offset = offsets.get(value)
+        if offset is None:
+            offset = offsets[value] = len(heap)
+            heap.extend(encoded)
+        return offset, len(encoded)
+
+    for i, p in enumerate(programs):
+        strings = [n for field in _STRING_FIELDS for n in ref(getattr(p, field))]
+        _ROW.pack_into(rows, i * _ROW.size, p.id, _micros(p.created_at), _micros(p.updated_at), *strings)
+    return rows, heap
+
+
+def _bitmap_bytes(bits: int, count: int) -> bytes:
+    return bits.to_bytes((count + 7) // 8, "little")
+
+
+def write_catalog_file(catalog: Catalog, path: str) -> int:
+    """Write ``catalog`` to ``path`` atomically; returns the file size in bytes."""
+    programs, index = catalog.programs, catalog.index
+    count = len(programs)
+    rows, heap = _encode_rows(programs)
+
+    positions = array("I")
+    scopes = []
+    for key, scope in index.scopes.items():
+        scopes.append([key[0], key[1], len(positions), len(scope)])
+        positions.extend(scope)
+        positions.extend(index.listings[key])
+
+    bitmap_names = {
+        "type": sorted(index.type_bits),
+        "category": sorted(index.category_bits),
+        "province": sorted(index.province_bits),
+    }
+    bitmaps = bytearray()
+    for kind, bits in (("type", index.type_bits), ("category", index.category_bits), ("province", index.province_bits)):
+        for name in bitmap_names[kind]:
+            bitmaps += _bitmap_bytes(bits[name], count)
+    bitmaps += _bitmap_bytes(index.active_bits, count)
+    bitmaps += _bitmap_bytes(index.income_tested_bits, count)
+
+    def packed(typecode: str, values: Sequence) -> bytes:
+        data = array(typecode, values)
+        if sys.byteorder != "little":
+            data.byteswap()
+        return data.tobytes()
+
+    terms = sorted(get_memory_index(catalog).postings.items())
+    posting_starts, posting_docs, posting_weights = array("I", [0]), array("I"), array("d")
+    for _, (docs, weights) in terms:
+        posting_docs.extend(docs)
+        posting_weights.extend(weights)
+        posting_starts.append(len(posting_docs))
+
+    sections = {
+        "rows": bytes(rows),
+        "strings": bytes(heap),
+        "link_starts": packed("I", index.link_starts),
+        "link_types": packed("I", index.link_types),
+        "type_masks": packed("Q", index.type_masks),
+        "province_codes": packed("H", index.province_codes),
+        "flags": packed("B", index.flags),
+        "max_amounts": packed("d", index.max_amounts),
+        "end_dates": packed("i", index.end_dates),
+        "positions": packed("I", positions),
+        "bitmaps": bytes(bitmaps),
+        # Tokens never contain whitespace
+        "terms": "\n".join(term for term, _ in terms).encode(),
+        "posting_starts": packed("I", posting_starts),
+        "posting_docs": packed("I", posting_docs),
+        "posting_weights": packed("d", posting_weights),
+    }
+    header = {
+        "format": FORMAT,
+        "version": catalog.version,
+        "count": count,
+        "retrofit_types": [[t.id, t.name, t.display_name, t.category] for t in index.retrofit_types],
+        "provinces": list(index.provinces),
+        "program_counts": [[*key, n] for key, n in index.program_counts.items()],
+        "scopes": scopes,
+        "bitmaps": bitmap_names,
+        "sections": {},
+    }
+    # Section offsets depend on the header's length, which depends on the
+    # offsets: lay out with a generous reserve for the offset digits, then pad.
+    header_bytes = json.dumps(header).encode()
+    start = _align(len(MAGIC) + _LENGTH.size + len(header_bytes) + 64 * len(sections))
+    offset = start
+    for name, data in sections.items():
+        header["sections"][name] = [offset, len(data)]
+        offset = _align(offset + len(data))
+    header_bytes = json.dumps(header).encode()
+    assert len(MAGIC) + _LENGTH.size + len(header_bytes) <= start
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".catalog-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + _LENGTH.pack(len(header_bytes)) + header_bytes)
+            for name, data in sections.items():
+                f.seek(header["sections"][name][0])
+                f.write(data)
+            f.truncate(offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)  # mkstemp creates it owner-only; workers may run as another user
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return offset
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class MappedPrograms(Sequence[ProgramRecord]):
+    """Program records decoded from a mapped catalog file as they are read."""
+
+    def __init__(self, mapped: mmap.mmap, rows: int, strings: int, index: CatalogIndex):
+        self._mapped = mapped
+        self._rows = rows
+        self._strings = strings
+        self._index = index
+        self._count = len(index.flags)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, i: int) -> ProgramRecord: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[ProgramRecord]: ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("program position out of range")
+        mapped, base, index = self._mapped, self._strings, self._index
+        fields = _ROW.unpack_from(mapped, self._rows + i * _ROW.size)
+        # Slicing the mmap copies just those bytes, cheaper than decoding through a memoryview
+        name, provider, description, amount_description, eligibility_summary, how_to_apply, url = [
+            None if length == _NONE else mapped[base + offset:base + offset + length].decode()
+            for offset, length in zip(fields[3::2], fields[4::2])
+        ]
+        program_id, created_at, updated_at = fields[:3]
+        max_amount, end_date, flags = index.max_amounts[i], index.end_dates[i], index.flags[i]
+        types = index.retrofit_types
+        return ProgramRecord(
+            id=program_id,
+            name=name,
+            province=index.provinces[index.province_codes[i]],
+            provider=provider,
+            description=description,
+            max_amount=None if max_amount != max_amount else max_amount,  # NaN
+            amount_description=amount_description,
+            eligibility_summary=eligibility_summary,
+            how_to_apply=how_to_apply,
+            website_url=url,
+            is_active=bool(flags & ACTIVE),
+            end_date=date.fromordinal(end_date) if end_date else None,
+            is_income_tested=bool(flags & INCOME_TESTED),
+            created_at=_EPOCH + created_at * _MICROSECOND,
+            updated_at=_EPOCH + updated_at * _MICROSECOND,
+            retrofit_types=tuple(types[t] for t in index.link_types[index.link_starts[i]:index.link_starts[i + 1]]),
+        )
+
+    def __iter__(self) -> Iterator[ProgramRecord]:
+        for i in range(self._count):
+            yield self[i]
+
+
+class MappedPostings(Mapping[str, tuple[Sequence[int], Sequence[float]]]):
+    """Full-text postings read from a mapped catalog file: term -> (positions, weights)."""
+
+    def __init__(self, terms: list[str], starts: Sequence[int], docs: Sequence[int], weights: Sequence[float]):
+        self._terms = {term: i for i, term in enumerate(terms)}
+        self._starts = starts
+        self._docs = docs
+        self._weights = weights
+
+    def __getitem__(self, term: str) -> tuple[Sequence[int], Sequence[float]]:
+        i = self._terms[term]
+        start, end = self._starts[i], self._starts[i + 1]
+        return self._docs[start:end], self._weights[start:end]
+
+    def __contains__(self, term: object) -> bool:
+        return term in self._terms
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._terms)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+
+def open_catalog_file(path: str) -> Catalog:
+    """Map ``path`` read-only and return the catalog it holds.
+
+    The stored full-text postings become the catalog's in-process index.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise CatalogFileError(f"{path} is not a catalog snapshot")
+    (length,) = _LENGTH.unpack_from(view, len(MAGIC))
+    start = len(MAGIC) + _LENGTH.size
+    header = json.loads(bytes(view[start:start + length]))
+    if header["format"] != FORMAT:
+        raise CatalogFileError(f"{path} has format {header['format']}, expected {FORMAT}")
+
+    sections = header["sections"]
+
+    def unpacked(name: str, typecode: str = "I") -> Sequence:
+        offset, size = sections[name]
+        data = view[offset:offset + size]
+        if sys.byteorder == "little":
+            return data.cast(typecode)
+        swapped = array(typecode, bytes(data))  # copies on big-endian hosts
+        swapped.byteswap()
+        return swapped
+
+    count = header["count"]
+    positions = unpacked("positions")
+    scopes, listings = {}, {}
+    for province, active_only, offset, size in header["scopes"]:
+        scopes[(province, active_only)] = positions[offset:offset + size]
+        listings[(province, active_only)] = positions[offset + size:offset + 2 * size]
+
+    width = (count + 7) // 8
+    cursor = sections["bitmaps"][0]
+
+    def bitmap() -> int:
+        nonlocal cursor
+        bits = int.from_bytes(view[cursor:cursor + width], "little")
+        cursor += width
+        return bits
+
+    names = header["bitmaps"]
+    type_bits = {name: bitmap() for name in names["type"]}
+    category_bits = {name: bitmap() for name in names["category"]}
+    province_bits = {name: bitmap() for name in names["province"]}
+    active_bits, income_tested_bits = bitmap(), bitmap()
+
+    types = tuple(RetrofitTypeRecord(*t) for t in header["retrofit_types"])
+    index = CatalogIndex(
+        version=header["version"],
+        retrofit_types=types,
+        provinces=tuple(header["provinces"]),
+        link_starts=unpacked("link_starts"),
+        link_types=unpacked("link_types"),
+        type_masks=unpacked("type_masks", "Q"),
+        province_codes=unpacked("province_codes", "H"),
+        flags=unpacked("flags", "B"),
+        max_amounts=unpacked("max_amounts", "d"),
+        end_dates=unpacked("end_dates", "i"),
+        scopes=scopes,
+        listings=listings,
+        program_counts={(p, c, bool(a)): n for p, c, a, n in header["program_counts"]},
+        type_bits=type_bits,
+        category_bits=category_bits,
+        province_bits=province_bits,
+        active_bits=active_bits,
+        income_tested_bits=income_tested_bits,
+    )
+    catalog = Catalog(MappedPrograms(mapped, sections["rows"][0], sections["strings"][0], index), index)
+
+    offset, size = sections["terms"]
+    terms = bytes(view[offset:offset + size]).decode().split("\n") if size else []
+    postings = MappedPostings(
+        terms, unpacked("posting_starts"), unpacked("posting_docs"), unpacked("posting_weights", "d")
+    )
+    set_memory_index(catalog, InvertedIndex.from_postings(catalog, postings))
+    return catalog
+
+
+def main() -> None:
+    import argparse
+
+    from app.data.seed_rebates import seed_database
+    from app.database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Seed the database and write its catalog snapshot file.")
+    parser.add_argument("path", help="snapshot file to write")
+    parser.add_argument("--no-seed", action="store_true", help="snapshot the database as it is")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if not args.no_seed:
+            init_db()
+            seed_database(db)
+        catalog = build_catalog(db)
+    finally:
+        db.close()
+    size = write_catalog_file(catalog, args.path)
+    print(f"wrote {len(catalog.programs)} programs ({size:,} bytes, version {catalog.version}) to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
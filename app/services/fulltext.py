@@ -0,0 +1,348 @@
+"""BM25 full-text search over program names, providers, descriptions and eligibility.
+
+While the catalog snapshot is loaded, queries go to an ``InvertedIndex``
+built in process from it and replaced when the snapshot's version changes.
+Without a snapshot, SQLite builds with FTS5 query ``rebate_programs_fts``, an
+external-content virtual table rebuilt by ``refresh_fulltext_index`` whenever
+the catalog is written. FTS5 computes ``bm25()`` for every matching row before
+sorting, so on large catalogs the precomputed in-process weights rank common
+terms several times faster.
+
+Both tokenize the same way (case-folded, diacritics removed, split on
+anything that is not a letter or digit) and treat a query as the OR of its
+terms, so "oil furnace replacement Halifax" still ranks programs that only
+mention some of the words.
+"""
+
+import asyncio
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from itertools import compress
+from operator import neg
+from typing import Iterable, Iterator, Mapping, Optional, Sequence
+
+from sqlalchemy import Connection, Select, TextClause, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.rebate import RebateProgram
+from app.services.catalog import FEDERAL, Catalog, ProgramRecord, add_catalog_warmer, get_catalog
+
+FTS_TABLE = "rebate_programs_fts"
+FTS_COLUMNS = ("name", "provider", "description", "eligibility_summary")
+
+_TOKEN = re.compile(r"[^\W_]+")
+# Combining Diacritical Marks, the accents FTS5's remove_diacritics strips from Latin letters
+_DIACRITICS = re.compile("[\u0300-\u036f]")
+
+
+def tokenize(value: str) -> list[str]:
+    """Case-folded, accent-stripped word tokens; matches FTS5's ``unicode61 remove_diacritics 2``."""
+    value = value.casefold()
+    if not value.isascii():
+        value = _DIACRITICS.sub("", unicodedata.normalize("NFKD", value))
+    return _TOKEN.findall(value)
+
+
+# ── In-process index ────────────────────────────────────────
+
+
+class InvertedIndex:
+    """Postings with precomputed BM25 weights over a fixed list of programs.
+
+    A program's score for a query is the sum of its weights for the query's
+    distinct terms; the weight of a term already folds in its IDF and the
+    program's length normalization, so searching is additions only.
+    """
+
+    def __init__(
+        self,
+        programs: Iterable[ProgramRecord | RebateProgram],
+        k1: float = 1.2,
+        b: float = 0.75,
+        catalog: Optional[Catalog] = None,
+    ):
+        # Kept as given when already a sequence: a mapped catalog decodes records on access
+        self.programs: Sequence[ProgramRecord | RebateProgram] = (
+            programs if isinstance(programs, Sequence) else tuple(programs)
+        )
+        # When indexing a catalog's programs, filters come from its scopes instead of every record
+        self._catalog = catalog
+        self._filters: dict[tuple[Optional[str], bool], Optional[bytearray]] = {}
+
+        term_counts: list[Counter] = []
+        for p in self.programs:
+            term_counts.append(Counter(tokenize(" ".join(getattr(p, column) or "" for column in FTS_COLUMNS))))
+        lengths = [sum(c.values()) for c in term_counts]
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+        positions: dict[str, list[int]] = {}
+        frequencies: dict[str, list[int]] = {}
+        for pos, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                positions.setdefault(term, []).append(pos)
+                frequencies.setdefault(term, []).append(tf)
+
+        n = len(self.programs)
+        norms = [k1 * (1 - b + b * length / avg_length) if avg_length else k1 for length in lengths]
+        postings: dict[str, tuple[array, array]] = {}
+        for term, docs in positions.items():
+            # Same IDF as SQLite's FTS5 bm25(), which keeps it positive for very common terms.
+            idf = max(math.log((n - len(docs) + 0.5) / (len(docs) + 0.5)), 1e-6)
+            weights = array("d", (idf * tf * (k1 + 1) / (tf + norms[pos]) for pos, tf in zip(docs, frequencies[term])))
+            postings[term] = (array("I", docs), weights)
+        # term -> (positions, weights)
+        self.postings: Mapping[str, tuple[Sequence[int], Sequence[float]]] = postings
+
+    @classmethod
+    def from_postings(
+        cls, catalog: Catalog, postings: Mapping[str, tuple[Sequence[int], Sequence[float]]]
+    ) -> "InvertedIndex":
+        """An index over ``catalog``'s programs with postings computed earlier, e.g. read from a catalog file."""
+        index = cls.__new__(cls)
+        index.programs = catalog.programs
+        index.postings = postings
+        index._catalog = catalog
+        index._filters = {}
+        return index
+
+    def _allowed(self, province: Optional[str], active_only: bool) -> Optional[bytearray]:
+        """Per-position flags for a province/active filter, ``None`` when everything passes."""
+        if self._catalog is not None:
+            # Unknown provinces share the federal scope's flags rather than each adding a copy
+            key = self._catalog.scope_key(province, active_only)
+        else:
+            key = (province or None, active_only)
+        if key not in self._filters:
+            if key == (None, False):
+                self._filters[key] = None
+            elif self._catalog is not None:
+                flags = bytearray(len(self.programs))
+                for pos in self._catalog.scope(province, active_only):
+                    flags[pos] = 1
+                self._filters[key] = flags
+            else:
+                provinces = {p.province for p in self.programs}
+                scope = {province if province in provinces else FEDERAL, FEDERAL} if province else None
+                self._filters[key] = bytearray(
+                    (scope is None or p.province in scope) and (p.is_active or not active_only) for p in self.programs
+                )
+        return self._filters[key]
+
+    def search(
+        self,
+        query: str,
+        province: Optional[str] = None,
+        active_only: bool = True,
+        limit: int = 10,
+    ) -> list[tuple[float, ProgramRecord | RebateProgram]]:
+        """Top ``limit`` programs by BM25 score, best first; ties go to the lower id."""
+        allowed = self._allowed(province, active_only)
+        postings = [self.postings[t] for t in dict.fromkeys(tokenize(query)) if t in self.postings]
+        if not postings:
+            return []
+        # The longest posting list seeds the accumulator through C-level iteration;
+        # only the shorter ones are merged in Python.
+        postings.sort(key=lambda p: len(p[0]), reverse=True)
+
+        def entries(docs: Sequence[int], weights: Sequence[float]) -> Iterator[tuple[int, float]]:
+            pairs = zip(docs, weights)
+            return pairs if allowed is None else compress(pairs, map(allowed.__getitem__, docs))
+
+        scores = dict(entries(*postings[0]))
+        get = scores.get
+        for docs, weights in postings[1:]:
+            for pos, weight in entries(docs, weights):
+                scores[pos] = get(pos, 0.0) + weight
+
+        # Programs are in id order, so the lower position (larger negation) is the lower id.
+        top = heapq.nlargest(limit, zip(scores.values(), map(neg, scores.keys())))
+        return [(score, self.programs[-neg_pos]) for score, neg_pos in top]
+
+
+_memory_index: Optional[tuple[str, InvertedIndex]] = None
+_memory_index_lock = threading.Lock()
+
+
+def _current_memory_index(catalog: Catalog) -> Optional[InvertedIndex]:
+    current = _memory_index
+    return current[1] if current is not None and current[0] == catalog.version else None
+
+
+def get_memory_index(catalog: Catalog) -> InvertedIndex:
+    """The in-process index for ``catalog``, built on first use unless the catalog was warmed."""
+    global _memory_index
+    index = _current_memory_index(catalog)
+    if index is None:
+        with _memory_index_lock:
+            # Concurrent first queries build it once
+            index = _current_memory_index(catalog)
+            if index is None:
+                index = InvertedIndex(catalog.programs, catalog=catalog)
+                _memory_index = (catalog.version, index)
+    return index
+
+
+def set_memory_index(catalog: Catalog, index: InvertedIndex) -> None:
+    """Use ``index``, built elsewhere, for ``catalog`` instead of building one on first use."""
+    global _memory_index
+    _memory_index = (catalog.version, index)
+
+
+def warm_fulltext_index(catalog: Catalog) -> None:
+    """Build the in-process index at startup rather than on the first query."""
+    get_memory_index(catalog)
+
+
+add_catalog_warmer(warm_fulltext_index)
+
+
+# ── SQLite FTS5 ─────────────────────────────────────────────
+
+_fts_ready: Optional[bool] = None
+
+
+def _fts_exists(conn: Connection) -> bool:
+    found = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE})
+    return found.first() is not None
+
+
+def create_fulltext_index(conn: Connection) -> bool:
+    """Create and fill the FTS5 table if this is SQLite with FTS5 and it does not exist yet.
+
+    Returns whether the FTS5 index is usable on this database.
+    """
+    global _fts_ready
+    if conn.dialect.name != "sqlite":
+        _fts_ready = False
+        return False
+    if not _fts_exists(conn):
+        try:
+            conn.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({', '.join(FTS_COLUMNS)}, "
+                    "content='rebate_programs', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                )
+            )
+        except OperationalError:
+            # SQLite compiled without FTS5
+            _fts_ready = False
+            return False
+        refresh_fulltext_index(conn)
+    _fts_ready = True
+    return True
+
+
+def refresh_fulltext_index(conn: Connection) -> None:
+    """Rebuild the FTS5 index from ``rebate_programs``; a no-op where there is none.
+
+    Runs on ``conn``'s transaction; the caller commits. Call it after writing
+    programs by any route other than ``upsert_catalog``.
+    """
+    if conn.dialect.name == "sqlite" and _fts_exists(conn):
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def _uses_fts(db: Session) -> bool:
+    global _fts_ready
+    if _fts_ready is None:
+        _fts_ready = db.get_bind().dialect.name == "sqlite" and _fts_exists(db.connection())
+    return _fts_ready
+
+
+def _fts_query(terms: Sequence[str], province: Optional[str], active_only: bool, limit: int) -> tuple[TextClause, dict]:
+    # Tokens hold only letters and digits, so quoting each one is enough to keep
+    # FTS5 query syntax (AND, NEAR, column filters, ...) out of user input.
+    match = " OR ".join(f'"{t}"' for t in terms)
+    clauses = [f"{FTS_TABLE} MATCH :match"]
+    params: dict = {"match": match, "limit": limit}
+    if active_only:
+        clauses.append("p.is_active = 1")
+    if province:
+        clauses.append("p.province IN (:province, :federal)")
+        params.update(province=province, federal=FEDERAL)
+    statement = text(
+        f"SELECT p.id, bm25({FTS_TABLE}) AS rank FROM {FTS_TABLE} "
+        f"JOIN rebate_programs AS p ON p.id = {FTS_TABLE}.rowid "
+        f"WHERE {' AND '.join(clauses)} ORDER BY rank, p.id LIMIT :limit"
+    )
+    return statement, params
+
+
+def _ranked(ids_and_ranks, programs_by_id) -> list[tuple[float, ProgramRecord | RebateProgram]]:
+    # FTS5's bm25() is negated so that lower sorts first; report it the usual way round.
+    return [(-rank, programs_by_id[rebate_id]) for rebate_id, rank in ids_and_ranks if rebate_id in programs_by_id]
+
+
+def _programs_query(ids: list[int]) -> Select:
+    return select(RebateProgram).options(selectinload(RebateProgram.retrofit_types)).where(RebateProgram.id.in_(ids))
+
+
+def _candidates_query(province: Optional[str], active_only: bool) -> Select:
+    query = select(RebateProgram).options(selectinload(RebateProgram.retrofit_types)).order_by(RebateProgram.id)
+    if active_only:
+        query = query.where(RebateProgram.is_active == True)  # noqa: E712
+    if province:
+        query = query.where(RebateProgram.province.in_([province, FEDERAL]))
+    return query
+
+
+# ── Search ──────────────────────────────────────────────────
+
+
+def search_fulltext(
+    db: Session,
+    query: str,
+    province: Optional[str] = None,
+    active_only: bool = True,
+    limit: int = 10,
+) -> list[tuple[float, ProgramRecord | RebateProgram]]:
+    """Top ``limit`` programs for ``query`` as ``(score, program)``, best first."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms or limit <= 0:
+        return []
+
+    catalog = get_catalog()
+    if catalog is not None:
+        return get_memory_index(catalog).search(query, province, active_only, limit)
+
+    if _uses_fts(db):
+        rows = db.execute(*_fts_query(terms, province, active_only, limit)).all()
+        return _ranked(rows, {p.id: p for p in db.scalars(_programs_query([r[0] for r in rows]))})
+
+    # No index at all: rank this query's candidates with a throwaway one.
+    index = InvertedIndex(db.scalars(_candidates_query(province, active_only)))
+    return index.search(query, province, active_only, limit)
+
+
+async def search_fulltext_async(
+    db: AsyncSession,
+    query: str,
+    province: Optional[str] = None,
+    active_only: bool = True,
+    limit: int = 10,
+) -> list[tuple[float, ProgramRecord | RebateProgram]]:
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms or limit <= 0:
+        return []
+
+    catalog = get_catalog()
+    if catalog is not None:
+        index = _current_memory_index(catalog)
+        if index is None:
+            # A catalog served without warming; building takes seconds at 100k programs
+            index = await asyncio.get_running_loop().run_in_executor(None, get_memory_index, catalog)
+        return index.search(query, province, active_only, limit)
+
+    if _fts_ready if _fts_ready is not None else await db.run_sync(_uses_fts):
+        rows = (await db.execute(*_fts_query(terms, province, active_only, limit))).all()
+        return _ranked(rows, {p.id: p for p in await db.scalars(_programs_query([r[0] for r in rows]))})
+
+    index = InvertedIndex(await db.scalars(_candidates_query(province, active_only)))
+    return index.search(query, province, active_only, limit)
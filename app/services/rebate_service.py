@@ -1,9 +1,21 @@
-import re
-from typing import Optional
-
-from sqlalchemy.orm import Session
-
-from app.models.rebate import RebateProgram, RetrofitType, RebateRetrofitType
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Callable, Hashable, Iterable, Iterator, NamedTuple, Optional, Sequence
+
+from sqlalchemy import Select, case, func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from app.config import settings
+from app.models.rebate import ALL_CATEGORIES, ProvinceProgramCount, RebateProgram, RetrofitType, RebateRetrofitType
+from app.services.catalog import Facets, ProgramCounts, ProgramRecord, RetrofitTypeRecord, get_catalog
+from app.services.text_matcher import PhraseMatcher, is_whole_word
 
 # ── Province detection ───────────────────────────────────────
 
@@ -72,20 +84,32 @@ PROVINCE_KEYWORDS: dict[str, str] = {
 _ABBREV_CODES = {"on", "bc", "qc", "ab", "ns", "nb", "pe", "pei", "mb", "sk", "nl", "nt", "nwt", "yt", "nu"}
 
 
+# Earlier entries win: longest phrase first, then table order for equal lengths.
+_PROVINCE_PRIORITY: dict[str, int] = {
+    phrase: rank for rank, phrase in enumerate(sorted(PROVINCE_KEYWORDS, key=len, reverse=True))
+}
+_province_matcher = PhraseMatcher(PROVINCE_KEYWORDS)
+
+
 def extract_province(text: str, session_province: Optional[str] = None) -> Optional[str]:
     """Detect a Canadian province from free-text. Falls back to session province."""
     lower = text.lower()
 
-    # Check multi-word names first (longest match wins)
-    for phrase in sorted(PROVINCE_KEYWORDS, key=len, reverse=True):
-        if phrase in _ABBREV_CODES:
-            # Whole-word match for short codes
-            if re.search(rf"\b{re.escape(phrase)}\b", lower):
-                return PROVINCE_KEYWORDS[phrase]
-        else:
-            if phrase in lower:
-                return PROVINCE_KEYWORDS[phrase]
-
+    # The highest-priority keyword found anywhere wins, not the leftmost one
+    best: Optional[str] = None
+    best_rank = len(_PROVINCE_PRIORITY)
+    for start, phrase in _province_matcher.finditer(lower):
+        rank = _PROVINCE_PRIORITY[phrase]
+        if rank >= best_rank:
+            continue
+        if phrase in _ABBREV_CODES and not is_whole_word(lower, start, start + len(phrase)):
+            continue
+        best, best_rank = phrase, rank
+        if rank == 0:
+            break
+
+    if best is not None:
+        return PROVINCE_KEYWORDS[best]
     return session_province
 
 
@@ -142,64 +166,174 @@ RETROFIT_SYNONYMS: dict[str, list[str]] = {
 }
 
 
+# Compiled lazily and rebuilt when the set of phrases changes. Targets are read
+# from the table at match time, so editing a phrase's list needs no rebuild.
+_retrofit_matcher: Optional[PhraseMatcher] = None
+_retrofit_phrases: frozenset[str] = frozenset()
+
+
+def rebuild_retrofit_matcher() -> PhraseMatcher:
+    """Recompile the synonym matcher from the current ``RETROFIT_SYNONYMS``."""
+    global _retrofit_matcher, _retrofit_phrases
+    _retrofit_phrases = frozenset(RETROFIT_SYNONYMS)
+    _retrofit_matcher = PhraseMatcher(_retrofit_phrases)
+    return _retrofit_matcher
+
+
 def extract_retrofit_types(text: str) -> list[str]:
     """Detect retrofit types mentioned in free-text."""
-    lower = text.lower()
-    found: set[str] = set()
+    matcher = _retrofit_matcher
+    if matcher is None or RETROFIT_SYNONYMS.keys() != _retrofit_phrases:
+        matcher = rebuild_retrofit_matcher()
 
-    for phrase in sorted(RETROFIT_SYNONYMS, key=len, reverse=True):
-        if phrase in lower:
-            found.update(RETROFIT_SYNONYMS[phrase])
+    found: set[str] = set()
+    for phrase in matcher.distinct(text.lower()):
+        # A phrase removed from the table since the check above matches nothing
+        found.update(RETROFIT_SYNONYMS.get(phrase, ()))
 
     return list(found)
 
 
 # ── Database queries ─────────────────────────────────────────
 
-def find_matching_rebates(
-    db: Session,
-    province: Optional[str] = None,
-    retrofit_types: Optional[list[str]] = None,
-    active_only: bool = True,
-    limit: int = 8,
-) -> list[RebateProgram]:
-    """Find rebate programs matching province and/or retrofit types."""
-    query = db.query(RebateProgram)
+# Retrofit types are loaded for the whole result in one extra SELECT ... IN
+# instead of one lazy load per program when the API serializes them.
+_WITH_RETROFIT_TYPES = selectinload(RebateProgram.retrofit_types)
+
+# Service functions answer from the in-memory catalog snapshot when one is
+# loaded and only fall back to SQL before startup or in scripts.
+Rebate = RebateProgram | ProgramRecord
+
+
+def _rank_order(province: Optional[str], retrofit_types: Optional[list[str]], today: date) -> list:
+    """ORDER BY clauses for ``catalog.rank_key``, led by the number of matched retrofit types."""
+    order = []
+    if retrofit_types:
+        matched = (
+            select(func.count())
+            .select_from(RebateRetrofitType)
+            .join(RetrofitType, RebateRetrofitType.retrofit_type_id == RetrofitType.id)
+            .where(RebateRetrofitType.rebate_id == RebateProgram.id, RetrofitType.name.in_(retrofit_types))
+            .scalar_subquery()
+        )
+        order.append(matched.desc())
+    if province:
+        order.append(case((RebateProgram.province == province, 0), else_=1))
+    return order + [
+        RebateProgram.is_active.desc(),
+        RebateProgram.max_amount.is_(None),
+        RebateProgram.max_amount.desc(),
+        case((or_(RebateProgram.end_date.is_(None), RebateProgram.end_date < today), 1), else_=0),
+        RebateProgram.end_date.is_(None),
+        RebateProgram.end_date,
+        RebateProgram.id,
+    ]
+
+
+def _matching_rebates_query(
+    province: Optional[str],
+    retrofit_types: Optional[list[str]],
+    active_only: bool,
+    limit: Optional[int],
+    today: Optional[date] = None,
+) -> Select:
+    """Matching programs; ranked and limited to the top ``limit`` unless ``limit`` is None."""
+    query = select(RebateProgram).options(_WITH_RETROFIT_TYPES)
 
     if active_only:
-        query = query.filter(RebateProgram.is_active == True)  # noqa: E712
+        query = query.where(RebateProgram.is_active == True)  # noqa: E712
 
     if province:
         # Include both province-specific and federal programs
-        query = query.filter(RebateProgram.province.in_([province, "FED"]))
+        query = query.where(RebateProgram.province.in_([province, "FED"]))
 
     if retrofit_types:
-        # Join through the association table to filter by retrofit type
-        query = (
-            query.join(RebateRetrofitType, RebateProgram.id == RebateRetrofitType.rebate_id)
+        # Semi-join through the association table: each program is kept once
+        # without a DISTINCT over the joined rows
+        offers_type = (
+            select(RebateRetrofitType.rebate_id)
             .join(RetrofitType, RebateRetrofitType.retrofit_type_id == RetrofitType.id)
-            .filter(RetrofitType.name.in_(retrofit_types))
-            .distinct()
+            .where(RebateRetrofitType.rebate_id == RebateProgram.id, RetrofitType.name.in_(retrofit_types))
+            .exists()
         )
+        query = query.where(offers_type)
+
+    if limit is None:
+        return query
+    # The planner keeps a bounded top-k sorter for ORDER BY ... LIMIT, so only
+    # ``limit`` rows are loaded however many match.
+    return query.order_by(*_rank_order(province, retrofit_types, today or date.today())).limit(limit)
+
+
+def _all_rebates_query(province: Optional[str], active_only: bool) -> Select:
+    query = select(RebateProgram).options(_WITH_RETROFIT_TYPES)
+
+    if active_only:
+        query = query.where(RebateProgram.is_active == True)  # noqa: E712
+
+    if province:
+        query = query.where(RebateProgram.province.in_([province, "FED"]))
+
+    return query.order_by(RebateProgram.province, RebateProgram.name)
+
 
-    return query.limit(limit).all()
+def _retrofit_types_query() -> Select:
+    return select(RetrofitType).order_by(RetrofitType.category, RetrofitType.display_name)
+
+
+def _province_counts_query() -> Select:
+    # Reads the materialized aggregate: one row per province, not a GROUP BY over programs.
+    return (
+        select(ProvinceProgramCount.province, ProvinceProgramCount.program_count)
+        .where(ProvinceProgramCount.category == ALL_CATEGORIES, ProvinceProgramCount.is_active == True)  # noqa: E712
+        .order_by(ProvinceProgramCount.province)
+    )
+
+
+def _program_counts_query() -> Select:
+    return select(
+        ProvinceProgramCount.province,
+        ProvinceProgramCount.category,
+        ProvinceProgramCount.is_active,
+        ProvinceProgramCount.program_count,
+    )
+
+
+def find_matching_rebates(
+    db: Session,
+    province: Optional[str] = None,
+    retrofit_types: Optional[list[str]] = None,
+    active_only: bool = True,
+    limit: int = 8,
+) -> list[Rebate]:
+    """Find the top ``limit`` rebate programs matching province and/or retrofit types.
+
+    Ranked by number of matched retrofit types, then province-specific over
+    federal, active, larger ``max_amount``, and upcoming deadline soonest
+    (see ``catalog.rank_key``), with ties broken by id.
+    """
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.find_matching(province, retrofit_types, active_only=active_only, limit=limit)
+
+    return list(db.scalars(_matching_rebates_query(province, retrofit_types, active_only, limit)))
 
 
 def get_all_rebates(
     db: Session,
     province: Optional[str] = None,
     active_only: bool = True,
-) -> list[RebateProgram]:
+) -> list[Rebate]:
     """List all rebate programs, optionally filtered."""
-    query = db.query(RebateProgram)
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.list_rebates(province, active_only=active_only)
 
-    if active_only:
-        query = query.filter(RebateProgram.is_active == True)  # noqa: E712
+    return list(db.scalars(_all_rebates_query(province, active_only)))
 
-    if province:
-        query = query.filter(RebateProgram.province.in_([province, "FED"]))
 
-    return query.order_by(RebateProgram.province, RebateProgram.name).all()
+# Results returned by a search; every search response is precomputed at this size.
+SEARCH_LIMIT = 50
 
 
 def search_rebates(
@@ -207,17 +341,409 @@ def search_rebates(
     province: str,
     retrofit_type: Optional[str] = None,
     active_only: bool = True,
-) -> list[RebateProgram]:
+) -> list[Rebate]:
     """Search rebates by province and optional retrofit type."""
     return find_matching_rebates(
         db,
         province=province,
         retrofit_types=[retrofit_type] if retrofit_type else None,
         active_only=active_only,
-        limit=50,
+        limit=SEARCH_LIMIT,
     )
 
 
+# Fields a rebate listing can be projected to; all but retrofit_types are columns.
+REBATE_FIELDS: tuple[str, ...] = (
+    "id",
+    "name",
+    "province",
+    "provider",
+    "description",
+    "max_amount",
+    "amount_description",
+    "eligibility_summary",
+    "how_to_apply",
+    "website_url",
+    "is_active",
+    "end_date",
+    "is_income_tested",
+    "retrofit_types",
+)
+
+PageKey = tuple[str, str, int]
+
+
+def _retrofit_type_dict(rt: RetrofitType | RetrofitTypeRecord) -> dict[str, str]:
+    return {"name": rt.name, "display_name": rt.display_name, "category": rt.category}
+
+
+def get_rebate_page(
+    db: Session,
+    province: Optional[str] = None,
+    active_only: bool = True,
+    limit: int = 50,
+    after: Optional[PageKey] = None,
+    fields: Sequence[str] = REBATE_FIELDS,
+) -> tuple[list[dict[str, Any]], Optional[PageKey]]:
+    """One page of the listing ordered by (province, name, id), projected to ``fields``.
+
+    Returns the rows and the key to pass as ``after`` for the next page, or
+    ``None`` on the last page. On the SQL path only the requested columns are
+    selected, and retrofit types are fetched for the page in one query only
+    when asked for.
+    """
+    unknown = set(fields) - set(REBATE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown rebate fields: {sorted(unknown)}")
+
+    catalog = get_catalog()
+    if catalog is not None:
+        programs = catalog.list_page(province, active_only=active_only, limit=limit + 1, after=after)
+        has_more = len(programs) > limit
+        programs = programs[:limit]
+        rows = [
+            {
+                f: [_retrofit_type_dict(rt) for rt in p.retrofit_types] if f == "retrofit_types" else getattr(p, f)
+                for f in fields
+            }
+            for p in programs
+        ]
+        next_key = (programs[-1].province, programs[-1].name, programs[-1].id) if has_more else None
+        return rows, next_key
+
+    key_columns = (RebateProgram.province, RebateProgram.name, RebateProgram.id)
+    column_fields = [f for f in fields if f != "retrofit_types"]
+    stmt = select(*key_columns, *(getattr(RebateProgram, f) for f in column_fields))
+    if active_only:
+        stmt = stmt.where(RebateProgram.is_active == True)  # noqa: E712
+    if province:
+        stmt = stmt.where(RebateProgram.province.in_([province, "FED"]))
+    if after is not None:
+        stmt = stmt.where(tuple_(*key_columns) > tuple_(*after))
+    result = db.execute(stmt.order_by(*key_columns).limit(limit + 1)).all()
+
+    has_more = len(result) > limit
+    result = result[:limit]
+    rows = [dict(zip(column_fields, row[3:])) for row in result]
+
+    if "retrofit_types" in fields:
+        types_by_rebate: dict[int, list[dict[str, str]]] = {row[2]: [] for row in result}
+        if types_by_rebate:
+            links = (
+                select(RebateRetrofitType.rebate_id, RetrofitType)
+                .join(RetrofitType, RebateRetrofitType.retrofit_type_id == RetrofitType.id)
+                .where(RebateRetrofitType.rebate_id.in_(list(types_by_rebate)))
+            )
+            for rebate_id, rt in db.execute(links):
+                types_by_rebate[rebate_id].append(_retrofit_type_dict(rt))
+        for row, key in zip(rows, result):
+            row["retrofit_types"] = types_by_rebate[key[2]]
+        rows = [{f: row[f] for f in fields} for row in rows]
+
+    next_key = tuple(result[-1][:3]) if has_more else None
+    return rows, next_key
+
+
+def iter_rebate_export(
+    db: Session,
+    province: Optional[str] = None,
+    active_only: bool = False,
+    batch_size: int = 1000,
+) -> Iterator[dict[str, Any]]:
+    """Yield every matching program as a dict of ``REBATE_FIELDS``, ordered by id.
+
+    Rows are read through a streaming cursor in batches of ``batch_size`` and
+    each batch's retrofit types are fetched with one query, so memory use does
+    not grow with the size of the catalog.
+    """
+    column_fields = [f for f in REBATE_FIELDS if f != "retrofit_types"]
+    stmt = select(*(getattr(RebateProgram, f) for f in column_fields))
+    if active_only:
+        stmt = stmt.where(RebateProgram.is_active == True)  # noqa: E712
+    if province:
+        stmt = stmt.where(RebateProgram.province.in_([province, "FED"]))
+    stmt = stmt.order_by(RebateProgram.id)
+
+    result = db.execute(stmt, execution_options={"stream_results": True, "yield_per": batch_size})
+    for batch in result.partitions():
+        rows = [dict(zip(column_fields, row)) for row in batch]
+        types_by_rebate: dict[int, list[dict[str, str]]] = {row["id"]: [] for row in rows}
+        links = (
+            select(RebateRetrofitType.rebate_id, RetrofitType.name, RetrofitType.display_name, RetrofitType.category)
+            .join(RetrofitType, RebateRetrofitType.retrofit_type_id == RetrofitType.id)
+            .where(RebateRetrofitType.rebate_id.in_(list(types_by_rebate)))
+        )
+        for rebate_id, name, display_name, category in db.execute(links):
+            types_by_rebate[rebate_id].append({"name": name, "display_name": display_name, "category": category})
+        for row in rows:
+            row["retrofit_types"] = types_by_rebate[row["id"]]
+            yield row
+
+
+class ExportVersion(NamedTuple):
+    programs: int
+    last_modified: Optional[datetime]
+
+
+def get_export_version(db: Session) -> ExportVersion:
+    """Program count and latest ``updated_at`` of the whole programs table.
+
+    Taken over every program, not only those an export includes: a program
+    deactivated or deleted leaves a filtered export without being in it.
+    """
+    programs, last_modified = db.execute(select(func.count(), func.max(RebateProgram.updated_at))).one()
+    return ExportVersion(programs, last_modified)
+
+
+def get_retrofit_types(db: Session) -> list[RetrofitType | RetrofitTypeRecord]:
+    """List all retrofit types ordered by category, then display name."""
+    catalog = get_catalog()
+    if catalog is not None:
+        return list(catalog.retrofit_types)
+
+    return list(db.scalars(_retrofit_types_query()))
+
+
+def get_province_counts(db: Session) -> list[tuple[str, int]]:
+    """Count active programs per province code, ordered by code."""
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.province_counts(active_only=True)
+
+    return [(code, count) for code, count in db.execute(_province_counts_query())]
+
+
+def get_program_counts(db: Session) -> ProgramCounts:
+    """Program counts per (province, category, is_active); see ``ProvinceProgramCount``."""
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.program_counts
+
+    rows = db.execute(_program_counts_query())
+    return {(province, category, is_active): n for province, category, is_active, n in rows}
+
+
+def _facets_of(matches: Iterable[Rebate], limit: int) -> Facets:
+    """Count facets in one pass over an already filtered sequence of programs."""
+    programs: list[Rebate] = []
+    types: dict[str, int] = {}
+    categories: dict[str, int] = {}
+    provinces: dict[str, int] = {}
+    income_tested = {True: 0, False: 0}
+    total = 0
+    for p in matches:
+        total += 1
+        if len(programs) < limit:
+            programs.append(p)
+        provinces[p.province] = provinces.get(p.province, 0) + 1
+        income_tested[p.is_income_tested] += 1
+        for category in {rt.category for rt in p.retrofit_types}:
+            categories[category] = categories.get(category, 0) + 1
+        for rt in p.retrofit_types:
+            types[rt.name] = types.get(rt.name, 0) + 1
+    return Facets(
+        programs=tuple(programs),
+        total=total,
+        retrofit_types=dict(sorted(types.items())),
+        categories=dict(sorted(categories.items())),
+        provinces=dict(sorted(provinces.items())),
+        income_tested=income_tested,
+    )
+
+
+def get_facets(
+    db: Session,
+    province: Optional[str] = None,
+    retrofit_types: Optional[list[str]] = None,
+    active_only: bool = True,
+    limit: int = 50,
+) -> Facets:
+    """Programs matching the ``find_matching_rebates`` filters, with per-facet counts over all matches."""
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.facets(province, retrofit_types, active_only=active_only, limit=limit)
+
+    query = _matching_rebates_query(province, retrofit_types, active_only, None).order_by(RebateProgram.id)
+    return _facets_of(db.scalars(query), limit)
+
+
+# ── Async database queries ──────────────────────────────────
+# Same queries on an AsyncSession, for async handlers. The catalog snapshot
+# is consulted first exactly as in the sync versions.
+
+
+async def find_matching_rebates_async(
+    db: AsyncSession,
+    province: Optional[str] = None,
+    retrofit_types: Optional[list[str]] = None,
+    active_only: bool = True,
+    limit: int = 8,
+) -> list[Rebate]:
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.find_matching(province, retrofit_types, active_only=active_only, limit=limit)
+
+    return list(await db.scalars(_matching_rebates_query(province, retrofit_types, active_only, limit)))
+
+
+async def get_all_rebates_async(
+    db: AsyncSession,
+    province: Optional[str] = None,
+    active_only: bool = True,
+) -> list[Rebate]:
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.list_rebates(province, active_only=active_only)
+
+    return list(await db.scalars(_all_rebates_query(province, active_only)))
+
+
+async def search_rebates_async(
+    db: AsyncSession,
+    province: str,
+    retrofit_type: Optional[str] = None,
+    active_only: bool = True,
+) -> list[Rebate]:
+    return await find_matching_rebates_async(
+        db,
+        province=province,
+        retrofit_types=[retrofit_type] if retrofit_type else None,
+        active_only=active_only,
+        limit=SEARCH_LIMIT,
+    )
+
+
+async def get_retrofit_types_async(db: AsyncSession) -> list[RetrofitType | RetrofitTypeRecord]:
+    catalog = get_catalog()
+    if catalog is not None:
+        return list(catalog.retrofit_types)
+
+    return list(await db.scalars(_retrofit_types_query()))
+
+
+async def get_province_counts_async(db: AsyncSession) -> list[tuple[str, int]]:
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.province_counts(active_only=True)
+
+    return [(code, count) for code, count in await db.execute(_province_counts_query())]
+
+
+async def get_program_counts_async(db: AsyncSession) -> ProgramCounts:
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.program_counts
+
+    rows = await db.execute(_program_counts_query())
+    return {(province, category, is_active): n for province, category, is_active, n in rows}
+
+
+async def get_facets_async(
+    db: AsyncSession,
+    province: Optional[str] = None,
+    retrofit_types: Optional[list[str]] = None,
+    active_only: bool = True,
+    limit: int = 50,
+) -> Facets:
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.facets(province, retrofit_types, active_only=active_only, limit=limit)
+
+    query = _matching_rebates_query(province, retrofit_types, active_only, None).order_by(RebateProgram.id)
+    return _facets_of(await db.scalars(query), limit)
+
+
+# ── Batch text analysis ─────────────────────────────────────
+
+# Below this many texts a process pool costs more to start than it saves.
+PARALLEL_MIN_TEXTS = 20_000
+_BATCH_CHUNK_SIZE = 2_000
+
+
+@dataclass(frozen=True, slots=True)
+class TextAnalysis:
+    province: Optional[str]
+    retrofit_types: list[str]
+    rebate_ids: list[int]
+
+
+def _extract_chunk(items: list[tuple[str, Optional[str]]]) -> list[tuple[Optional[str], list[str]]]:
+    # Module-level so process-pool workers can unpickle it.
+    return [
+        (extract_province(text, session_province), sorted(extract_retrofit_types(text)))
+        for text, session_province in items
+    ]
+
+
+def _chunks(items: Sequence[tuple[str, Optional[str]]]) -> Iterator[list[tuple[str, Optional[str]]]]:
+    it = iter(items)
+    while chunk := list(islice(it, _BATCH_CHUNK_SIZE)):
+        yield chunk
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    """The worker pool shared by every large batch, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers only import the text-matching code path; forking a
+            # server process with live threads and connections is not safe.
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.analyze_processes or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def analyze_texts(
+    db: Session,
+    items: Sequence[tuple[str, Optional[str]]],
+    limit: int = 8,
+    parallel: Optional[bool] = None,
+) -> Iterator[TextAnalysis]:
+    """Detect province, retrofit types and matching rebates for many texts.
+
+    ``items`` are ``(text, session_province)`` pairs; results are yielded lazily
+    in input order. Rebate lookups are shared across texts
+    with the same province and type set. With ``parallel``, by default only for
+    batches of ``PARALLEL_MIN_TEXTS`` or more, extraction fans out to the
+    process pool shared by all requests (``settings.analyze_processes`` workers).
+    """
+    if parallel is None:
+        parallel = len(items) >= PARALLEL_MIN_TEXTS and settings.analyze_processes != 1
+
+    lookups: dict[tuple[Optional[str], tuple[str, ...]], list[int]] = {}
+
+    def analyzed(extracted: list[tuple[Optional[str], list[str]]]) -> Iterator[TextAnalysis]:
+        for province, types in extracted:
+            key = (province, tuple(types))
+            rebate_ids = lookups.get(key)
+            if rebate_ids is None:
+                rebates = find_matching_rebates(db, province=province, retrofit_types=types or None, limit=limit)
+                rebate_ids = lookups[key] = [r.id for r in rebates]
+            yield TextAnalysis(province=province, retrofit_types=types, rebate_ids=rebate_ids)
+
+    if not parallel:
+        for chunk in _chunks(items):
+            yield from analyzed(_extract_chunk(chunk))
+        return
+
+    for extracted in _process_pool().map(_extract_chunk, _chunks(items)):
+        yield from analyzed(extracted)
+
+
 # ── Context formatting for LLM ──────────────────────────────
 
 PROVINCE_NAMES: dict[str, str] = {
@@ -238,30 +764,199 @@ PROVINCE_NAMES: dict[str, str] = {
 }
 
 
-def format_rebates_for_context(rebates: list[RebateProgram]) -> str:
+_NO_MATCH_CONTEXT = "No specific rebate programs matched the current query. Ask the user for their province and what type of retrofit they are considering."
+_CONTEXT_HEADER = "=== AVAILABLE REBATE PROGRAMS ===\n\n"
+_CONTEXT_FOOTER = "=== END REBATE PROGRAMS ==="
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: Optional[int]
+    currsize: int
+
+
+class _LRUCache:
+    """Thread-safe LRU mapping with ``functools``-style hit/miss counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: str) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+# Rendered text per program id, tagged with the updated_at it was rendered from.
+_fragments: dict[int, tuple[Optional[datetime], str]] = {}
+_fragment_hits = 0
+_fragment_misses = 0
+# Full context strings keyed by the ordered (id, updated_at) pairs they contain.
+_context_cache = _LRUCache(maxsize=1024)
+
+
+def _render_fragment(r: Rebate) -> str:
+    province_name = PROVINCE_NAMES.get(r.province, r.province)
+    status = "ACTIVE" if r.is_active else "CLOSED"
+    deadline = f" (ends {r.end_date})" if r.end_date else ""
+
+    lines = [
+        f"--- {r.name} ---",
+        f"Province: {province_name}",
+        f"Provider: {r.provider}",
+        f"Status: {status}{deadline}",
+        f"Amount: {r.amount_description}",
+        f"Eligibility: {r.eligibility_summary}",
+        f"How to apply: {r.how_to_apply}",
+    ]
+    if r.website_url:
+        lines.append(f"Website: {r.website_url}")
+    if r.is_income_tested:
+        lines.append("Note: Income-tested — enhanced benefits for qualifying households")
+    return "\n".join(lines) + "\n\n"
+
+
+def _rebate_fragment(r: Rebate) -> str:
+    global _fragment_hits, _fragment_misses
+    cached = _fragments.get(r.id)
+    if cached is not None and cached[0] == r.updated_at:
+        _fragment_hits += 1
+        return cached[1]
+    _fragment_misses += 1
+    fragment = _render_fragment(r)
+    _fragments[r.id] = (r.updated_at, fragment)
+    return fragment
+
+
+def format_rebates_for_context(rebates: list[Rebate]) -> str:
     """Format rebate programs into structured text for LLM system prompt injection."""
     if not rebates:
-        return "No specific rebate programs matched the current query. Ask the user for their province and what type of retrofit they are considering."
-
-    lines = ["=== AVAILABLE REBATE PROGRAMS ===", ""]
-
-    for r in rebates:
-        province_name = PROVINCE_NAMES.get(r.province, r.province)
-        status = "ACTIVE" if r.is_active else "CLOSED"
-        deadline = f" (ends {r.end_date})" if r.end_date else ""
-
-        lines.append(f"--- {r.name} ---")
-        lines.append(f"Province: {province_name}")
-        lines.append(f"Provider: {r.provider}")
-        lines.append(f"Status: {status}{deadline}")
-        lines.append(f"Amount: {r.amount_description}")
-        lines.append(f"Eligibility: {r.eligibility_summary}")
-        lines.append(f"How to apply: {r.how_to_apply}")
-        if r.website_url:
-            lines.append(f"Website: {r.website_url}")
-        if r.is_income_tested:
-            lines.append("Note: Income-tested — enhanced benefits for qualifying households")
-        lines.append("")
-
-    lines.append("=== END REBATE PROGRAMS ===")
-    return "\n".join(lines)
+        return _NO_MATCH_CONTEXT
+
+    key = tuple((r.id, r.updated_at) for r in rebates)
+    context = _context_cache.get(key)
+    if context is None:
+        context = _CONTEXT_HEADER + "".join(_rebate_fragment(r) for r in rebates) + _CONTEXT_FOOTER
+        _context_cache.put(key, context)
+    return context
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for budgeting without a tokenizer."""
+    return -(-len(text) // 4)
+
+
+def _context_priority(r: Rebate) -> tuple[bool, float, bool]:
+    # Active first, then largest max_amount (unknown amounts last), then
+    # province-specific programs ahead of federal ones.
+    amount = r.max_amount if r.max_amount is not None else float("-inf")
+    return (not r.is_active, -amount, r.province == "FED")
+
+
+class BudgetedContext:
+    """Context text for LLM prompts, streamed in priority order within a size budget.
+
+    Iterating yields the header, one fragment per program and the footer.
+    Programs are ordered by ``_context_priority`` and emission stops at the
+    first fragment that would exceed ``max_chars`` or ``max_tokens`` (footer
+    included); that program and all later ones are recorded in ``dropped``.
+    Without any programs the no-match message is yielded instead. If programs
+    matched but not even one fits, nothing is yielded and ``text()`` is
+    ``""``: the no-match message would tell the model there were none, so
+    callers check ``dropped`` and raise the budget or say so themselves.
+    """
+
+    def __init__(
+        self,
+        rebates: list[Rebate],
+        max_chars: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ):
+        self.rebates = sorted(rebates, key=_context_priority)
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.included: list[Rebate] = []
+        self.dropped: list[Rebate] = []
+        self.chars = 0
+        self.tokens = 0
+
+    def _fits(self, chars: int, tokens: int) -> bool:
+        if self.max_chars is not None and chars > self.max_chars:
+            return False
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        self.included, self.dropped = [], []
+        self.chars = self.tokens = 0
+        if not self.rebates:
+            self.chars, self.tokens = len(_NO_MATCH_CONTEXT), self.count_tokens(_NO_MATCH_CONTEXT)
+            yield _NO_MATCH_CONTEXT
+            return
+
+        footer_chars = len(_CONTEXT_FOOTER)
+        footer_tokens = self.count_tokens(_CONTEXT_FOOTER)
+        chars, tokens = len(_CONTEXT_HEADER), self.count_tokens(_CONTEXT_HEADER)
+
+        for i, r in enumerate(self.rebates):
+            fragment = _rebate_fragment(r)
+            next_chars = chars + len(fragment)
+            next_tokens = tokens + self.count_tokens(fragment)
+            if not self._fits(next_chars + footer_chars, next_tokens + footer_tokens):
+                self.dropped = self.rebates[i:]
+                break
+            if not self.included:
+                yield _CONTEXT_HEADER
+            self.included.append(r)
+            chars, tokens = next_chars, next_tokens
+            yield fragment
+
+        if self.included:
+            self.chars, self.tokens = chars + footer_chars, tokens + footer_tokens
+            yield _CONTEXT_FOOTER
+
+    def text(self) -> str:
+        return "".join(self)
+
+
+def context_cache_info() -> dict[str, CacheInfo]:
+    """Hit/miss counters for the per-program fragment cache and the full-context LRU."""
+    return {
+        "fragments": CacheInfo(_fragment_hits, _fragment_misses, None, len(_fragments)),
+        "contexts": _context_cache.info(),
+    }
+
+
+def clear_context_cache() -> None:
+    global _fragment_hits, _fragment_misses
+    _fragments.clear()
+    _fragment_hits = _fragment_misses = 0
+    _context_cache.clear()
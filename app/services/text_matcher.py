@@ -0,0 +1,95 @@
+"""Multi-phrase matching over free text.
+
+``PhraseMatcher`` compiles a phrase table once into a single regex shaped like
+a trie (``on(?:tario)?|b(?:c|ritish columbia)|...``), so scanning a message is
+one pass in the regex engine whose cost depends on the text length and the
+depth of the trie rather than on how many phrases the table holds.
+"""
+
+import re
+from typing import Iterable, Iterator
+
+
+def _trie_pattern(trie: dict) -> str:
+    terminal = "" in trie
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(trie.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # Greedy optional group: the longest phrase at a position is tried first.
+    return f"(?:{body})?" if terminal else body
+
+
+class PhraseMatcher:
+    """Find every occurrence of a fixed set of phrases, overlapping ones included.
+
+    Phrases are matched as plain substrings; callers lower-case the text and
+    apply any word-boundary rules to the reported matches.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases: tuple[str, ...] = tuple(dict.fromkeys(p for p in phrases if p))
+
+        trie: dict = {}
+        for phrase in self.phrases:
+            node = trie
+            for ch in phrase:
+                node = node.setdefault(ch, {})
+            node[""] = phrase
+
+        # For each phrase, every phrase that is a prefix of it, longest first.
+        # The regex reports only the longest phrase at a position; the shorter
+        # ones starting there are exactly its prefixes.
+        self._prefixes: dict[str, tuple[str, ...]] = {}
+        for phrase in self.phrases:
+            node, found = trie, []
+            for ch in phrase:
+                node = node[ch]
+                if "" in node:
+                    found.append(node[""])
+            self._prefixes[phrase] = tuple(reversed(found))
+
+        self._pattern = re.compile(_trie_pattern(trie)) if self.phrases else None
+
+    def finditer(self, text: str) -> Iterator[tuple[int, str]]:
+        """Yield ``(start, phrase)`` for each occurrence, left to right, longest first at a position."""
+        if self._pattern is None:
+            return
+        search = self._pattern.search
+        pos = 0
+        while (m := search(text, pos)) is not None:
+            start = m.start()
+            for phrase in self._prefixes[m.group()]:
+                yield start, phrase
+            pos = start + 1
+
+    def distinct(self, text: str) -> set[str]:
+        """Return the set of phrases occurring anywhere in ``text``."""
+        if self._pattern is None:
+            return set()
+        search = self._pattern.search
+        longest: set[str] = set()
+        pos = 0
+        while (m := search(text, pos)) is not None:
+            longest.add(m.group())
+            pos = m.start() + 1
+        found: set[str] = set()
+        for phrase in longest:
+            found.update(self._prefixes[phrase])
+        return found
+
+
+def _is_word_char(ch: str) -> bool:
+    # Same definition as the ``\w`` class of ``re`` for str patterns.
+    return ch.isalnum() or ch == "_"
+
+
+def _at_boundary(text: str, i: int) -> bool:
+    before = i > 0 and _is_word_char(text[i - 1])
+    after = i < len(text) and _is_word_char(text[i])
+    return before != after
+
+
+def is_whole_word(text: str, start: int, end: int) -> bool:
+    """True when ``text[start:end]`` sits between ``\\b`` word boundaries."""
+    return _at_boundary(text, start) and _at_boundary(text, end)
@@ -0,0 +1,277 @@
+"""Fingerprinted, precompressed dashboard assets.
+
+``build_static_assets`` copies the static directory to a build directory:
+
+* every file an HTML page references (``href`` / ``src``) is renamed to
+  ``name.<content hash>.ext`` and the references are rewritten to match, so
+  a changed file always gets a new URL;
+* text files get ``.gz`` and ``.br`` siblings, compressed once at maximum
+  level, wherever that makes them smaller;
+* ``static-manifest.json`` maps each original path to its hashed one.
+
+``PrecompressedStaticFiles`` serves such a directory. At startup it stats and
+fingerprints every file and its variants once; a request is then a lookup
+that picks the best variant the client's ``Accept-Encoding`` allows, answers
+conditional requests from the table without touching the file, and sends
+hashed files with ``Cache-Control: immutable``. Pointed at a directory
+without a manifest it behaves exactly like ``StaticFiles``.
+
+    python -m app.static_assets build/static [--source app/static]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+from dataclasses import dataclass
+from email.utils import formatdate, mktime_tz, parsedate_tz
+from mimetypes import guess_type
+from typing import Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Scope
+
+from app.api.response_cache import etag_matches
+
+MANIFEST = "static-manifest.json"
+# Precompressed encodings, in order of preference when a client accepts several equally
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE = (".html", ".css", ".js", ".json", ".svg", ".txt", ".xml", ".map")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Unhashed files (index.html) keep their URL, so clients revalidate them on every use
+REVALIDATE = "no-cache"
+
+# name.<digest>.ext, as build_static_assets names fingerprinted files
+_HASHED_NAME = re.compile(r"\.([0-9a-f]{16})\.[^./]+$")
+_REFERENCE = re.compile(r"""\b(?P<attr>href|src)=(?P<quote>["'])(?P<url>[^"']*)(?P=quote)""")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+# ── Build ────────────────────────────────────────────────────
+
+
+def _local_path(url: str, page: str) -> Optional[str]:
+    """The source-relative path ``url`` on ``page`` points at, or None for external URLs."""
+    path = url.split("#", 1)[0].split("?", 1)[0]
+    if not path or "://" in path or path.startswith(("//", "data:", "mailto:")):
+        return None
+    if path.startswith("/"):
+        return posixpath.normpath(path.lstrip("/"))
+    return posixpath.normpath(posixpath.join(posixpath.dirname(page), path))
+
+
+def _rewrite(html: str, page: str, manifest: dict[str, str]) -> str:
+    def replace(match: re.Match) -> str:
+        url = match["url"]
+        hashed = manifest.get(_local_path(url, page) or "")
+        if hashed is None:
+            return match[0]
+        # Hashed files sit next to their originals, so only the file name changes
+        path = re.split(r"[?#]", url, maxsplit=1)[0]
+        url = path[: path.rfind("/") + 1] + posixpath.basename(hashed) + url[len(path):]
+        return f"{match['attr']}={match['quote']}{url}{match['quote']}"
+
+    return _REFERENCE.sub(replace, html)
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_static_assets(source: str, output: str) -> dict[str, str]:
+    """Write the fingerprinted, precompressed copy of ``source`` to ``output``; returns the manifest.
+
+    Hashed files from earlier builds are left in place, so pages a client
+    loaded before a deploy can still fetch what they reference. Pages are
+    written after the assets they reference.
+    """
+    import brotli
+
+    files: dict[str, bytes] = {}
+    for root, _, names in os.walk(source):
+        for name in names:
+            if name.endswith((".gz", ".br", ".tmp")) or name == MANIFEST:
+                continue
+            full = os.path.join(root, name)
+            with open(full, "rb") as f:
+                files[os.path.relpath(full, source).replace(os.sep, "/")] = f.read()
+
+    pages = sorted(rel for rel in files if rel.endswith(".html"))
+    referenced = {
+        path
+        for page in pages
+        for match in _REFERENCE.finditer(files[page].decode())
+        if (path := _local_path(match["url"], page)) in files and not path.endswith(".html")
+    }
+    manifest = {}
+    for rel in sorted(referenced):
+        stem, ext = posixpath.splitext(rel)
+        manifest[rel] = f"{stem}.{_digest(files[rel])}{ext}"
+
+    for rel in sorted(files, key=lambda rel: (rel in pages, rel)):
+        data = files[rel]
+        if rel in pages:
+            data = _rewrite(data.decode(), rel, manifest).encode()
+        target = os.path.join(output, *manifest.get(rel, rel).split("/"))
+        _write(target, data)
+        compressed = {}
+        if rel.endswith(COMPRESSIBLE):
+            compressed = {
+                "gzip": gzip.compress(data, compresslevel=9, mtime=0),
+                "br": brotli.compress(data, mode=brotli.MODE_TEXT, quality=11),
+            }
+        for encoding, suffix in ENCODINGS.items():
+            body = compressed.get(encoding)
+            if body is not None and len(body) < len(data):
+                _write(target + suffix, body)
+            elif os.path.exists(target + suffix):
+                # Left over from a build where compressing this file paid off
+                os.remove(target + suffix)
+
+    _write(os.path.join(output, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode() + b"\n")
+    return manifest
+
+
+# ── Serving ──────────────────────────────────────────────────
+
+
+@dataclass(frozen=True, slots=True)
+class _Variant:
+    path: str
+    stat: os.stat_result
+    etag: str
+    last_modified: str
+
+
+@dataclass(frozen=True, slots=True)
+class _Asset:
+    variants: dict[str, _Variant]  # encoding ("identity", "br", "gzip") -> file
+    media_type: str
+    cache_control: str
+
+
+def _scan(directory: str) -> dict[str, _Asset]:
+    """Every file under a built ``directory`` and its precompressed variants, keyed by URL path.
+
+    Files whose name carries their own content digest are immutable, which
+    includes those left by earlier builds and no longer in the manifest.
+    """
+    assets = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith((".gz", ".br", ".tmp")) or name == MANIFEST:
+                continue
+            full = os.path.join(root, name)
+            rel = os.path.relpath(full, directory).replace(os.sep, "/")
+            with open(full, "rb") as f:
+                digest = _digest(f.read())
+            variants = {}
+            for encoding, suffix in (("identity", ""), *ENCODINGS.items()):
+                try:
+                    st = os.stat(full + suffix)
+                except FileNotFoundError:
+                    continue
+                tag = digest if encoding == "identity" else f"{digest}-{encoding}"
+                variants[encoding] = _Variant(full + suffix, st, f'"{tag}"', formatdate(st.st_mtime, usegmt=True))
+            assets[rel] = _Asset(
+                variants=variants,
+                media_type=guess_type(name)[0] or "text/plain",
+                cache_control=IMMUTABLE if (m := _HASHED_NAME.search(name)) and m[1] == digest else REVALIDATE,
+            )
+    return assets
+
+
+def _choose_encoding(accept_encoding: Optional[str], variants: dict[str, _Variant]) -> str:
+    """The precompressed variant with the highest ``q`` the client allows, else identity."""
+    if not accept_encoding:
+        return "identity"
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, *params = part.split(";")
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name.strip():
+            weights[name.strip().lower()] = weight
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = "identity", 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, wildcard)
+        if encoding in variants and weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def _not_modified(request_headers: Headers, variant: _Variant) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present (RFC 9110)
+        return etag_matches(if_none_match, variant.etag)
+    since = parsedate_tz(request_headers.get("if-modified-since") or "")
+    return since is not None and int(variant.stat.st_mtime) <= mktime_tz(since)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def __init__(self, *, directory: str, html: bool = False, check_dir: bool = True):
+        super().__init__(directory=directory, html=html, check_dir=check_dir)
+        built = os.path.isfile(os.path.join(directory, MANIFEST))
+        self.assets = _scan(directory) if built else {}
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        # Files added after startup, directory redirects, 404s and methods
+        # other than GET / HEAD all take the regular StaticFiles route.
+        key = "index.html" if path == "." and self.html else path.replace(os.sep, "/")
+        asset = self.assets.get(key) if scope["method"] in ("GET", "HEAD") else None
+        if asset is None:
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        encoding = _choose_encoding(request_headers.get("accept-encoding"), asset.variants)
+        variant = asset.variants[encoding]
+        headers = {
+            "etag": variant.etag,
+            "last-modified": variant.last_modified,
+            "cache-control": asset.cache_control,
+        }
+        if len(asset.variants) > 1:
+            headers["vary"] = "Accept-Encoding"
+        if _not_modified(request_headers, variant):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["content-encoding"] = encoding
+        return FileResponse(variant.path, headers=headers, media_type=asset.media_type, stat_result=variant.stat)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="directory to write the built assets to")
+    parser.add_argument("--source", default="app/static", help="static directory to build from")
+    args = parser.parse_args()
+
+    manifest = build_static_assets(args.source, args.output)
+    for rel, asset in sorted(_scan(args.output).items()):
+        sizes = "  ".join(f"{encoding} {variant.stat.st_size:,}" for encoding, variant in asset.variants.items())
+        print(f"{rel:<40}{sizes}")
+    print(f"{len(manifest)} hashed; serve with STATIC_DIR={args.output}")
+
+
+if __name__ == "__main__":
+    main()
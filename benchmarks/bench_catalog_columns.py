@@ -0,0 +1,140 @@
+"""Per-program cost of a find_matching-style filter and memory per program, by representation.
+
+The filter is "any of these retrofit types, in ON or federal, active" over the
+whole catalog, evaluated three ways:
+
+* ``orm``: ``RebateProgram`` objects, walking the ``retrofit_types`` relationship;
+* ``records``: ``ProgramRecord`` objects, walking their retrofit type tuples;
+* ``columns``: the catalog index's parallel arrays, with type membership as
+  a bitmask test mapped over positions in C.
+
+Memory is what ``tracemalloc`` sees allocated while building each
+representation, divided by the number of programs.
+
+    python -m benchmarks.bench_catalog_columns [--programs 20000]
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from itertools import compress
+
+if __name__ == "__main__" and "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='rebate-columns-')}/columns.db"
+
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.models.rebate import RebateProgram  # noqa: E402
+from app.services.catalog import ACTIVE, FEDERAL, build_catalog  # noqa: E402
+from benchmarks.synthetic_catalog import load_synthetic_catalog  # noqa: E402
+
+PROVINCE = "ON"
+TYPES = ("heat_pump_air_source", "insulation_attic", "solar_panels")
+
+
+def _allocated(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, size
+
+
+def _best(fn, repeat: int = 5) -> float:
+    fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=20_000)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    load_synthetic_catalog(db, args.programs)
+    db.expunge_all()
+
+    query = db.query(RebateProgram).options(selectinload(RebateProgram.retrofit_types))
+    orm, orm_bytes = _allocated(lambda: query.all())
+
+    def build():
+        # A session of its own, so the records do not share strings with ``orm``
+        session = SessionLocal()
+        try:
+            return build_catalog(session)
+        finally:
+            session.close()
+
+    catalog, catalog_bytes = _allocated(build)
+    index = catalog.index
+    n = len(catalog.programs)
+    column_bytes = sum(
+        len(column) * column.itemsize
+        for column in (index.type_masks, index.province_codes, index.flags, index.max_amounts, index.end_dates)
+    )
+
+    wanted = set(TYPES)
+    scope = {PROVINCE, FEDERAL}
+
+    def orm_filter():
+        return [
+            p for p in orm
+            if p.is_active and p.province in scope and any(rt.name in wanted for rt in p.retrofit_types)
+        ]
+
+    def record_filter():
+        return [
+            p for p in catalog.programs
+            if p.is_active and p.province in scope and any(rt.name in wanted for rt in p.retrofit_types)
+        ]
+
+    masks = {t.name: 1 << i for i, t in enumerate(index.retrofit_types)}
+    wanted_mask = sum(masks[name] for name in TYPES)
+    codes = {index.provinces.index(code) for code in scope}
+
+    def column_filter():
+        # The province/active part is the precomputed scope; type membership is one AND per program.
+        positions = catalog.scope(PROVINCE, active_only=True)
+        return list(compress(positions, map(wanted_mask.__and__, map(index.type_masks.__getitem__, positions))))
+
+    def column_scan():
+        # The same filter with no precomputed scope, every predicate read from a column.
+        flags, province_codes, type_masks = index.flags, index.province_codes, index.type_masks
+        return [
+            i for i in range(n)
+            if flags[i] & ACTIVE and province_codes[i] in codes and type_masks[i] & wanted_mask
+        ]
+
+    expected = [p.id for p in orm_filter()]
+    assert [catalog.programs[i].id for i in column_filter()] == expected
+    assert [catalog.programs[i].id for i in column_scan()] == expected
+
+    print(f"{n:,} programs, {len(expected):,} match\n")
+    print(f"{'representation':<22}{'ns/program':>12}{'bytes/program':>15}")
+    rows = (
+        ("orm", orm_filter, orm_bytes),
+        ("records", record_filter, catalog_bytes),
+        ("columns (scoped)", column_filter, column_bytes),
+        ("columns (full scan)", column_scan, column_bytes),
+    )
+    for name, fn, size in rows:
+        print(f"{name:<22}{_best(fn) / n * 1e9:>12.0f}{size / n:>15.0f}")
+    print("\nrecords: ProgramRecord objects, their strings and the catalog index; columns: the five arrays only")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Per-worker cost of a catalog built from the database vs. a mapped snapshot file.
+
+Starts one fresh process per mode, loads the catalog the way the app's
+lifespan would, serves a handful of catalog queries and reports startup time
+and memory growth from ``/proc/self/smaps_rollup``: anonymous memory is what
+every additional worker costs, file-backed memory is the mapped snapshot,
+held once in the page cache and shared by every worker mapping it.
+
+    python -m benchmarks.bench_catalog_file [--programs 100000] [--fulltext]
+
+Linux only (smaps_rollup).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+QUERIES = (
+    ("list_rebates", ("ON",)),
+    ("list_rebates", ("BC",)),
+    ("find_matching", ("QC", ["heat_pump_air_source", "insulation_attic"])),
+    ("find_matching", ("AB", ["solar_panels"])),
+    ("facets", ("NS", ["windows_doors"])),
+    ("list_page", ("MB",)),
+)
+
+
+def _memory() -> dict[str, int]:
+    """KiB of resident memory by kind, from the kernel's per-process rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"anonymous_kib": fields["Anonymous"], "file_kib": fields["Rss"] - fields["Anonymous"]}
+
+
+def _child(mode: str, snapshot: str, fulltext: bool) -> None:
+    from app.database import SessionLocal
+    from app.services.catalog import load_catalog
+    from app.services.catalog_file import open_catalog_file
+    from app.services.fulltext import warm_fulltext_index
+
+    before = _memory()
+    started = time.perf_counter()
+    if mode == "file":
+        catalog = open_catalog_file(snapshot)
+    else:
+        db = SessionLocal()
+        catalog = load_catalog(db)
+        db.close()
+    if fulltext:
+        warm_fulltext_index(catalog)
+    startup = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for name, args in QUERIES:
+        getattr(catalog, name)(*args)
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(5):
+        for name, args in QUERIES:
+            getattr(catalog, name)(*args)
+    steady = (time.perf_counter() - started) / 5
+
+    after = _memory()
+    print(json.dumps({
+        "startup_s": startup,
+        "first_queries_s": first,
+        "queries_s": steady,
+        **{key: after[key] - before[key] for key in after},
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=100_000, help="synthetic programs in the catalog")
+    parser.add_argument("--fulltext", action="store_true", help="also build the full-text index, as the app does")
+    parser.add_argument("--child", choices=("database", "file"), help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.snapshot, args.fulltext)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="rebate-catalog-file-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/catalog.db")
+    snapshot = f"{workdir}/catalog.bin"
+    print(f"building {args.programs:,} programs and {snapshot} ...")
+    subprocess.run(
+        [
+            sys.executable, "-c",
+            "import sys\n"
+            "from app.database import SessionLocal, init_db\n"
+            "from app.services.catalog import build_catalog\n"
+            "from app.services.catalog_file import write_catalog_file\n"
+            "from benchmarks.synthetic_catalog import load_synthetic_catalog\n"
+            "init_db(); db = SessionLocal(); load_synthetic_catalog(db, int(sys.argv[1]))\n"
+            "write_catalog_file(build_catalog(db), sys.argv[2])\n",
+            str(args.programs), snapshot,
+        ],
+        env=env,
+        check=True,
+    )
+    print(f"snapshot: {os.path.getsize(snapshot) / 2**20:.1f} MiB\n")
+
+    print(f"{'mode':<10}{'startup s':>11}{'1st queries ms':>16}{'queries ms':>12}{'anon MiB':>10}{'file MiB':>10}")
+    for mode in ("database", "file"):
+        command = [sys.executable, "-m", "benchmarks.bench_catalog_file", "--child", mode, "--snapshot", snapshot]
+        if args.fulltext:
+            command.append("--fulltext")
+        out = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(
+            f"{mode:<10}{r['startup_s']:>11.2f}{r['first_queries_s'] * 1e3:>16.1f}{r['queries_s'] * 1e3:>12.1f}"
+            f"{r['anonymous_kib'] / 1024:>10.1f}{r['file_kib'] / 1024:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Measure what request metrics cost per request.
+
+Runs the real app in-process over ASGI (no sockets) with METRICS_ENABLED on
+and off, alternating fresh subprocesses so import order, caches and CPU
+frequency affect both sides alike, and reports the median per-request time
+of each and the relative overhead.
+
+Two workloads bracket the cost: ``snapshot`` requests are answered from the
+response cache, the cheapest path and so the worst case in relative terms;
+``sql`` requests run with the catalog snapshot dropped, so every request
+executes queries and exercises the engine event hooks.
+
+End-to-end differences are often within run-to-run noise, so the script
+also times the instrumentation alone: the middleware around a no-op ASGI app
+and the engine hooks around a trivial query. Those absolute costs divided by
+the end-to-end request times bound the overhead.
+
+    python -m benchmarks.bench_metrics_overhead [--rounds 5] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SNAPSHOT_PATHS = (
+    "/api/rebates?province=ON",
+    "/api/rebates/search?province=BC&retrofit_type=solar_panels",
+    "/api/rebates/provinces",
+    "/api/rebates/facets?province=QC",
+    "/api/health",
+)
+SQL_PATHS = (
+    "/api/rebates?province=ON",
+    "/api/rebates/search?province=BC&retrofit_type=solar_panels",
+    "/api/rebates/provinces",
+    "/api/rebates?province=NS&limit=20",
+)
+
+
+def _child(workload: str, requests: int) -> None:
+    import httpx
+
+    from app.main import app, lifespan
+    from app.services.catalog import clear_catalog
+
+    paths = SNAPSHOT_PATHS if workload == "snapshot" else SQL_PATHS
+
+    async def run() -> float:
+        async with lifespan(app):
+            if workload == "sql":
+                clear_catalog()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for path in paths * 20:  # warm up
+                    await client.get(path)
+                started = time.perf_counter()
+                for i in range(requests):
+                    response = await client.get(paths[i % len(paths)])
+                    assert response.status_code == 200, (response.status_code, paths[i % len(paths)])
+                return (time.perf_counter() - started) / requests
+
+    print(json.dumps({"per_request": asyncio.run(run())}))
+
+
+def _measure(workload: str, enabled: bool, requests: int, database_url: str) -> float:
+    env = dict(os.environ, METRICS_ENABLED=str(enabled).lower(), DATABASE_URL=database_url)
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_metrics_overhead", "--child", workload, "--requests", str(requests)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])["per_request"]
+
+
+def _direct_costs(iterations: int = 50_000) -> tuple[float, float]:
+    """Seconds added per request by the middleware and per statement by the engine hooks."""
+    from sqlalchemy import create_engine, text
+
+    from app.metrics import MetricsMiddleware, RequestStats, _current, instrument_engine, reset_metrics
+
+    async def noop(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def sink(message):
+        pass
+
+    async def calls(asgi) -> float:
+        scope = {"type": "http", "method": "GET", "path": "/"}
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await asgi(dict(scope), None, sink)
+        return time.perf_counter() - started
+
+    instrumented = MetricsMiddleware(noop)
+    middleware = (
+        min(asyncio.run(calls(instrumented)) for _ in range(3)) - min(asyncio.run(calls(noop)) for _ in range(3))
+    ) / iterations
+    reset_metrics()
+
+    def queries(engine) -> float:
+        with engine.connect() as conn:
+            statement = text("SELECT 1")
+            started = time.perf_counter()
+            for _ in range(iterations):
+                conn.execute(statement)
+            return time.perf_counter() - started
+
+    plain = create_engine("sqlite://")
+    hooked = create_engine("sqlite://")
+    instrument_engine(hooked)
+    token = _current.set(RequestStats())
+    try:
+        queries(plain), queries(hooked)  # warm up statement caches and pools
+        per_query = (min(queries(hooked) for _ in range(3)) - min(queries(plain) for _ in range(3))) / iterations
+    finally:
+        _current.reset(token)
+    return middleware, per_query
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--child", choices=("snapshot", "sql"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.requests)
+        return
+
+    middleware, per_query = _direct_costs()
+    print(f"middleware: {middleware * 1e6:.1f} us/request   engine hooks: {per_query * 1e6:.1f} us/query\n")
+
+    database_url = os.environ.get("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp(prefix='rebate-metrics-')}/bench.db"
+    print(f"{'workload':<10}{'off us':>10}{'on us':>10}{'overhead':>10}")
+    for workload in ("snapshot", "sql"):
+        off, on = [], []
+        for _ in range(args.rounds):
+            off.append(_measure(workload, False, args.requests, database_url))
+            on.append(_measure(workload, True, args.requests, database_url))
+        off_us, on_us = statistics.median(off) * 1e6, statistics.median(on) * 1e6
+        print(f"{workload:<10}{off_us:>10.0f}{on_us:>10.0f}{(on_us / off_us - 1) * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
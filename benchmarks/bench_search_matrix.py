@@ -0,0 +1,95 @@
+"""Build time and memory of the precomputed search responses as the catalog grows.
+
+The matrix has one entry per province, retrofit type (or none) and
+``active_only`` value, each at most ``SEARCH_LIMIT`` programs, so its size
+follows the number of retrofit types rather than the number of programs.
+``--types`` adds synthetic retrofit types to the seed ones, spread over the
+programs the same way, to show that growth. Each run also times a search
+served from the matrix against one rendered from the catalog.
+
+    python -m benchmarks.bench_search_matrix [--programs 10000] [--types 14,28,56]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _child(programs: int, type_count: int) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='rebate-matrix-')}/matrix.db"
+
+    import httpx
+
+    from app.api.response_cache import response_cache
+    from app.api.search_matrix import search_matrix
+    from app.data.catalog_loader import upsert_catalog
+    from app.data.seed_rebates import RETROFIT_TYPES
+    from app.database import SessionLocal, init_db
+    from app.main import app, lifespan
+    from benchmarks.synthetic_catalog import generate_programs
+
+    types = RETROFIT_TYPES + [
+        {"name": f"synthetic_type_{i}", "display_name": f"Synthetic Type {i}", "category": RETROFIT_TYPES[i % len(RETROFIT_TYPES)]["category"]}
+        for i in range(type_count - len(RETROFIT_TYPES))
+    ]
+    names = [t["name"] for t in types]
+    rows = generate_programs(programs)
+    rng = random.Random(1)
+    for row in rows:
+        row["retrofit_types"] = rng.sample(names, len(row["retrofit_types"]))
+
+    init_db()
+    db = SessionLocal()
+    upsert_catalog(db, types, rows)
+    db.close()
+
+    async def run() -> None:
+        async with lifespan(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                url = "/api/rebates/search?province=ON&retrofit_type=solar_panels"
+                fallback = "/api/rebates/search?province=on&retrofit_type=solar_panels"
+
+                async def per_request(path: str, clear: bool) -> float:
+                    started = time.perf_counter()
+                    for _ in range(200):
+                        if clear:
+                            response_cache.clear()
+                        (await client.get(path)).raise_for_status()
+                    return (time.perf_counter() - started) / 200
+
+                matrix = await per_request(url, clear=False)
+                # Lowercase codes are outside the matrix and go through the catalog and response cache.
+                rendered = await per_request(fallback, clear=True)
+        print(
+            f"{len(types):>6}{len(search_matrix):>9}{search_matrix.build_seconds:>9.2f}"
+            f"{search_matrix.memory_bytes / 2**20:>9.1f}{matrix * 1e6:>13.0f}{rendered * 1e6:>15.0f}"
+        )
+
+    asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=10_000, help="synthetic programs in the catalog")
+    parser.add_argument("--types", default="14,28,56", help="comma-separated retrofit type counts, at least the 14 seed types")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        _child(args.programs, args.child)
+        return
+
+    print(f"{args.programs:,} programs\n")
+    print(f"{'types':>6}{'entries':>9}{'build s':>9}{'MiB':>9}{'matrix us':>13}{'rendered us':>15}")
+    for count in (int(c) for c in args.types.split(",") if c):
+        command = [sys.executable, "-m", "benchmarks.bench_search_matrix", "--programs", str(args.programs), "--child", str(count)]
+        subprocess.run(command, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Cold-start time of a worker, by startup mode, split into its phases.
+
+Each sample is a fresh process that imports the app, runs its lifespan and
+sends one search through it, as a newly scaled-out worker would. Reported
+per mode, as the median over ``--repeat`` processes:
+
+* ``import``: ``import app.main``;
+* ``db init``: table creation and seeding, or the stamp check of a lazy
+  startup (the ``startup_database_seconds`` gauge);
+* ``lifespan``: the whole lifespan, i.e. db init plus loading the catalog
+  unless that happens in the background;
+* ``first resp``: the first search after the lifespan, answered from the
+  database while a lazy startup is still loading the catalog;
+* ``to first resp``: process spawn to that response, interpreter start included;
+* ``catalog``: loading the catalog and building its indexes, wherever it ran.
+
+Modes: ``eager`` is the default startup, ``lazy`` sets ``LAZY_STARTUP`` on a
+database whose stamps are already current, ``snapshot`` maps a snapshot file
+and ``lazy+snap`` maps it in the background.
+
+    python -m benchmarks.bench_startup [--programs 10000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    "eager": {},
+    "lazy": {"LAZY_STARTUP": "1"},
+    "snapshot": {"CATALOG_SNAPSHOT_PATH": "{snapshot}"},
+    "lazy+snap": {"CATALOG_SNAPSHOT_PATH": "{snapshot}", "LAZY_STARTUP": "1"},
+}
+FIELDS = ("import", "db init", "lifespan", "first resp", "to first resp", "catalog")
+
+
+def _child() -> None:
+    started = time.perf_counter()
+    import app.main
+
+    imported = time.perf_counter()
+
+    import httpx
+
+    from app.metrics import STARTUP_CATALOG_SECONDS, STARTUP_DATABASE_SECONDS
+
+    async def run() -> dict[str, float]:
+        async with app.main.lifespan(app.main.app):
+            ready = time.perf_counter()
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.main.app), base_url="http://bench") as client:
+                response = await client.get("/api/rebates/search?province=ON&retrofit_type=heat_pump_air_source")
+                response.raise_for_status()
+            answered = time.perf_counter()
+            wall = time.time()
+        # Leaving the lifespan waits for a background catalog load to finish
+        return {
+            "import": imported - started,
+            "db init": STARTUP_DATABASE_SECONDS.value,
+            "lifespan": ready - imported,
+            "first resp": answered - ready,
+            "answered_at": wall,
+            "catalog": STARTUP_CATALOG_SECONDS.value,
+        }
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def _sample(env: dict[str, str]) -> dict[str, float]:
+    spawned = time.time()
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child"], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["to first resp"] = result.pop("answered_at") - spawned
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=10_000, help="synthetic programs besides the seed catalog")
+    parser.add_argument("--repeat", type=int, default=5, help="processes per mode")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child()
+        return
+
+    workdir = tempfile.mkdtemp(prefix="rebate-startup-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/startup.db")
+    snapshot = f"{workdir}/catalog.bin"
+    print(f"building {args.programs:,} programs and {snapshot} ...")
+    subprocess.run(
+        [
+            sys.executable, "-c",
+            "import sys\n"
+            "from app.database import SessionLocal, prepare_database\n"
+            "from app.services.catalog import build_catalog\n"
+            "from app.services.catalog_file import write_catalog_file\n"
+            "from benchmarks.synthetic_catalog import load_synthetic_catalog\n"
+            "prepare_database(); db = SessionLocal(); load_synthetic_catalog(db, int(sys.argv[1]))\n"
+            "write_catalog_file(build_catalog(db), sys.argv[2])\n",
+            str(args.programs), snapshot,
+        ],
+        env=env,
+        check=True,
+    )
+    # One untimed start of each mode, so every timed one finds the OS caches warm
+    for extra in MODES.values():
+        _sample({**env, **{k: v.format(snapshot=snapshot) for k, v in extra.items()}})
+
+    print(f"\n{'mode':<10}" + "".join(f"{f + ' s':>17}" for f in FIELDS))
+    for mode, extra in MODES.items():
+        mode_env = {**env, **{k: v.format(snapshot=snapshot) for k, v in extra.items()}}
+        samples = [_sample(mode_env) for _ in range(args.repeat)]
+        print(f"{mode:<10}" + "".join(f"{statistics.median(s[f] for s in samples):>17.3f}" for f in FIELDS))
+
+
+if __name__ == "__main__":
+    main()
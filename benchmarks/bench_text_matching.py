@@ -0,0 +1,125 @@
+"""Micro-benchmark for free-text keyword extraction.
+
+Compares ``extract_province`` and ``extract_retrofit_types`` with the
+per-call sort / per-keyword search they replaced, on messages of increasing
+length, and checks how retrofit extraction scales as the synonym table grows.
+Run from the repository root:
+
+    python -m benchmarks.bench_text_matching
+"""
+
+import random
+import re
+import time
+from typing import Callable, Optional
+
+from app.services import rebate_service
+from app.services.rebate_service import (
+    PROVINCE_KEYWORDS,
+    RETROFIT_SYNONYMS,
+    _ABBREV_CODES,
+    extract_province,
+    extract_retrofit_types,
+)
+
+FILLER = (
+    "we want to upgrade the attic insulation and replace an old furnace in the house "
+    "we bought last year the windows are drafty and heating bills keep going up"
+).split()
+
+
+def legacy_extract_province(text: str, session_province: Optional[str] = None) -> Optional[str]:
+    lower = text.lower()
+    for phrase in sorted(PROVINCE_KEYWORDS, key=len, reverse=True):
+        if phrase in _ABBREV_CODES:
+            if re.search(rf"\b{re.escape(phrase)}\b", lower):
+                return PROVINCE_KEYWORDS[phrase]
+        else:
+            if phrase in lower:
+                return PROVINCE_KEYWORDS[phrase]
+    return session_province
+
+
+def legacy_extract_retrofit_types(text: str) -> list[str]:
+    lower = text.lower()
+    found: set[str] = set()
+    for phrase in sorted(RETROFIT_SYNONYMS, key=len, reverse=True):
+        if phrase in lower:
+            found.update(RETROFIT_SYNONYMS[phrase])
+    return list(found)
+
+
+def _as_set(fn: Callable[[str], list[str]]) -> Callable[[str], frozenset[str]]:
+    return lambda text: frozenset(fn(text))
+
+
+def make_messages(words: int, count: int, keywords: list[str], seed: int = 0) -> list[str]:
+    """Filler messages of ``words`` words; every other one mentions a random keyword."""
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        tokens = [rng.choice(FILLER) for _ in range(words)]
+        if i % 2 == 0:
+            tokens.insert(rng.randrange(words + 1), rng.choice(keywords))
+        messages.append(" ".join(tokens))
+    return messages
+
+
+def throughput(fn: Callable[[str], object], messages: list[str], repeat: int = 3) -> float:
+    """Best-of-``repeat`` messages per second."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for m in messages:
+            fn(m)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def compare(name: str, new: Callable[[str], object], old: Callable[[str], object], keywords: list[str]) -> None:
+    print(f"{name}")
+    print(f"{'words':>8} {'legacy msg/s':>14} {'current msg/s':>14} {'speedup':>8}")
+    for words in (20, 200, 2000):
+        messages = make_messages(words, count=max(20, 20000 // words), keywords=keywords)
+        assert [new(m) for m in messages] == [old(m) for m in messages]
+        legacy = throughput(old, messages)
+        current = throughput(new, messages)
+        print(f"{words:>8} {legacy:>14,.0f} {current:>14,.0f} {current / legacy:>7.1f}x")
+    print()
+
+
+def scaling(sizes: tuple[int, ...] = (0, 1000, 5000)) -> None:
+    """Retrofit extraction on 200-word messages as synthetic jargon phrases are added."""
+    print("extract_retrofit_types vs synonym table size (200-word messages)")
+    print(f"{'phrases':>8} {'legacy msg/s':>14} {'current msg/s':>14} {'speedup':>8}")
+    messages = make_messages(200, count=100, keywords=list(RETROFIT_SYNONYMS))
+    original = dict(RETROFIT_SYNONYMS)
+    try:
+        for extra in sizes:
+            RETROFIT_SYNONYMS.clear()
+            RETROFIT_SYNONYMS.update(original)
+            RETROFIT_SYNONYMS.update({f"trade term {i:05d}": ["air_sealing"] for i in range(extra)})
+            rebate_service.rebuild_retrofit_matcher()
+            legacy = throughput(legacy_extract_retrofit_types, messages)
+            current = throughput(extract_retrofit_types, messages)
+            print(f"{len(RETROFIT_SYNONYMS):>8} {legacy:>14,.0f} {current:>14,.0f} {current / legacy:>7.1f}x")
+    finally:
+        RETROFIT_SYNONYMS.clear()
+        RETROFIT_SYNONYMS.update(original)
+        rebate_service.rebuild_retrofit_matcher()
+    print()
+
+
+def main() -> None:
+    compare("extract_province", extract_province, legacy_extract_province, list(PROVINCE_KEYWORDS))
+    compare(
+        "extract_retrofit_types",
+        _as_set(extract_retrofit_types),
+        _as_set(legacy_extract_retrofit_types),
+        list(RETROFIT_SYNONYMS),
+    )
+    scaling()
+
+
+if __name__ == "__main__":
+    main()
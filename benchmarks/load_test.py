@@ -0,0 +1,207 @@
+"""Compare threadpool (``def`` + ``Session``) and async (``async def`` + ``AsyncSession``) handlers under load.
+
+Serves the same two database queries both ways from a uvicorn subprocess
+against a throwaway SQLite catalog, with no in-memory snapshot loaded so
+every request reaches the database, then drives each route with many
+concurrent keep-alive connections and reports throughput and latency
+percentiles.
+
+    python -m benchmarks.load_test [--programs 5000] [--concurrency 500] [--requests 20000]
+
+Point ``DATABASE_URL`` at a seeded PostgreSQL database (with asyncpg
+installed) and pass ``--no-seed`` to measure that backend instead.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+if __name__ == "__main__" and "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='rebate-load-')}/load.db"
+
+from fastapi import Depends, FastAPI, Query  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.database import get_async_db, get_db  # noqa: E402
+from app.services.rebate_service import (  # noqa: E402
+    get_province_counts,
+    get_province_counts_async,
+    search_rebates,
+    search_rebates_async,
+)
+
+PROVINCES = ("ON", "BC", "QC", "AB", "NS", "MB")
+RETROFIT_TYPES = ("heat_pump_air_source", "insulation_attic", "solar_panels", "windows_doors", None)
+
+# Imported by the uvicorn subprocess; the snapshot is never loaded, so both
+# variants issue the same SQL and differ only in how the handler waits on it.
+app = FastAPI()
+
+
+def _search_payload(rebates) -> dict:
+    return {"count": len(rebates), "ids": [r.id for r in rebates]}
+
+
+@app.get("/threadpool/search")
+def threadpool_search(
+    province: str,
+    retrofit_type: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    return _search_payload(search_rebates(db, province=province, retrofit_type=retrofit_type))
+
+
+@app.get("/async/search")
+async def async_search(
+    province: str,
+    retrofit_type: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return _search_payload(await search_rebates_async(db, province=province, retrofit_type=retrofit_type))
+
+
+@app.get("/threadpool/provinces")
+def threadpool_provinces(db: Session = Depends(get_db)):
+    return dict(get_province_counts(db))
+
+
+@app.get("/async/provinces")
+async def async_provinces(db: AsyncSession = Depends(get_async_db)):
+    return dict(await get_province_counts_async(db))
+
+
+def _seed(programs: int) -> None:
+    from app.data.seed_rebates import seed_database
+    from app.database import SessionLocal, init_db
+    from benchmarks.synthetic_catalog import load_synthetic_catalog
+
+    init_db()
+    db = SessionLocal()
+    try:
+        seed_database(db)
+        if programs:
+            load_synthetic_catalog(db, programs)
+    finally:
+        db.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _paths(route: str, count: int) -> list[str]:
+    if route == "provinces":
+        return ["provinces"] * count
+    paths = []
+    for i in range(count):
+        province = PROVINCES[i % len(PROVINCES)]
+        retrofit_type = RETROFIT_TYPES[(i // len(PROVINCES)) % len(RETROFIT_TYPES)]
+        paths.append(f"search?province={province}" + (f"&retrofit_type={retrofit_type}" if retrofit_type else ""))
+    return paths
+
+
+async def _drive(base_url: str, paths: list[str], concurrency: int) -> dict:
+    import httpx
+
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(paths)
+
+    async def worker(client: "httpx.AsyncClient") -> None:
+        nonlocal errors
+        for path in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": q[49] * 1000,
+        "p95_ms": q[94] * 1000,
+        "p99_ms": q[98] * 1000,
+    }
+
+
+def _wait_until_up(base_url: str, server: subprocess.Popen) -> None:
+    import httpx
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            httpx.get(f"{base_url}/openapi.json", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start within 30s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=5_000, help="synthetic programs added to the seed catalog")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20_000, help="requests per route and variant")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--no-seed", action="store_true", help="use DATABASE_URL as-is")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        _seed(args.programs)
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.load_test:app",
+            "--port", str(port), "--workers", str(args.workers),
+            "--log-level", "warning", "--backlog", str(max(2048, args.concurrency * 2)),
+        ],
+        env=os.environ.copy(),
+    )
+    try:
+        _wait_until_up(base_url, server)
+        print(f"{os.environ['DATABASE_URL']}  concurrency={args.concurrency}  requests={args.requests}")
+        print(f"{'route':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for route in ("search", "provinces"):
+            paths = _paths(route, args.requests)
+            for variant in ("threadpool", "async"):
+                # Warm the pool and statement caches before timing.
+                asyncio.run(_drive(f"{base_url}/{variant}/", paths[:200], 20))
+                r = asyncio.run(_drive(f"{base_url}/{variant}/", paths, args.concurrency))
+                print(
+                    f"{variant + ' ' + route:<22}{r['rps']:>10.0f}{r['p50_ms']:>10.1f}"
+                    f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>8}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
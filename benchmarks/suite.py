@@ -0,0 +1,281 @@
+"""Benchmark suite for the rebate service and HTTP API, with baseline comparison.
+
+For each catalog size a fresh subprocess builds a throwaway SQLite database of
+synthetic programs, starts the app through its lifespan and times:
+
+* ``service.*``: ``extract_province`` / ``extract_retrofit_types`` on
+  generated chat messages, ``find_matching_rebates`` from the snapshot and
+  from SQL, ``format_rebates_for_context`` cold and warm, and rebuilding the
+  precomputed search responses;
+* ``http.*``: every endpoint through the ASGI app. ``[cached]`` is the steady
+  state behind the response cache; ``[render]`` clears the cache before each
+  request, so it measures building the response from the snapshot.
+
+Each case is timed with an auto-ranged loop, repeated, and reported as the
+median and minimum seconds per call. Results are written as JSON;
+``--compare`` checks them against a stored run and exits with status 1 when
+any case got slower than ``--threshold``. Comparisons use the minimum, which
+is the sample least disturbed by other work on the machine.
+
+    python -m benchmarks.suite --sizes 1000,10000 --output bench.json
+    python -m benchmarks.suite --sizes 1000,10000 --compare bench.json
+    python -m benchmarks.suite --sizes 100000 --repeat 3          # slow: minutes
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+MIN_SAMPLE_SECONDS = 0.2
+
+HTTP_CASES = (
+    ("GET", "/api/health", None),
+    ("GET", "/api/rebates?province=ON", None),
+    ("GET", "/api/rebates?province=ON&limit=50&fields=id,name,province,max_amount", None),
+    ("GET", "/api/rebates/search?province=BC&retrofit_type=solar_panels", None),
+    ("GET", "/api/rebates/facets?province=QC&retrofit_type=heat_pump_air_source", None),
+    ("GET", "/api/rebates/fulltext?q=oil+furnace+replacement+halifax", None),
+    ("GET", "/api/rebates/retrofit-types", None),
+    ("GET", "/api/rebates/provinces", None),
+    ("GET", "/api/rebates/export?province=NS&format=ndjson", None),
+    ("POST", "/api/rebates/analyze:batch", "batch"),
+    ("GET", "/api/metrics", None),
+    ("GET", "/", None),
+)
+# Endpoints answered outside the response cache; they have a single variant.
+UNCACHED = (
+    "/api/health",
+    "/api/metrics",
+    "/api/rebates/search",  # precomputed by the search matrix
+    "/api/rebates/export",
+    "/api/rebates/analyze:batch",
+    "/",
+)
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> dict[str, Any]:
+    """Median and min seconds per call over ``repeat`` auto-ranged samples."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_SAMPLE_SECONDS:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(MIN_SAMPLE_SECONDS / elapsed * 1.2))
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - started) / number)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "number": number, "runs": runs}
+
+
+async def _timed_async(fn: Callable[[], Awaitable[Any]], repeat: int) -> dict[str, Any]:
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_SAMPLE_SECONDS:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(MIN_SAMPLE_SECONDS / elapsed * 1.2))
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        runs.append((time.perf_counter() - started) / number)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "number": number, "runs": runs}
+
+
+def _run_size(size: int, repeat: int) -> dict[str, Any]:
+    """Build a catalog of ``size`` programs and time every case. Runs in a fresh process."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='rebate-bench-')}/bench.db"
+
+    import httpx
+
+    from app.api.rebates import warm_search_matrix
+    from app.api.response_cache import response_cache
+    from app.api.search_matrix import search_matrix
+    from app.database import SessionLocal, init_db
+    from app.main import app, lifespan
+    from app.services import rebate_service as rs
+    from app.services.catalog import clear_catalog, get_catalog, load_catalog
+    from benchmarks.synthetic_catalog import generate_messages, load_synthetic_catalog
+
+    init_db()
+    db = SessionLocal()
+    load_synthetic_catalog(db, size)
+    db.close()
+
+    messages = generate_messages(500)
+    batch = {"items": [{"text": m} for m in messages[:100]]}
+    results: dict[str, Any] = {}
+
+    async def run() -> None:
+        async with lifespan(app):
+            db = SessionLocal()
+
+            def each(fn: Callable[[str], Any]) -> Callable[[], None]:
+                def call() -> None:
+                    for m in messages:
+                        fn(m)
+                return call
+
+            # Per-message cost: divide the loop over all messages back out.
+            for name, fn in (("extract_province", rs.extract_province), ("extract_retrofit_types", rs.extract_retrofit_types)):
+                timing = _timed(each(fn), repeat)
+                for key in ("median_s", "min_s"):
+                    timing[key] /= len(messages)
+                timing["runs"] = [r / len(messages) for r in timing["runs"]]
+                results[f"service.{name}"] = timing
+
+            types = ["heat_pump_air_source", "heat_pump_mini_split", "insulation_attic"]
+            find = lambda: rs.find_matching_rebates(db, province="ON", retrofit_types=types)  # noqa: E731
+            results["service.find_matching_rebates[snapshot]"] = _timed(find, repeat)
+            clear_catalog()
+            results["service.find_matching_rebates[sql]"] = _timed(find, repeat)
+            load_catalog(db)
+
+            rebates = rs.find_matching_rebates(db, province="ON", retrofit_types=types)
+
+            def format_cold() -> None:
+                rs.clear_context_cache()
+                rs.format_rebates_for_context(rebates)
+
+            results["service.format_rebates_for_context[cold]"] = _timed(format_cold, repeat)
+            results["service.format_rebates_for_context[warm]"] = _timed(
+                lambda: rs.format_rebates_for_context(rebates), repeat
+            )
+
+            def build_search_matrix() -> None:
+                search_matrix.clear()
+                warm_search_matrix(get_catalog())
+
+            results["service.build_search_matrix"] = _timed(build_search_matrix, repeat)
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for method, url, body in HTTP_CASES:
+                    payload = batch if body == "batch" else None
+
+                    async def request() -> None:
+                        response = await client.request(method, url, json=payload)
+                        assert response.status_code == 200, (url, response.status_code)
+                        await response.aread()
+
+                    async def render() -> None:
+                        response_cache.clear()
+                        await request()
+
+                    await request()
+                    if url.split("?")[0] in UNCACHED:
+                        results[f"http.{method} {url}"] = await _timed_async(request, repeat)
+                    else:
+                        results[f"http.{method} {url} [cached]"] = await _timed_async(request, repeat)
+                        results[f"http.{method} {url} [render]"] = await _timed_async(render, repeat)
+            db.close()
+
+    asyncio.run(run())
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> bool:
+    """Print per-case ratios against ``baseline``; True when nothing regressed past ``threshold``."""
+    ok = True
+    print(f"{'size':>7}  {'case':<84}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for size, cases in current["results"].items():
+        base_cases = baseline["results"].get(size, {})
+        for case, timing in cases.items():
+            base = base_cases.get(case)
+            if base is None:
+                print(f"{size:>7}  {case:<84}{'-':>12}{timing['min_s'] * 1e6:>10.1f}us{'new':>8}")
+                continue
+            ratio = timing["min_s"] / base["min_s"]
+            flag = ""
+            if ratio > 1 + threshold:
+                flag, ok = "  REGRESSION", False
+            elif ratio < 1 - threshold:
+                flag = "  faster"
+            print(
+                f"{size:>7}  {case:<84}{base['min_s'] * 1e6:>10.1f}us{timing['min_s'] * 1e6:>10.1f}us"
+                f"{ratio:>8.2f}{flag}"
+            )
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated catalog sizes, e.g. 1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5, help="timed samples per case")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown ratio flagged as a regression")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(_run_size(args.child, args.repeat)))
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    report: dict[str, Any] = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    for size in sizes:
+        print(f"catalog of {size} programs...", file=sys.stderr)
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", "--child", str(size), "--repeat", str(args.repeat)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        report["results"][str(size)] = json.loads(out.strip().splitlines()[-1])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        for size, cases in report["results"].items():
+            for case, timing in cases.items():
+                print(f"{size:>7}  {case:<84}{timing['median_s'] * 1e6:>12.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Synthetic rebate catalogs shaped like ``REBATE_PROGRAMS``, at any size.
+
+Programs are cloned from the seed data with unique names, spread over every
+province code, and given retrofit types drawn so that the number of types per
+program follows the seed catalog's distribution. ``generate_messages`` makes
+homeowner questions that mention provinces and retrofits the way users do.
+"""
+
+import random
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.data.catalog_loader import UpsertReport, upsert_catalog
+from app.data.seed_rebates import REBATE_PROGRAMS, RETROFIT_TYPES
+from app.services.rebate_service import PROVINCE_KEYWORDS, PROVINCE_NAMES, RETROFIT_SYNONYMS
+
+
+def generate_programs(count: int, seed: int = 0) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    provinces = list(PROVINCE_NAMES)
+    type_names = [t["name"] for t in RETROFIT_TYPES]
+    fan_out = [len(p["retrofit_types"]) for p in REBATE_PROGRAMS]
+
+    programs = []
+    for i in range(count):
+        template = REBATE_PROGRAMS[i % len(REBATE_PROGRAMS)]
+        # Keep the seed data's province for a third of programs so the real
+        # FED / provincial mix is preserved, spread the rest evenly.
+        province = template["province"] if rng.random() < 1 / 3 else rng.choice(provinces)
+        program = dict(template)
+        program["name"] = f"{template['name']} #{i}"
+        program["province"] = province
+        program["max_amount"] = rng.choice([None, 500, 1000, 5000, 10000, 40000, 125000])
+        program["is_active"] = rng.random() < 0.85
+        program["retrofit_types"] = rng.sample(type_names, rng.choice(fan_out))
+        programs.append(program)
+    return programs
+
+
+def load_synthetic_catalog(db: Session, count: int, seed: int = 0) -> UpsertReport:
+    """Write the seed retrofit types and ``count`` synthetic programs to ``db``."""
+    return upsert_catalog(db, RETROFIT_TYPES, generate_programs(count, seed))
+
+
+_MESSAGE_TEMPLATES = (
+    "Hi, I live in {place} and I'm thinking about {retrofit}. Are there any rebates?",
+    "We just bought an older house in {place}. The {retrofit} and {other} both need work, what can we get back?",
+    "what grants are there for {retrofit}",
+    "Is {retrofit} covered anywhere in {place}? Our heating bills keep going up every winter.",
+    "My contractor quoted $14,000 for {retrofit}. I'm in {place}, does anything help with that cost?",
+    "Can I combine federal and provincial money for {retrofit} plus {other}?",
+)
+
+
+def generate_messages(count: int, seed: int = 0) -> list[str]:
+    """Chat messages mentioning a province keyword and one or two retrofit phrases."""
+    rng = random.Random(seed)
+    places = list(PROVINCE_KEYWORDS)
+    retrofits = list(RETROFIT_SYNONYMS)
+    return [
+        rng.choice(_MESSAGE_TEMPLATES).format(
+            place=rng.choice(places), retrofit=rng.choice(retrofits), other=rng.choice(retrofits)
+        )
+        for _ in range(count)
+    ]
@@ -0,0 +1,93 @@
+"""Shared fixtures: a throwaway SQLite database holding the seed catalog.
+
+The engine is created from settings when ``app.database`` is imported, so
+the database URL is set before any app module is.
+"""
+
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='rebate-tests-')}/test.db"
+for _name in ("CATALOG_SNAPSHOT_PATH", "LAZY_STARTUP", "STATIC_DIR", "DATABASE_READ_ONLY"):
+    os.environ.pop(_name, None)
+
+import pytest  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+
+from app.api.response_cache import response_cache  # noqa: E402
+from app.api.search_matrix import search_matrix  # noqa: E402
+from app.data.seed_rebates import seed_database  # noqa: E402
+from app.database import Base, SessionLocal, engine, init_db  # noqa: E402
+from app.services import fulltext  # noqa: E402
+from app.services.catalog import clear_catalog  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="also run tests marked slow (100k-program catalogs)")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: builds a large synthetic catalog; runs only with --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="slow; pass --run-slow to run")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+def reset_database() -> None:
+    """Drop every table, the FTS5 index included, and create them empty."""
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {fulltext.FTS_TABLE}"))
+    Base.metadata.drop_all(bind=engine)
+    fulltext._fts_ready = None
+    init_db()
+
+
+def clear_app_state() -> None:
+    clear_catalog()
+    response_cache.clear()
+    search_matrix.clear()
+
+
+@pytest.fixture
+def db():
+    """A session on a freshly seeded database, with no catalog snapshot loaded."""
+    reset_database()
+    clear_app_state()
+    session = SessionLocal()
+    seed_database(session)
+    try:
+        yield session
+    finally:
+        session.close()
+        clear_app_state()
+
+
+@pytest.fixture
+def statements():
+    """SQL statements executed on the engine while the test runs."""
+    executed: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield executed
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def client(db):
+    """The app over the seeded database, without running its lifespan."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    yield TestClient(app)
@@ -0,0 +1,61 @@
+"""Batch text analysis: results, request limits and the shared process pool."""
+
+import json
+
+import pytest
+
+from app.services import rebate_service
+from app.services.rebate_service import analyze_texts, shutdown_process_pool
+
+TEXTS = [
+    ("I want a heat pump in Ontario", None),
+    ("attic insulation and new windows", "BC"),
+    ("solar panels for my house in Nova Scotia", None),
+    ("nothing relevant here", "QC"),
+]
+
+
+@pytest.fixture
+def process_pool():
+    shutdown_process_pool()
+    try:
+        yield
+    finally:
+        shutdown_process_pool()
+
+
+def test_parallel_results_match_serial(db, process_pool):
+    serial = list(analyze_texts(db, TEXTS * 3, parallel=False))
+    assert list(analyze_texts(db, TEXTS * 3, parallel=True)) == serial
+    assert [r.province for r in serial[:4]] == ["ON", "BC", "NS", "QC"]
+
+
+def test_batches_share_one_pool(db, process_pool):
+    list(analyze_texts(db, TEXTS, parallel=True))
+    pool = rebate_service._pool
+    assert pool is not None
+    list(analyze_texts(db, TEXTS, parallel=True))
+    assert rebate_service._pool is pool
+
+    shutdown_process_pool()
+    assert rebate_service._pool is None
+
+
+def test_pool_size_comes_from_settings(db, process_pool, monkeypatch):
+    monkeypatch.setattr(rebate_service.settings, "analyze_processes", 2)
+    list(analyze_texts(db, TEXTS, parallel=True))
+    assert rebate_service._pool._max_workers == 2
+
+
+def test_batch_streams_one_line_per_item(client):
+    items = [{"text": text, "session_province": province} for text, province in TEXTS]
+    response = client.post("/api/rebates/analyze:batch", json={"items": items})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["index"] for row in rows] == list(range(len(TEXTS)))
+    assert rows[0]["province"] == "ON"
+
+
+def test_oversized_text_is_rejected(client):
+    response = client.post("/api/rebates/analyze:batch", json={"items": [{"text": "x" * 10_001}]})
+    assert response.status_code == 422
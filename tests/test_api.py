@@ -0,0 +1,87 @@
+"""The async endpoints answer the same from the database and from a loaded catalog."""
+
+import asyncio
+
+import pytest
+
+from app.api import rebates
+from app.services import fulltext, rebate_service
+from app.services.catalog import load_catalog
+
+URLS = [
+    "/api/rebates",
+    "/api/rebates?province=ON",
+    "/api/rebates?province=QC&active_only=false",
+    "/api/rebates?limit=7&fields=id,name,province",
+    "/api/rebates?province=BC&limit=3",
+    "/api/rebates/search?province=ON&retrofit_type=heat_pump_air_source",
+    "/api/rebates/search?province=XX",
+    "/api/rebates/facets?province=NS&retrofit_type=insulation_attic&retrofit_type=windows_doors",
+    "/api/rebates/facets?active_only=false&limit=0",
+    "/api/rebates/retrofit-types",
+    "/api/rebates/provinces",
+]
+
+
+def _fetch_all(client) -> dict[str, object]:
+    return {url: client.get(url).json() for url in URLS}
+
+
+def test_catalog_path_matches_database_path(client, db):
+    from_database = _fetch_all(client)
+    load_catalog(db)
+    assert _fetch_all(client) == from_database
+
+
+def test_page_cursor_walks_the_whole_listing(client, db):
+    load_catalog(db)
+    expected = [r["id"] for r in client.get("/api/rebates?active_only=false").json()["rebates"]]
+    ids, cursor = [], None
+    while True:
+        page = client.get("/api/rebates", params={"active_only": "false", "limit": 6, "cursor": cursor}).json()
+        ids += [r["id"] for r in page["rebates"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(ids) == sorted(expected)
+    assert len(ids) == len(set(ids))
+
+
+def test_cached_response_revalidates(client, db):
+    load_catalog(db)
+    first = client.get("/api/rebates?province=ON")
+    assert first.headers["etag"]
+    assert client.get("/api/rebates?province=ON", headers={"if-none-match": first.headers["etag"]}).status_code == 304
+
+
+def _on_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_catalog_miss_reads_and_renders_off_the_event_loop(client, db, monkeypatch, url):
+    catalog = load_catalog(db)
+    encode, rendered_on_loop, read_on_loop = rebates._encode, [], []
+
+    def recording_encode(payload):
+        rendered_on_loop.append(_on_loop())
+        return encode(payload)
+
+    def recording_get_catalog():
+        read_on_loop.append(_on_loop())
+        return catalog
+
+    monkeypatch.setattr(rebates, "_encode", recording_encode)
+    # The service functions look the catalog up before reading anything from it
+    monkeypatch.setattr(rebate_service, "get_catalog", recording_get_catalog)
+    monkeypatch.setattr(fulltext, "get_catalog", recording_get_catalog)
+    assert client.get(url).status_code == 200
+    assert rendered_on_loop and not any(rendered_on_loop)
+    if "/search" not in url:
+        # Searches inside the catalog come precomputed and read nothing
+        assert read_on_loop
+    assert not any(read_on_loop)
@@ -0,0 +1,48 @@
+"""Baseline comparison and timing helpers of ``benchmarks.suite``."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import suite
+
+
+def _report(**cases: float) -> dict:
+    return {"results": {"1000": {case: {"min_s": seconds, "median_s": seconds} for case, seconds in cases.items()}}}
+
+
+def test_compare_flags_slowdowns_past_threshold(capsys):
+    baseline = _report(a=1.0, b=1.0, c=1.0)
+    assert suite.compare(_report(a=1.05, b=0.5, c=1.0), baseline, threshold=0.10)
+    assert not suite.compare(_report(a=1.2, b=1.0, c=1.0), baseline, threshold=0.10)
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_compare_ignores_cases_missing_from_baseline(capsys):
+    assert suite.compare(_report(a=1.0, new_case=5.0), _report(a=1.0), threshold=0.10)
+    assert "new" in capsys.readouterr().out
+
+
+def test_timed_ranges_loop_to_minimum_sample(monkeypatch):
+    monkeypatch.setattr(suite, "MIN_SAMPLE_SECONDS", 0.01)
+    calls = []
+    timing = suite._timed(lambda: calls.append(None), repeat=3)
+    assert timing["number"] > 1
+    assert len(timing["runs"]) == 3
+    assert timing["min_s"] <= timing["median_s"]
+    assert len(calls) >= timing["number"] * 3
+
+
+@pytest.mark.slow
+def test_suite_runs_end_to_end(tmp_path):
+    output = tmp_path / "bench.json"
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--sizes", "100", "--repeat", "1", "--output", str(output)],
+        check=True,
+        capture_output=True,
+    )
+    results = json.loads(output.read_text())["results"]["100"]
+    assert "service.find_matching_rebates[snapshot]" in results
+    assert any(case.startswith("http.") for case in results)
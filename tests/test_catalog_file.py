@@ -0,0 +1,66 @@
+"""A memory-mapped snapshot file answers exactly like the catalog it was written from."""
+
+import itertools
+
+import pytest
+
+from app.services.catalog import build_catalog
+from app.services.catalog_file import CatalogFileError, open_catalog_file, write_catalog_file
+from app.services.fulltext import InvertedIndex, get_memory_index
+from benchmarks.synthetic_catalog import load_synthetic_catalog
+
+PROVINCES = [None, "ON", "BC", "FED", "ZZ", "NU"]
+TYPE_SETS = [[], ["heat_pump_air_source"], ["insulation_attic", "windows_doors"], ["solar_panels", "nope"]]
+
+
+@pytest.fixture
+def catalogs(db, tmp_path):
+    """The catalog built from the database and the one mapped from its snapshot file."""
+    load_synthetic_catalog(db, 1_000)
+    built = build_catalog(db)
+    path = str(tmp_path / "catalog.bin")
+    write_catalog_file(built, path)
+    return built, open_catalog_file(path)
+
+
+def test_mapped_tables_match(catalogs):
+    built, mapped = catalogs
+    assert mapped.version == built.version
+    assert list(mapped.programs) == list(built.programs)
+    assert mapped.retrofit_types == built.retrofit_types
+    assert mapped.provinces == built.provinces
+    assert mapped.program_counts == built.program_counts
+
+
+@pytest.mark.parametrize("province, active_only", itertools.product(PROVINCES, (True, False)))
+def test_mapped_queries_match(catalogs, province, active_only):
+    built, mapped = catalogs
+    assert mapped.list_rebates(province, active_only) == built.list_rebates(province, active_only)
+
+    first = built.list_page(province, active_only, limit=7)
+    after = (first[-1].province, first[-1].name, first[-1].id) if first else None
+    assert mapped.list_page(province, active_only, 7, after) == built.list_page(province, active_only, 7, after)
+
+    for types in TYPE_SETS:
+        assert mapped.find_matching(province, types, active_only, limit=8) == built.find_matching(
+            province, types, active_only, limit=8
+        )
+        assert mapped.facets(province, types, active_only, limit=20) == built.facets(
+            province, types, active_only, limit=20
+        )
+
+
+def test_mapped_fulltext_postings_match(catalogs):
+    built, mapped = catalogs
+    built_index = InvertedIndex(built.programs, catalog=built)
+    # Opening the file installed its stored postings as the index for this version
+    mapped_index = get_memory_index(mapped)
+    for query in ("heat pump", "attic insulation", "oil furnace replacement halifax"):
+        assert mapped_index.search(query, "NS", True, 10) == built_index.search(query, "NS", True, 10)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not-a-catalog.bin"
+    path.write_bytes(b"\x00" * 64)
+    with pytest.raises(CatalogFileError):
+        open_catalog_file(str(path))
@@ -0,0 +1,69 @@
+"""The catalog's per-program columns agree with its records, and ranking over them with a plain sort."""
+
+import itertools
+import math
+import random
+from datetime import date
+
+import pytest
+
+from app.services.catalog import (
+    ACTIVE,
+    INCOME_TESTED,
+    MAX_RETROFIT_TYPES,
+    RetrofitTypeRecord,
+    build_catalog,
+    index_programs,
+    rank_key,
+)
+from benchmarks.synthetic_catalog import load_synthetic_catalog
+
+
+@pytest.fixture
+def catalog(db):
+    load_synthetic_catalog(db, 3_000)
+    return build_catalog(db)
+
+
+def test_columns_match_records(catalog):
+    index = catalog.index
+    for i, p in enumerate(catalog.programs):
+        types = [index.retrofit_types[t] for t in index.link_types[index.link_starts[i]:index.link_starts[i + 1]]]
+        assert types == list(p.retrofit_types)
+        assert index.type_masks[i] == sum(1 << index.retrofit_types.index(t) for t in set(types))
+        assert index.provinces[index.province_codes[i]] == p.province
+        assert index.flags[i] == (ACTIVE if p.is_active else 0) | (INCOME_TESTED if p.is_income_tested else 0)
+        if p.max_amount is None:
+            assert math.isnan(index.max_amounts[i])
+        else:
+            assert index.max_amounts[i] == p.max_amount
+        assert index.end_dates[i] == (p.end_date.toordinal() if p.end_date else 0)
+
+
+def _reference(catalog, province, retrofit_types, active_only, limit, today):
+    wanted = set(retrofit_types)
+    scored = []
+    for position in catalog.scope(province, active_only):
+        p = catalog.programs[position]
+        matched = len(wanted & {rt.name for rt in p.retrofit_types})
+        if matched:
+            scored.append(((-matched, rank_key(p, province, today)), p))
+    return [p for _, p in sorted(scored, key=lambda item: item[0])[:limit]]
+
+
+def test_masked_ranking_matches_plain_sort(catalog):
+    rng = random.Random(2)
+    names = [t.name for t in catalog.retrofit_types]
+    today = date.today()
+    # Limits past the first 256-program chunk exercise the early stop across chunks
+    for province, active_only, limit in itertools.product([None, "ON", "FED", "QC"], (True, False), (1, 8, 300, 5_000)):
+        for size in (1, 3, 6):
+            types = rng.sample(names, size)
+            expected = _reference(catalog, province, types, active_only, limit, today)
+            assert catalog.find_matching(province, types, active_only, limit=limit, today=today) == expected
+
+
+def test_type_masks_are_bounded():
+    types = [RetrofitTypeRecord(i, f"type_{i}", f"Type {i}", "other") for i in range(MAX_RETROFIT_TYPES + 1)]
+    with pytest.raises(ValueError):
+        index_programs((), types)
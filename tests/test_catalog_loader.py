@@ -0,0 +1,159 @@
+"""Reconciling the database with a catalog given as plain dicts."""
+
+import copy
+
+import pytest
+from sqlalchemy import distinct, func, select
+
+from app.data.catalog_loader import refresh_program_counts, upsert_catalog
+from app.data.seed_rebates import REBATE_PROGRAMS, RETROFIT_TYPES
+from app.models.rebate import ALL_CATEGORIES, RebateProgram, RebateRetrofitType, RetrofitType
+from app.services.catalog import build_catalog
+from app.services.rebate_service import get_program_counts
+
+WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+def _writes(statements):
+    return [s for s in statements if s.lstrip().upper().startswith(WRITES)]
+
+
+def _program(db, name):
+    return db.scalars(select(RebateProgram).where(RebateProgram.name == name)).one()
+
+
+def _table_sizes(db):
+    tables = (RetrofitType, RebateProgram, RebateRetrofitType)
+    return tuple(db.scalar(select(func.count()).select_from(t)) for t in tables)
+
+
+def test_second_run_changes_nothing(db, statements):
+    statements.clear()
+    report = upsert_catalog(db, RETROFIT_TYPES, REBATE_PROGRAMS)
+    assert not report.changed
+    assert report.programs.unchanged == len(REBATE_PROGRAMS)
+    assert report.retrofit_types.unchanged == len(RETROFIT_TYPES)
+    assert report.links_added == report.links_removed == 0
+    assert _writes(statements) == []
+
+
+def test_changed_field_is_one_update(db):
+    programs = copy.deepcopy(REBATE_PROGRAMS)
+    changed = programs[3]
+    before = _program(db, changed["name"]).updated_at
+    changed["max_amount"] = (changed["max_amount"] or 0) + 1
+
+    report = upsert_catalog(db, RETROFIT_TYPES, programs)
+    assert (report.programs.inserted, report.programs.updated) == (0, 1)
+    assert report.programs.unchanged == len(programs) - 1
+    db.expire_all()
+    program = _program(db, changed["name"])
+    assert program.max_amount == changed["max_amount"]
+    assert program.updated_at > before
+
+
+def test_changed_link_is_one_update(db):
+    programs = copy.deepcopy(REBATE_PROGRAMS)
+    changed = programs[5]
+    before = _program(db, changed["name"]).updated_at
+    added = next(t["name"] for t in RETROFIT_TYPES if t["name"] not in changed["retrofit_types"])
+    removed = changed["retrofit_types"][0]
+    changed["retrofit_types"] = [*changed["retrofit_types"][1:], added]
+
+    report = upsert_catalog(db, RETROFIT_TYPES, programs)
+    assert report.programs.updated == 1
+    assert report.links_added == report.links_removed == 1
+    db.expire_all()
+    program = _program(db, changed["name"])
+    assert {rt.name for rt in program.retrofit_types} == set(changed["retrofit_types"])
+    assert removed not in {rt.name for rt in program.retrofit_types}
+    assert program.updated_at > before
+
+
+def test_omitted_fields_take_column_defaults(db, statements):
+    entry = {
+        key: value
+        for key, value in REBATE_PROGRAMS[0].items()
+        if key not in ("is_active", "is_income_tested", "end_date", "website_url")
+    }
+    entry["name"] = "Program without flags"
+    programs = [*REBATE_PROGRAMS, entry]
+
+    report = upsert_catalog(db, RETROFIT_TYPES, programs)
+    assert report.programs.inserted == 1
+    program = _program(db, entry["name"])
+    assert program.is_active is True and program.is_income_tested is False
+    assert program.end_date is None and program.website_url is None
+
+    # The defaults compare equal to the stored row, so a rerun writes nothing
+    statements.clear()
+    assert not upsert_catalog(db, RETROFIT_TYPES, programs).changed
+    assert _writes(statements) == []
+
+
+@pytest.mark.parametrize("problem", ["duplicate program", "duplicate type", "unknown type"])
+def test_invalid_catalog_rolls_back(db, problem):
+    types = [*copy.deepcopy(RETROFIT_TYPES), {"name": "new_type", "display_name": "New", "category": "other"}]
+    programs = copy.deepcopy(REBATE_PROGRAMS)
+    programs[0]["description"] = "Changed before the problem was found"
+    if problem == "duplicate program":
+        programs.append(copy.deepcopy(programs[1]))
+    elif problem == "duplicate type":
+        types.append(copy.deepcopy(types[0]))
+    else:
+        programs[2]["retrofit_types"] = ["no_such_type"]
+    sizes = _table_sizes(db)
+
+    with pytest.raises(ValueError):
+        upsert_catalog(db, types, programs)
+    assert _table_sizes(db) == sizes
+    assert db.scalar(select(RetrofitType).where(RetrofitType.name == "new_type")) is None
+    assert _program(db, programs[0]["name"]).description == REBATE_PROGRAMS[0]["description"]
+
+
+def _live_counts(db):
+    """Program counts grouped straight from the program and link tables."""
+    totals = select(RebateProgram.province, RebateProgram.is_active, func.count()).group_by(
+        RebateProgram.province, RebateProgram.is_active
+    )
+    by_category = (
+        select(RebateProgram.province, RetrofitType.category, RebateProgram.is_active, func.count(distinct(RebateProgram.id)))
+        .join(RebateRetrofitType, RebateRetrofitType.rebate_id == RebateProgram.id)
+        .join(RetrofitType, RetrofitType.id == RebateRetrofitType.retrofit_type_id)
+        .group_by(RebateProgram.province, RetrofitType.category, RebateProgram.is_active)
+    )
+    counts = {(province, ALL_CATEGORIES, is_active): n for province, is_active, n in db.execute(totals)}
+    counts.update({(province, category, is_active): n for province, category, is_active, n in db.execute(by_category)})
+    return counts
+
+
+def test_program_counts_follow_upserts(db):
+    assert get_program_counts(db) == _live_counts(db)
+
+    programs = copy.deepcopy(REBATE_PROGRAMS)
+    deactivated = next(p for p in programs if p["is_active"])
+    deactivated["is_active"] = False
+    relinked = next(p for p in programs if p is not deactivated and p["province"] != "FED")
+    # Moved to a retrofit type in a category the program had no type in
+    categories = {t["name"]: t["category"] for t in RETROFIT_TYPES}
+    linked = {categories[t] for t in relinked["retrofit_types"]}
+    relinked["retrofit_types"] = [next(name for name, category in categories.items() if category not in linked)]
+    before = get_program_counts(db)
+    upsert_catalog(db, RETROFIT_TYPES, programs)
+
+    after = get_program_counts(db)
+    assert after != before
+    assert after == _live_counts(db)
+    assert after == build_catalog(db).program_counts
+
+
+def test_refresh_after_direct_writes(db):
+    program = db.scalars(select(RebateProgram).where(RebateProgram.is_active)).first()
+    program.is_active = False
+    program.retrofit_types = program.retrofit_types[:1]
+    db.flush()
+    assert get_program_counts(db) != _live_counts(db)
+
+    refresh_program_counts(db.connection())
+    db.commit()
+    assert get_program_counts(db) == _live_counts(db)
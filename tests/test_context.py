@@ -0,0 +1,151 @@
+"""Rebate context text for LLM prompts: cached rendering and budgeted assembly."""
+
+import dataclasses
+from datetime import timedelta
+
+import pytest
+
+from app.models.rebate import RebateProgram
+from app.services import rebate_service
+from app.services.catalog import clear_catalog, load_catalog
+from app.services.rebate_service import (
+    _CONTEXT_FOOTER,
+    _CONTEXT_HEADER,
+    _NO_MATCH_CONTEXT,
+    BudgetedContext,
+    _LRUCache,
+    _render_fragment,
+    clear_context_cache,
+    context_cache_info,
+    estimate_tokens,
+    format_rebates_for_context,
+    get_all_rebates,
+)
+
+
+@pytest.fixture
+def records(db):
+    clear_context_cache()
+    yield load_catalog(db).list_rebates(active_only=False)
+    clear_context_cache()
+
+
+def test_orm_rows_and_catalog_records_render_alike(db, records):
+    clear_catalog()
+    rows = get_all_rebates(db, active_only=False)
+    assert all(isinstance(r, RebateProgram) for r in rows)
+    assert [r.id for r in rows] == [r.id for r in records]
+    from_records = format_rebates_for_context(records)
+
+    clear_context_cache()
+    assert format_rebates_for_context(rows) == from_records
+    # The uncached rendering agrees too
+    assert from_records == _CONTEXT_HEADER + "".join(_render_fragment(r) for r in records) + _CONTEXT_FOOTER
+
+
+def test_repeated_context_is_served_from_cache(records):
+    first = format_rebates_for_context(records[:5])
+    assert format_rebates_for_context(records[:5]) is first
+    info = context_cache_info()
+    assert info["contexts"].hits == 1 and info["contexts"].misses == 1
+    assert info["fragments"].misses == 5 and info["fragments"].currsize == 5
+
+    # A different selection reuses the fragments already rendered
+    format_rebates_for_context(records[2:7])
+    info = context_cache_info()
+    assert info["fragments"].hits == 3 and info["fragments"].misses == 7
+
+
+def test_changed_program_is_rendered_again(records):
+    before = format_rebates_for_context(records[:3])
+    edited = dataclasses.replace(
+        records[1], name="Renamed program", updated_at=records[1].updated_at + timedelta(seconds=1)
+    )
+    after = format_rebates_for_context([records[0], edited, records[2]])
+
+    assert "Renamed program" in after and "Renamed program" not in before
+    assert context_cache_info()["fragments"].misses == 4
+    # The new rendering replaced the old one rather than sitting beside it
+    assert rebate_service._fragments[edited.id] == (edited.updated_at, _render_fragment(edited))
+    assert context_cache_info()["fragments"].currsize == 3
+
+
+def test_context_cache_evicts_least_recently_used(records, monkeypatch):
+    monkeypatch.setattr(rebate_service, "_context_cache", _LRUCache(maxsize=2))
+    a, b, c = records[:1], records[1:2], records[2:3]
+    format_rebates_for_context(a)
+    format_rebates_for_context(b)
+    format_rebates_for_context(a)
+    format_rebates_for_context(c)
+
+    info = context_cache_info()["contexts"]
+    assert info.currsize == 2 and info.maxsize == 2
+    misses = info.misses
+    format_rebates_for_context(a)
+    assert context_cache_info()["contexts"].misses == misses
+    format_rebates_for_context(b)
+    assert context_cache_info()["contexts"].misses == misses + 1
+
+
+def test_no_rebates():
+    assert format_rebates_for_context([]) == _NO_MATCH_CONTEXT
+
+
+def test_budget_orders_by_priority(records):
+    context = BudgetedContext(records)
+    text = context.text()
+    assert context.dropped == [] and context.included == context.rebates
+    assert text == format_rebates_for_context(context.included)
+    # Tokens are counted per part, as a real tokenizer would be run per fragment
+    assert context.chars == len(text)
+    assert context.tokens == sum(estimate_tokens(part) for part in context)
+
+    # Active before closed, then the largest amounts, then provincial before federal
+    assert context.included[0].is_active and not context.included[-1].is_active
+    amounts = [r.max_amount or 0 for r in context.included if r.is_active]
+    assert amounts == sorted(amounts, reverse=True)
+    priorities = [rebate_service._context_priority(r) for r in context.included]
+    assert priorities == sorted(priorities)
+
+
+def test_budget_cut_reserves_the_footer(records):
+    full = BudgetedContext(records)
+    fragments = list(full)
+    # Room for the header, three programs and the footer, one character short of a fourth
+    limit = sum(map(len, fragments[:4])) + len(fragments[-1]) + len(fragments[4]) - 1
+    context = BudgetedContext(records, max_chars=limit)
+    text = context.text()
+
+    assert len(text) <= limit
+    assert text.endswith(_CONTEXT_FOOTER)
+    assert context.included == full.included[:3]
+    assert context.dropped == full.included[3:]
+    assert context.chars == len(text)
+
+    by_tokens = BudgetedContext(records, max_tokens=context.tokens)
+    assert by_tokens.text() == text
+    tighter = BudgetedContext(records, max_tokens=context.tokens - 1)
+    tighter.text()
+    assert tighter.included == full.included[:2]
+
+
+def test_budget_counts_with_the_given_tokenizer(records):
+    words = lambda text: len(text.split())  # noqa: E731
+    context = BudgetedContext(records, max_tokens=120, count_tokens=words)
+    context.text()
+    assert 0 < len(context.included) < len(records)
+    assert context.tokens <= 120 and context.tokens == sum(words(part) for part in context)
+
+
+def test_budget_without_rebates():
+    context = BudgetedContext([], max_chars=10)
+    assert context.text() == _NO_MATCH_CONTEXT
+    assert context.included == [] and context.dropped == []
+
+
+def test_budget_too_small_for_any_program(records):
+    context = BudgetedContext(records, max_chars=len(_CONTEXT_HEADER) + len(_CONTEXT_FOOTER) + 10)
+    assert context.text() == ""
+    assert context.included == []
+    assert context.dropped == context.rebates
+    assert (context.chars, context.tokens) == (0, 0)
@@ -0,0 +1,111 @@
+"""Engine options per backend and driver, and the SQLite connection pragmas."""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import settings
+from app.database import _create_engine, _engine_options
+
+POOL_SIZING = {"pool_size", "max_overflow", "pool_timeout"}
+
+
+@pytest.fixture
+def database_settings(monkeypatch):
+    """Set database settings for one test; they are restored afterwards."""
+    def configure(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(settings, name, value)
+
+    return configure
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:", "sqlite+aiosqlite://"])
+def test_in_memory_sqlite_takes_no_pool_sizing(url):
+    options = _engine_options(make_url(url))
+    assert not POOL_SIZING & options.keys()
+    assert "poolclass" not in options
+
+
+def test_file_sqlite_is_pooled_for_both_drivers():
+    sync = _engine_options(make_url("sqlite:///./rebates.db"))
+    assert POOL_SIZING <= sync.keys()
+    assert sync["connect_args"] == {"check_same_thread": False}
+    assert "poolclass" not in sync
+
+    asynchronous = _engine_options(make_url("sqlite+aiosqlite:///./rebates.db"))
+    assert POOL_SIZING <= asynchronous.keys()
+    assert asynchronous["poolclass"] is AsyncAdaptedQueuePool
+    assert "connect_args" not in asynchronous
+
+
+@pytest.mark.parametrize("driver", ["postgresql", "postgresql+psycopg2", "postgresql+psycopg"])
+def test_postgres_settings_as_libpq_options(database_settings, driver):
+    database_settings(db_statement_timeout_ms=1500, database_read_only=True)
+    options = _engine_options(make_url(f"{driver}://u:p@db/rebates"))
+    assert options["connect_args"] == {"options": "-c statement_timeout=1500 -c default_transaction_read_only=on"}
+
+
+def test_postgres_settings_for_asyncpg(database_settings):
+    database_settings(db_statement_timeout_ms=1500, database_read_only=True)
+    options = _engine_options(make_url("postgresql+asyncpg://u:p@db/rebates"))
+    assert options["connect_args"] == {
+        "server_settings": {"statement_timeout": "1500", "default_transaction_read_only": "on"}
+    }
+
+
+def test_postgres_without_settings_passes_no_connect_args(database_settings):
+    database_settings(db_statement_timeout_ms=None, database_read_only=False)
+    assert "connect_args" not in _engine_options(make_url("postgresql://u:p@db/rebates"))
+
+
+def _pragma(conn, name):
+    return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_pragmas_from_settings_are_applied(database_settings, tmp_path):
+    database_settings(
+        database_read_only=False,
+        sqlite_busy_timeout_ms=1234,
+        sqlite_synchronous="NORMAL",
+        sqlite_cache_size=-4000,
+        sqlite_mmap_size=2**20,
+        sqlite_temp_store="MEMORY",
+    )
+    engine = _create_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    try:
+        with engine.connect() as conn:
+            assert _pragma(conn, "journal_mode") == "wal"
+            assert _pragma(conn, "busy_timeout") == 1234
+            assert _pragma(conn, "synchronous") == 1
+            assert _pragma(conn, "cache_size") == -4000
+            assert _pragma(conn, "mmap_size") == 2**20
+            assert _pragma(conn, "temp_store") == 2
+            assert _pragma(conn, "query_only") == 0
+    finally:
+        engine.dispose()
+
+
+def test_read_only_rejects_writes(database_settings, tmp_path):
+    path = tmp_path / "read-only.db"
+    database_settings(database_read_only=False)
+    writable = _create_engine(f"sqlite:///{path}")
+    with writable.begin() as conn:
+        conn.execute(text("PRAGMA journal_mode=DELETE"))
+        conn.execute(text("CREATE TABLE notes (body TEXT)"))
+    writable.dispose()
+
+    database_settings(database_read_only=True)
+    engine = _create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as conn:
+            assert _pragma(conn, "query_only") == 1
+            # The journal mode is left as it was rather than switched to WAL
+            assert _pragma(conn, "journal_mode") == "delete"
+            assert conn.execute(text("SELECT count(*) FROM notes")).scalar() == 0
+            with pytest.raises(OperationalError):
+                conn.execute(text("INSERT INTO notes VALUES ('x')"))
+    finally:
+        engine.dispose()
@@ -0,0 +1,70 @@
+"""Catalog export: content and conditional requests."""
+
+import copy
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.data.catalog_loader import upsert_catalog
+from app.data.seed_rebates import REBATE_PROGRAMS, RETROFIT_TYPES
+from app.models.rebate import RebateProgram
+
+
+@pytest.fixture
+def seeded_earlier(db):
+    """The seeded database, as if it had been written well before the test."""
+    db.execute(update(RebateProgram).values(updated_at=datetime(2020, 1, 1)))
+    db.commit()
+    return db
+
+
+def _ids(response) -> list[int]:
+    return [json.loads(line)["id"] for line in response.text.splitlines()]
+
+
+def test_export_formats(client):
+    ndjson = client.get("/api/rebates/export")
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    assert len(_ids(ndjson)) == len(REBATE_PROGRAMS)
+
+    rows = list(csv.DictReader(io.StringIO(client.get("/api/rebates/export?format=csv&province=ON").text)))
+    assert rows and {row["province"] for row in rows} <= {"ON", "FED"}
+
+
+@pytest.mark.parametrize("validator", ["last-modified", "etag"])
+def test_deactivated_program_invalidates_active_export(client, seeded_earlier, validator):
+    url = "/api/rebates/export?active_only=true"
+    first = client.get(url)
+    active = _ids(first)
+    header = {"last-modified": "if-modified-since", "etag": "if-none-match"}[validator]
+    conditional = {header: first.headers[validator]}
+    assert client.get(url, headers=conditional).status_code == 304
+
+    programs = copy.deepcopy(REBATE_PROGRAMS)
+    programs[0]["is_active"] = False
+    upsert_catalog(seeded_earlier, RETROFIT_TYPES, programs)
+
+    second = client.get(url, headers=conditional)
+    assert second.status_code == 200
+    assert len(_ids(second)) == len(active) - 1
+
+
+def test_deleted_program_changes_etag(client, seeded_earlier):
+    url = "/api/rebates/export?province=ON"
+    first = client.get(url)
+
+    seeded_earlier.delete(seeded_earlier.get(RebateProgram, _ids(first)[0]))
+    seeded_earlier.commit()
+
+    second = client.get(url, headers={"if-none-match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+
+
+def test_etag_differs_by_variant(client):
+    etags = {client.get(url).headers["etag"] for url in ("/api/rebates/export", "/api/rebates/export?format=csv")}
+    assert len(etags) == 2
@@ -0,0 +1,41 @@
+"""Facet counts from the catalog's bitmaps match a pass over the SQL results."""
+
+import itertools
+
+import pytest
+
+from app.services.catalog import clear_catalog, load_catalog
+from app.services.rebate_service import get_facets
+from benchmarks.synthetic_catalog import load_synthetic_catalog
+
+PROVINCES = [None, "ON", "FED", "NS", "XX"]
+TYPE_SETS = [None, ["heat_pump_air_source"], ["insulation_attic", "windows_doors", "solar_panels"], ["no_such_type"]]
+
+
+def _summary(facets) -> tuple:
+    return (
+        [p.id for p in facets.programs],
+        facets.total,
+        facets.retrofit_types,
+        facets.categories,
+        facets.provinces,
+        facets.income_tested,
+    )
+
+
+@pytest.fixture
+def catalog_db(db):
+    load_synthetic_catalog(db, 1_000)
+    return db
+
+
+def test_bitmap_facets_match_sql(catalog_db):
+    cases = list(itertools.product(PROVINCES, TYPE_SETS, (True, False), (0, 5, 500)))
+    clear_catalog()
+    expected = [_summary(get_facets(catalog_db, p, t, active_only=a, limit=n)) for p, t, a, n in cases]
+    load_catalog(catalog_db)
+    actual = [_summary(get_facets(catalog_db, p, t, active_only=a, limit=n)) for p, t, a, n in cases]
+
+    mismatched = [case for case, e, a in zip(cases, expected, actual) if e != a]
+    assert not mismatched
+    assert any(summary[1] for summary in expected)
@@ -0,0 +1,64 @@
+"""Full-text ranking from the in-process index matches FTS5, and neither is built on the event loop."""
+
+import asyncio
+import itertools
+from datetime import date
+
+import pytest
+
+from app.api.search_matrix import search_matrix
+from app.services import fulltext
+from app.services.catalog import clear_catalog, get_catalog, load_catalog, reload_catalog
+from app.services.fulltext import search_fulltext
+from benchmarks.synthetic_catalog import load_synthetic_catalog
+
+QUERIES = ["heat pump", "attic insulation rebate", "Québec", "oil furnace replacement Halifax", "solar", "zzzz"]
+
+
+def _ranking(found) -> list[tuple[int, float]]:
+    return [(program.id, round(score, 6)) for score, program in found]
+
+
+@pytest.fixture
+def catalog_db(db):
+    load_synthetic_catalog(db, 500)
+    return db
+
+
+def test_memory_index_matches_fts5(catalog_db):
+    cases = list(itertools.product(QUERIES, (None, "ON", "NS"), (True, False), (1, 10)))
+    clear_catalog()
+    assert fulltext._uses_fts(catalog_db)
+    expected = [_ranking(search_fulltext(catalog_db, q, p, a, n)) for q, p, a, n in cases]
+    load_catalog(catalog_db)
+    actual = [_ranking(search_fulltext(catalog_db, q, p, a, n)) for q, p, a, n in cases]
+
+    assert [case for case, e, a in zip(cases, expected, actual) if e != a] == []
+    assert any(expected)
+
+
+def test_reload_warms_derived_indexes(client, db):
+    # The app registers the search matrix warmer when it imports its routes
+    catalog = reload_catalog()
+    assert get_catalog() is catalog
+    assert fulltext._current_memory_index(catalog) is not None
+    assert search_matrix.is_current(catalog, date.today())
+
+
+def test_unwarmed_index_is_built_off_the_event_loop(client, db, monkeypatch):
+    load_catalog(db)
+    built_on_loop = []
+
+    class RecordingIndex(fulltext.InvertedIndex):
+        def __init__(self, *args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                built_on_loop.append(True)
+            except RuntimeError:
+                built_on_loop.append(False)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(fulltext, "InvertedIndex", RecordingIndex)
+    response = client.get("/api/rebates/fulltext?q=heat+pump")
+    assert response.status_code == 200 and response.json()["count"]
+    assert built_on_loop == [False]
@@ -0,0 +1,108 @@
+"""Request metrics: labels, per-request database and serialization accounting, and the scrape format."""
+
+import re
+
+import pytest
+
+from app.metrics import (
+    REQUEST_DB_QUERIES,
+    REQUEST_SECONDS,
+    REQUEST_SERIALIZATION_SECONDS,
+    UNROUTED,
+    Histogram,
+    render_metrics,
+    reset_metrics,
+)
+from app.services.catalog import load_catalog
+
+
+@pytest.fixture
+def metrics(client):
+    reset_metrics()
+    yield client
+    reset_metrics()
+
+
+def _samples(histogram, *labels):
+    """(number of observations, their sum) for one series."""
+    counts, total = histogram._series.get(labels, ([0], 0.0))
+    return sum(counts), total
+
+
+def test_requests_are_labelled_by_route_template(metrics):
+    for province in ("ON", "BC", "QC"):
+        assert metrics.get("/api/rebates/search", params={"province": province}).status_code == 200
+    assert metrics.get("/api/rebates/nope").status_code == 404
+
+    routes = set(REQUEST_SECONDS._series)
+    assert ("GET", "/api/rebates/search", "200") in routes
+    assert _samples(REQUEST_SECONDS, "GET", "/api/rebates/search", "200")[0] == 3
+    # Query strings and unmatched paths never become label values
+    assert not any("province" in route or "nope" in route for _, route, _ in routes)
+    assert _samples(REQUEST_SECONDS, "GET", UNROUTED, "404")[0] == 1
+    assert all(route != UNROUTED for (route,) in REQUEST_DB_QUERIES._series)
+
+
+def test_query_count_on_the_database_path(metrics):
+    metrics.get("/api/rebates", params={"province": "ON"})
+    count, queries = _samples(REQUEST_DB_QUERIES, "/api/rebates")
+    assert count == 1 and queries > 0
+
+
+def test_catalog_path_runs_no_queries(metrics, db):
+    load_catalog(db)
+    metrics.get("/api/rebates", params={"province": "ON"})
+    assert _samples(REQUEST_DB_QUERIES, "/api/rebates") == (1, 0)
+
+
+def test_serialization_is_recorded_from_the_threadpool(metrics, db):
+    load_catalog(db)
+    # A cache miss renders in the threadpool; the request's stats follow it there
+    metrics.get("/api/rebates")
+    count, seconds = _samples(REQUEST_SERIALIZATION_SECONDS, "/api/rebates")
+    assert count == 1 and seconds > 0
+
+    # A cached response converts nothing, so it adds no sample
+    metrics.get("/api/rebates")
+    assert _samples(REQUEST_SERIALIZATION_SECONDS, "/api/rebates")[0] == 1
+    assert _samples(REQUEST_SECONDS, "GET", "/api/rebates", "200")[0] == 2
+
+
+def test_prometheus_text_format(metrics):
+    metrics.get("/api/rebates/search", params={"province": "ON"})
+    response = metrics.get("/api/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert text.endswith("\n")
+
+    sample = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? [0-9.e+-]+$')
+    for line in text.splitlines():
+        assert line.startswith(("# HELP ", "# TYPE ")) or sample.match(line), line
+
+    labels = 'method="GET",route="/api/rebates/search",status="200"'
+    buckets = [
+        int(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith(f"http_request_duration_seconds_bucket{{{labels},")
+    ]
+    assert buckets == sorted(buckets) and buckets[-1] == 1
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert f"http_request_duration_seconds_count{{{labels}}} 1" in text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert "# TYPE search_matrix_entries gauge" in text
+
+
+def test_histogram_rendering():
+    histogram = Histogram("test_seconds", "Help text.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'a"b\\c\nd')
+    assert list(histogram.render()) == [
+        "# HELP test_seconds Help text.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="a\\"b\\\\c\\nd",le="0.1"} 2',
+        'test_seconds_bucket{route="a\\"b\\\\c\\nd",le="1.0"} 3',
+        'test_seconds_bucket{route="a\\"b\\\\c\\nd",le="+Inf"} 4',
+        'test_seconds_sum{route="a\\"b\\\\c\\nd"} 3.65',
+        'test_seconds_count{route="a\\"b\\\\c\\nd"} 4',
+    ]
+    assert render_metrics().count("# TYPE") >= 4
@@ -0,0 +1,44 @@
+"""The SQL paths load retrofit types in one batched query, not one per program."""
+
+import pytest
+
+from app.api.rebates import _rebate_to_schema
+from app.database import SessionLocal
+from app.services.rebate_service import find_matching_rebates, get_all_rebates, search_rebates
+from benchmarks.synthetic_catalog import load_synthetic_catalog
+
+SEED_PROGRAMS = 40
+
+QUERIES = {
+    "get_all_rebates": lambda db: get_all_rebates(db, active_only=False),
+    "get_all_rebates(ON)": lambda db: get_all_rebates(db, province="ON"),
+    "find_matching_rebates": lambda db: find_matching_rebates(
+        db, province="ON", retrofit_types=["heat_pump_air_source", "insulation_attic"], limit=50
+    ),
+    "search_rebates": lambda db: search_rebates(db, province="BC", retrofit_type="solar_panels"),
+}
+
+
+def _run(query, statements) -> tuple[int, int]:
+    """Statements issued by ``query`` and by serializing every row it returns, and the row count."""
+    db = SessionLocal()
+    try:
+        statements.clear()
+        rebates = query(db)
+        for rebate in rebates:
+            _rebate_to_schema(rebate)
+        return len(statements), len(rebates)
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_statement_count_is_independent_of_catalog_size(db, statements, name):
+    query = QUERIES[name]
+    small, small_rows = _run(query, statements)
+
+    load_synthetic_catalog(db, 400 - SEED_PROGRAMS)
+    large, large_rows = _run(query, statements)
+
+    assert large_rows > small_rows
+    assert small == large <= 2
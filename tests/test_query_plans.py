@@ -0,0 +1,71 @@
+"""The rebate search query shapes are served by indexes, not full table scans.
+
+Runs the SQL paths of ``find_matching_rebates`` / ``get_all_rebates`` /
+``search_rebates`` on an analyzed synthetic catalog and checks
+``EXPLAIN QUERY PLAN`` for every statement they issue. The 100k-program run
+is marked slow:
+
+    python -m pytest tests/test_query_plans.py --run-slow
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app.database import engine
+from app.services.catalog import clear_catalog
+from app.services.rebate_service import find_matching_rebates, get_all_rebates, search_rebates
+from benchmarks.synthetic_catalog import load_synthetic_catalog
+
+QUERY_SHAPES = {
+    "find_matching_rebates(ON, [heat pump types])": lambda db: find_matching_rebates(
+        db, province="ON", retrofit_types=["heat_pump_air_source", "heat_pump_mini_split"]
+    ),
+    "find_matching_rebates(BC, active_only=False)": lambda db: find_matching_rebates(
+        db, province="BC", retrofit_types=["solar_panels"], active_only=False
+    ),
+    "search_rebates(QC, insulation_attic)": lambda db: search_rebates(db, province="QC", retrofit_type="insulation_attic"),
+    "get_all_rebates(NS)": lambda db: get_all_rebates(db, province="NS"),
+    "get_all_rebates(active)": lambda db: get_all_rebates(db),
+}
+
+
+def _full_scans(plan: list[str]) -> list[str]:
+    # "SCAN t" walks a whole table or index; "SEARCH t USING ..." is a range lookup.
+    return [line for line in plan if line.lstrip().startswith("SCAN ") and "CONSTANT ROW" not in line]
+
+
+def _plans(db, run) -> dict[str, list[str]]:
+    """``EXPLAIN QUERY PLAN`` of each distinct statement ``run`` issues."""
+    captured: list[tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        run(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    plans = {}
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            plans[statement] = [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    return plans
+
+
+@pytest.fixture(params=[pytest.param(5_000, id="5k"), pytest.param(100_000, id="100k", marks=pytest.mark.slow)])
+def analyzed_catalog(request, db):
+    load_synthetic_catalog(db, request.param)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    clear_catalog()
+    return db
+
+
+@pytest.mark.parametrize("name", QUERY_SHAPES)
+def test_query_shape_uses_indexes(analyzed_catalog, name):
+    plans = _plans(analyzed_catalog, QUERY_SHAPES[name])
+    assert plans
+    scans = {" ".join(statement.split()): _full_scans(plan) for statement, plan in plans.items() if _full_scans(plan)}
+    assert not scans
@@ -0,0 +1,48 @@
+"""find_matching_rebates ranks the same from SQL and from the catalog, ties included."""
+
+import itertools
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app.data.catalog_loader import upsert_catalog
+from app.data.seed_rebates import RETROFIT_TYPES
+from app.services.catalog import clear_catalog, load_catalog
+from app.services.rebate_service import find_matching_rebates
+from benchmarks.synthetic_catalog import generate_programs
+
+NAMES = [t["name"] for t in RETROFIT_TYPES]
+PROVINCES = [None, "ON", "FED", "XX", "QC", "NS"]
+TYPE_SETS = [None, NAMES[:1], NAMES[3:6], [*NAMES[::3], "no_such_type"]]
+
+
+@pytest.fixture
+def dated_catalog(db):
+    """The seed catalog plus 3,000 programs whose end dates are past, today, upcoming or open."""
+    rng = random.Random(1)
+    today = date.today()
+    programs = generate_programs(3_000, seed=3)
+    for program in programs:
+        program["end_date"] = rng.choice(
+            [None, today, today - timedelta(days=rng.randint(1, 400)), today + timedelta(days=rng.randint(1, 400))]
+        )
+    upsert_catalog(db, RETROFIT_TYPES, programs)
+    return db
+
+
+def test_catalog_ranking_matches_sql(dated_catalog):
+    cases = list(itertools.product(PROVINCES, TYPE_SETS, (True, False), (1, 3, 8, 50)))
+    clear_catalog()
+    expected = [[r.id for r in find_matching_rebates(dated_catalog, p, t, a, limit=n)] for p, t, a, n in cases]
+    load_catalog(dated_catalog)
+    actual = [[r.id for r in find_matching_rebates(dated_catalog, p, t, a, limit=n)] for p, t, a, n in cases]
+
+    assert [case for case, e, a in zip(cases, expected, actual) if e != a] == []
+    assert sum(map(len, expected)) > len(cases)
+
+
+def test_ranking_is_deterministic(dated_catalog):
+    first = [r.id for r in find_matching_rebates(dated_catalog, "ON", NAMES[:2], limit=50)]
+    assert first == [r.id for r in find_matching_rebates(dated_catalog, "ON", list(reversed(NAMES[:2])), limit=50)]
+    assert len(first) == len(set(first)) == 50
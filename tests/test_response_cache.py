@@ -0,0 +1,53 @@
+"""The response cache's bounds and the keys the endpoints store under."""
+
+from app.api.response_cache import ResponseCache, response_cache
+from app.services.catalog import load_catalog
+
+
+def test_evicts_oldest_past_entry_count():
+    cache = ResponseCache(max_entries=2)
+    cache.get("a", "v1")
+    for key in ("a", "b", "c"):
+        cache.put(key, "v1", b"x")
+    assert len(cache) == 2
+    assert cache.get("a", "v1") is None
+    assert cache.get("c", "v1").body == b"x"
+
+
+def test_evicts_oldest_past_byte_budget():
+    cache = ResponseCache(max_bytes=100)
+    cache.get("a", "v1")
+    cache.put("a", "v1", b"a" * 40)
+    cache.put("b", "v1", b"b" * 40)
+    cache.put("c", "v1", b"c" * 40)
+    assert cache.get("a", "v1") is None
+    assert cache.size_bytes == 80
+
+    # Replacing an entry releases its old body; a body over the whole budget is served but not kept
+    cache.put("b", "v1", b"b" * 10)
+    assert cache.size_bytes == 50
+    cache.put("huge", "v1", b"h" * 101)
+    assert cache.get("huge", "v1") is None
+    assert cache.size_bytes == 50
+
+
+def test_new_version_empties_cache():
+    cache = ResponseCache()
+    cache.get("a", "v1")
+    cache.put("a", "v1", b"body")
+    assert cache.get("a", "v2") is None
+    assert len(cache) == 0 and cache.size_bytes == 0
+    # A body rendered under the old version is not stored under the new one
+    cache.put("a", "v1", b"body")
+    assert len(cache) == 0
+
+
+def test_unknown_provinces_share_the_federal_entries(client, db):
+    load_catalog(db)
+    for path in ("/api/rebates", "/api/rebates/facets", "/api/rebates?limit=5"):
+        federal = client.get(path, params={"province": "FED"})
+        entries = len(response_cache)
+        for junk in ("ZZ", "XX", "nope", "on"):
+            response = client.get(path, params={"province": junk})
+            assert response.headers["etag"] == federal.headers["etag"]
+        assert len(response_cache) == entries
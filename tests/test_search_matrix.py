@@ -0,0 +1,66 @@
+"""Precomputed searches answer exactly like searches ranked per request."""
+
+import copy
+import itertools
+from datetime import date, timedelta
+
+from app.api.rebates import _render_search, warm_search_matrix
+from app.api.search_matrix import search_matrix
+from app.data.catalog_loader import upsert_catalog
+from app.data.seed_rebates import REBATE_PROGRAMS, RETROFIT_TYPES
+from app.services.catalog import load_catalog
+from app.services.rebate_service import PROVINCE_NAMES
+
+URLS = [
+    f"/api/rebates/search?province={province}&active_only={active_only}"
+    + (f"&retrofit_type={retrofit_type}" if retrofit_type is not None else "")
+    for province, retrofit_type, active_only in itertools.product(
+        # Lowercase and unknown codes and types fall outside the matrix
+        [*PROVINCE_NAMES, "on", "ZZ"],
+        [None, *(t["name"] for t in RETROFIT_TYPES), "bogus", ""],
+        ("true", "false"),
+    )
+]
+
+
+def test_matrix_matches_database_search(client, db):
+    from_database = {url: client.get(url).json() for url in URLS}
+    warm_search_matrix(load_catalog(db))
+    assert len(search_matrix)
+
+    assert [url for url in URLS if client.get(url).json() != from_database[url]] == []
+
+
+def test_matrix_entries_revalidate(client, db):
+    warm_search_matrix(load_catalog(db))
+    url = "/api/rebates/search?province=ON&retrofit_type=heat_pump_air_source"
+    first = client.get(url)
+    assert client.get(url, headers={"if-none-match": first.headers["etag"]}).status_code == 304
+
+
+def test_search_rebuilds_matrix_for_a_new_catalog(client, db):
+    warm_search_matrix(load_catalog(db))
+    url = "/api/rebates/search?province=FED&active_only=true"
+    before = [r["id"] for r in client.get(url).json()["rebates"]]
+
+    programs = copy.deepcopy(REBATE_PROGRAMS)
+    dropped = next(p for p in programs if p["province"] == "FED" and p["is_active"])
+    dropped["is_active"] = False
+    upsert_catalog(db, RETROFIT_TYPES, programs)
+    catalog = load_catalog(db)
+    assert not search_matrix.is_current(catalog, date.today())
+
+    after = [r["id"] for r in client.get(url).json()["rebates"]]
+    assert search_matrix.is_current(catalog, date.today())
+    assert len(after) == len(before) - 1
+
+
+def test_matrix_expires_after_next_deadline(db):
+    catalog = load_catalog(db)
+    deadlines = sorted({p.end_date for p in catalog.programs if p.end_date})
+    assert deadlines
+    today = deadlines[0] - timedelta(days=1)
+    search_matrix.build(catalog, _render_search, today=today)
+
+    assert search_matrix.is_current(catalog, deadlines[0])
+    assert not search_matrix.is_current(catalog, deadlines[0] + timedelta(days=1))
@@ -0,0 +1,76 @@
+"""Startup stamps and the lazy startup mode."""
+
+import asyncio
+import threading
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+
+from app import database
+from app.config import settings
+from app.database import SessionLocal, prepare_database, read_stamps
+from app.models.rebate import RebateProgram
+from app.services.catalog import get_catalog
+from tests.conftest import reset_database
+
+
+@pytest.fixture
+def fresh_database():
+    """Empty tables and no stamps, as a database created before stamps existed."""
+    reset_database()
+    yield
+    reset_database()
+
+
+def _program_count() -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(RebateProgram))
+
+
+def test_prepare_writes_stamps_then_skips_work(fresh_database, statements):
+    prepare_database()
+    assert read_stamps() == {"schema": database.schema_stamp(), "seed": database.seed_stamp()}
+    assert _program_count()
+
+    statements.clear()
+    prepare_database()
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("SELECT")
+
+
+def test_changed_seed_stamp_reseeds(fresh_database, monkeypatch, statements):
+    prepare_database()
+    monkeypatch.setattr(database, "seed_stamp", lambda: "changed")
+
+    statements.clear()
+    prepare_database()
+    assert not any(s.lstrip().upper().startswith("CREATE") for s in statements)
+    assert read_stamps()["seed"] == "changed"
+
+
+def test_lazy_lifespan_serves_before_catalog_loads(db, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(settings, "lazy_startup", True)
+    release = threading.Event()
+    build_catalog = main.build_catalog
+
+    def blocked_build(session):
+        release.wait(10)
+        return build_catalog(session)
+
+    monkeypatch.setattr(main, "build_catalog", blocked_build)
+
+    async def run() -> int:
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.get("/api/rebates/search?province=ON")
+            assert get_catalog() is None
+            release.set()
+        return response.status_code
+
+    assert asyncio.run(run()) == 200
+    # Leaving the lifespan waits for the background load
+    assert get_catalog() is not None
@@ -0,0 +1,132 @@
+"""Building fingerprinted, precompressed assets and serving them."""
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from app.static_assets import IMMUTABLE, MANIFEST, REVALIDATE, PrecompressedStaticFiles, build_static_assets
+
+DASHBOARD = Path(__file__).resolve().parents[1] / "app" / "static"
+PAGE = """<!doctype html>
+<html><head><link rel="stylesheet" href="css/style.css"><script src="/js/app.js?v=1"></script></head>
+<body><a href="https://example.com/x.js">out</a>{filler}</body></html>
+"""
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "source"
+    (root / "css").mkdir(parents=True)
+    (root / "js").mkdir()
+    (root / "index.html").write_text(PAGE.format(filler="<p>rebates</p>" * 200))
+    (root / "css" / "style.css").write_text("body { color: #123456; }\n" * 100)
+    (root / "js" / "app.js").write_text("console.log('retrofit');\n" * 100)
+    return root
+
+
+@pytest.fixture
+def built(source, tmp_path):
+    output = tmp_path / "build"
+    manifest = build_static_assets(str(source), str(output))
+    return output, manifest
+
+
+def _client(directory) -> TestClient:
+    return TestClient(Starlette(routes=[Mount("/", app=PrecompressedStaticFiles(directory=str(directory), html=True))]))
+
+
+def test_build_fingerprints_and_rewrites_references(built):
+    output, manifest = built
+    assert set(manifest) == {"css/style.css", "js/app.js"}
+    assert json.loads((output / MANIFEST).read_text()) == manifest
+
+    page = (output / "index.html").read_text()
+    assert f'href="css/{os.path.basename(manifest["css/style.css"])}"' in page
+    assert f'src="/js/{os.path.basename(manifest["js/app.js"])}?v=1"' in page
+    assert 'href="https://example.com/x.js"' in page
+    for hashed in manifest.values():
+        assert (output / hashed).exists()
+        assert (output / f"{hashed}.br").exists() and (output / f"{hashed}.gz").exists()
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, encoding",
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0, gzip;q=0.5", "gzip"),
+        ("gzip;q=1, br;q=0.5", "gzip"),
+        ("*", "br"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_serves_best_accepted_encoding(built, source, accept_encoding, encoding):
+    output, manifest = built
+    client = _client(output)
+    response = client.get(f"/{manifest['js/app.js']}", headers={"accept-encoding": accept_encoding})
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == (source / "js" / "app.js").read_bytes()
+
+
+def test_cache_headers_and_revalidation(built):
+    output, manifest = built
+    client = _client(output)
+    hashed = client.get(f"/{manifest['css/style.css']}", headers={"accept-encoding": "br"})
+    assert hashed.headers["cache-control"] == IMMUTABLE
+    page = client.get("/", headers={"accept-encoding": "gzip"})
+    assert page.headers["cache-control"] == REVALIDATE
+
+    not_modified = client.get("/", headers={"accept-encoding": "gzip", "if-none-match": page.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert "content-encoding" not in not_modified.headers
+    # A different encoding is a different representation with its own ETag
+    assert client.get("/", headers={"accept-encoding": "br", "if-none-match": page.headers["etag"]}).status_code == 200
+
+    since = client.get("/", headers={"if-modified-since": page.headers["last-modified"]})
+    assert since.status_code == 304
+
+
+def test_head_sends_headers_only(built):
+    output, _ = built
+    response = _client(output).head("/", headers={"accept-encoding": "br"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert int(response.headers["content-length"]) > 0
+    assert response.content == b""
+
+
+def test_earlier_builds_stay_immutable(built, source):
+    output, manifest = built
+    (source / "css" / "style.css").write_text("body { color: red; }\n" * 100)
+    rebuilt = build_static_assets(str(source), str(output))
+    assert rebuilt["css/style.css"] != manifest["css/style.css"]
+
+    client = _client(output)
+    for path in (manifest["css/style.css"], rebuilt["css/style.css"]):
+        response = client.get(f"/{path}")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == IMMUTABLE
+
+
+def test_unbuilt_directory_is_served_as_is(source):
+    client = _client(source)
+    response = client.get("/css/style.css", headers={"accept-encoding": "br"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert client.get("/nope.js").status_code == 404
+
+
+def test_dashboard_builds(tmp_path):
+    manifest = build_static_assets(str(DASHBOARD), str(tmp_path / "build"))
+    assert manifest
+    response = _client(tmp_path / "build").get("/")
+    assert response.status_code == 200
+    assert all(os.path.basename(hashed) in response.text for hashed in manifest.values())
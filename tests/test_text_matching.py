@@ -0,0 +1,162 @@
+"""Phrase matching over free text, and the province and retrofit type extraction built on it."""
+
+import random
+import re
+
+import pytest
+
+from app.services.rebate_service import (
+    _ABBREV_CODES,
+    PROVINCE_KEYWORDS,
+    RETROFIT_SYNONYMS,
+    extract_province,
+    extract_retrofit_types,
+)
+from app.services.text_matcher import PhraseMatcher, is_whole_word
+
+FILLER = ["", " ", "  ", ",", ".", "-", "_", "'", "/", "\n", "é", "x", "a", "s", "1", "in ", " the ", "my "]
+
+
+def _reference_province(text, session_province=None):
+    """Longest keyword first, abbreviations as whole words: the matching the matcher replaced."""
+    lower = text.lower()
+    for phrase in sorted(PROVINCE_KEYWORDS, key=len, reverse=True):
+        if phrase in _ABBREV_CODES:
+            if re.search(rf"\b{re.escape(phrase)}\b", lower):
+                return PROVINCE_KEYWORDS[phrase]
+        elif phrase in lower:
+            return PROVINCE_KEYWORDS[phrase]
+    return session_province
+
+
+def _reference_retrofit_types(text):
+    lower = text.lower()
+    return {name for phrase, names in RETROFIT_SYNONYMS.items() if phrase in lower for name in names}
+
+
+def _generated_texts(count, table=PROVINCE_KEYWORDS, seed=4):
+    rng = random.Random(seed)
+    phrases = list(table)
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(0, 6)):
+            phrase = rng.choice(phrases)
+            if rng.random() < 0.3:
+                # Cut keywords short or run them into neighbouring words
+                phrase = phrase[: rng.randint(1, len(phrase))]
+            parts.append(phrase.upper() if rng.random() < 0.2 else phrase)
+            parts.append(rng.choice(FILLER))
+        yield "".join(parts)
+
+
+def test_extract_province_matches_reference():
+    mismatches = [
+        text for text in _generated_texts(30_000) if extract_province(text, "XX") != _reference_province(text, "XX")
+    ]
+    assert mismatches == []
+
+
+@pytest.mark.parametrize(
+    "text, province",
+    [
+        # Abbreviations inside longer words are not codes
+        ("heading to montreal", "QC"),
+        ("monthly savings on heat", "ON"),
+        ("done", None),
+        ("abcd", None),
+        ("pe_i", None),
+        ("on_site", None),
+        ("nu-clear options", "NU"),
+        ("pei.", "PE"),
+        ("ON", "ON"),
+        ("(bc)", "BC"),
+        # The longest keyword anywhere wins over an earlier, shorter one
+        ("on my way from nova scotia", "NS"),
+        ("quebec city or ontario", "QC"),
+        # Equal lengths fall back to table order
+        ("st. john's, not saint john", "NB"),
+        ("nwt", "NT"),
+    ],
+)
+def test_province_edges(text, province):
+    assert extract_province(text) == province == _reference_province(text)
+
+
+def test_falls_back_to_session_province():
+    assert extract_province("heat pump rebate", "MB") == "MB"
+    assert extract_province("heat pump rebate in yukon", "MB") == "YT"
+
+
+def test_extract_retrofit_types_matches_reference():
+    mismatches = [
+        text
+        for text in _generated_texts(30_000, RETROFIT_SYNONYMS)
+        if set(extract_retrofit_types(text)) != _reference_retrofit_types(text)
+    ]
+    assert mismatches == []
+
+
+def test_retrofit_types_follow_table_edits(monkeypatch):
+    text = "a heat pump water heater and a new roof"
+    assert set(extract_retrofit_types(text)) == _reference_retrofit_types(text)
+
+    monkeypatch.setitem(RETROFIT_SYNONYMS, "roof", ["roofing"])
+    assert "roofing" in extract_retrofit_types(text)
+
+    monkeypatch.delitem(RETROFIT_SYNONYMS, "heat pump water heater")
+    monkeypatch.delitem(RETROFIT_SYNONYMS, "water heater")
+    assert "heat_pump_water_heater" not in extract_retrofit_types(text)
+
+    # Replacing one phrase with another keeps the table the same size
+    monkeypatch.delitem(RETROFIT_SYNONYMS, "roof")
+    monkeypatch.setitem(RETROFIT_SYNONYMS, "new roof", ["roof_replacement"])
+    found = set(extract_retrofit_types(text))
+    assert "roof_replacement" in found and "roofing" not in found
+    assert found == _reference_retrofit_types(text)
+
+    # Editing a phrase's targets applies without a rebuild
+    monkeypatch.setitem(RETROFIT_SYNONYMS, "new roof", ["shingles"])
+    assert "shingles" in extract_retrofit_types(text)
+
+
+def test_matcher_reports_nested_and_overlapping_phrases():
+    matcher = PhraseMatcher(["he", "her", "hers", "she", "ers", ""])
+    assert list(matcher.finditer("ushers")) == [(1, "she"), (2, "hers"), (2, "her"), (2, "he"), (3, "ers")]
+    assert matcher.distinct("ushers") == {"she", "he", "her", "hers", "ers"}
+    assert matcher.distinct("nothing") == set()
+
+
+def test_matcher_matches_substring_search():
+    rng = random.Random(5)
+    phrases = ["a", "ab", "abc", "bc", "bca", "cab", "c a", "ca"]
+    matcher = PhraseMatcher(phrases)
+    for _ in range(2_000):
+        text = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 20)))
+        expected = {
+            (i, phrase) for phrase in phrases for i in range(len(text)) if text.startswith(phrase, i)
+        }
+        assert set(matcher.finditer(text)) == expected
+        assert matcher.distinct(text) == {phrase for _, phrase in expected}
+
+
+def test_empty_matcher_finds_nothing():
+    matcher = PhraseMatcher([])
+    assert list(matcher.finditer("anything")) == []
+    assert matcher.distinct("anything") == set()
+
+
+@pytest.mark.parametrize(
+    "text, start, end, expected",
+    [
+        ("on", 0, 2, True),
+        ("montreal", 1, 3, False),
+        ("pe_i", 0, 2, False),
+        ("pe-i", 0, 2, True),
+        ("é on", 2, 4, True),
+        ("éon", 1, 3, False),
+    ],
+)
+def test_is_whole_word_agrees_with_regex(text, start, end, expected):
+    assert is_whole_word(text, start, end) is expected
+    pattern = rf"\b{re.escape(text[start:end])}\b"
+    assert any(m.start() == start for m in re.finditer(pattern, text)) is expected